@@ -9,19 +9,49 @@ import sys
 import threading
 import time
 import traceback
-from typing import TYPE_CHECKING, Literal, Union
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Literal, TypedDict, Union
 
 import pyotp  # 2Factor Authentication Python Module
 import requests
-import requests.sessions
 
+import AMP_Async
+import AMP_Cache
+import AMP_Connection
 import AMP_Console
+import AMP_Metrics
 import DB
 
 if TYPE_CHECKING:
     from AMP_Handler import AMPHandler
 
 
+class InstanceChange(TypedDict):
+    """One Instance's changed attributes from a `_updateInstanceAttributes()` merge. \n
+    `Changes` is `{attribute: (old value, new value)}`; eg. `{'Running': (True, False)}`."""
+
+    InstanceID: str
+    FriendlyName: str
+    Changes: dict[str, tuple[Any, Any]]
+
+
+class AMPInstanceSnapshot:
+    """Immutable copy of one Instance entry from `ADSModule/GetInstances`. \n
+    The refresher builds a new one and swaps the reference; it is never edited in place."""
+
+    __slots__ = ("data", "fetched")
+
+    def __init__(self, data: dict, fetched: float | None = None) -> None:
+        object.__setattr__(self, "data", MappingProxyType(dict(data)))
+        object.__setattr__(self, "fetched", time.time() if fetched == None else fetched)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("AMPInstanceSnapshot is immutable")
+
+    def age(self) -> float:
+        return time.time() - self.fetched
+
+
 class AMPInstance:
     """AMP Base Class: \n
     Attributes: \n
@@ -118,6 +148,7 @@ class AMPInstance:
         self.serverlist = {}
 
         self.InstanceID = instanceID
+        self.Snapshot: AMPInstanceSnapshot | None = None
         self.__setattr__("TargetName", TargetName)
         self.FriendlyName = None
 
@@ -169,11 +200,22 @@ class AMPInstance:
         if instanceID != 0:
             self.url += f"ADSModule/Servers/{instanceID}/API/"
 
+        # Short lived GetStatus/GetUserList results shared by banners, status commands and the console.
+        status_ttl = self.DBConfig.GetSetting("AMP_Status_TTL")
+        self.StatusCache = AMP_Cache.AMPStatusCache(ttl=float(status_ttl) if status_ttl != None else 5)
+
+        # Open after `AMP_Breaker_Threshold` failed calls in a row; API calls then fail fast until `AMP_Breaker_Reset` seconds pass.
+        self.Breaker = AMP_Connection.getAMPPool().new_breaker()
+
+        # Awaitable API calls for use on the Discord event loop; shares our SessionID.
+        self.Async = AMP_Async.AMPAsyncInstance(self)
+
         if default_console:
             self.Console = AMP_Console.AMPConsole(self)
 
         if instanceID != 0:
             # This gets all the dictionary values tied to AMP and makes them attributes of self.
+            self.Snapshot = AMPInstanceSnapshot(serverdata)
             for entry in serverdata:
                 setattr(self, entry, serverdata[entry])
 
@@ -389,14 +431,11 @@ class AMPInstance:
 
         return True
 
-    def __getattribute__(self, __name: str):
-        if __name in ["Initialized", "InstanceID", "serverdata"]:
-            return super().__getattribute__(__name)
-
-        if self.Initialized and (self.InstanceID != 0) and __name in self.serverdata:
-            self.AMPHandler.AMP._updateInstanceAttributes()
-
-        return super().__getattribute__(__name)
+    def snapshotAge(self) -> float | None:
+        """Seconds since this Instance's attributes were refreshed from `ADSModule/GetInstances`; `None` for the main AMP object."""
+        if self.Snapshot == None:
+            return None
+        return self.Snapshot.age()
 
     def _setDBattr(self):
         """This is used to set/update the DB attributes for the AMP server"""
@@ -416,99 +455,144 @@ class AMPInstance:
         self.Discord_Role = self.DB_Server.Discord_Role
         self.Avatar_url = self.DB_Server.Avatar_url
         self.Hidden = self.DB_Server.Hidden
+        self.Console_Priority = self.DB_Server.Console_Priority
         self.background_banner_path = self.DB_Server.getBanner().background_path
 
     def Login(self) -> bool:
-        if self.SessionID == 0:
-            if self.InstanceID in self.AMPHandler.SessionIDlist:
-                self.AMPHandler.SessionIDlist[self.InstanceID] = self.SessionID
-                return
-
-            self.logger.dev(f"AMPInstance Logging in {self.InstanceID}")
-
-            if self.AMP2Factor != None:
-                token = self.AMP2Factor.now()
-
-            else:
-                token = ""
-
-            parameters = {
-                "username": self.AMPHandler.tokens.AMPUser,
-                "password": self.AMPHandler.tokens.AMPPassword,
-                "token": token,  # get current 2Factor Code
-                "rememberMe": True,
-            }
-
-            try:
-                result = self.CallAPI("Core/Login", parameters)
-                if result.get("sessionID"):
-                    self.SessionID = result["sessionID"]
-                    self.AMPHandler.SessionIDlist[self.InstanceID] = self.SessionID
-                    self.Running = True
-
-                else:
-                    self.logger.warning(f"{self.FriendlyName} - Instance is Offline")
-                    self.Running = False
-                    return False
-
-            except Exception:
-                self.logger.dev(f"Core/Login Exception: {traceback.format_exc()}")
-                self.logger.dev(result)
-
-                self.logger.warning(f"{self.FriendlyName} - Instance is Offline")
-                self.Running = False
-                return False
-
-        return True
-
-    def CallAPI(self, APICall, parameters) -> Union[bool, dict]:
-        """This is the main API Call function"""
-        self.logger.debug(f"Function {APICall} was called with {parameters} by {self.InstanceID}")
-
+        """Returns `True` if we have a SessionID; otherwise logs in through `AMPHandler.Sessions`. \n
+        Session refresh before expiry is handled by the `AMP Sessions` thread, so this is just a read on the hot path."""
         if self.SessionID != 0:
+            return True
+        return self.AMPHandler.Sessions.login(self)
+
+    def CallAPI(self, APICall, parameters, timeout: Union[float, tuple[float, float], None] = None) -> Union[bool, dict]:
+        """This is the main API Call function \n
+        `timeout` overrides the pools `(connect, read)` timeout for this request only. \n
+        An "Unauthorized Access" response gets one transparent retry with a new session. \n
+        Returns `False` without touching the network while the Instance's `Breaker` is open."""
+        # The parameters carry the SessionID (and the password for Core/Login); never log them.
+        self.logger.debug("Function %s was called by %s", APICall, self.InstanceID)
+
+        post_req = self._post(APICall, parameters, timeout)
+        if post_req == None:
+            return False
+        res = self._json(post_req)
+
+        if self._isUnauthorized(res) and APICall != "Core/Login":
+            self.logger.warning(f"{self.FriendlyName}: AMP session expired during {APICall}; logging in again...")
+            self.AMPHandler.Sessions.invalidate(self, parameters.get("SESSIONID"))
+            if self.Login():
+                self.AMPHandler.Sessions.retries += 1
+                AMP_Metrics.getAMPMetrics().record_retry(self.InstanceID, self.FriendlyName, APICall)
+                post_req = self._post(APICall, parameters, timeout)
+                if post_req == None:
+                    return False
+                res = self._json(post_req)
+
+        return self._parseAPIResult(APICall, post_req.status_code, res, post_req.raw)
+
+    @staticmethod
+    def _json(post_req):
+        """`json()` of the response; `None` for an empty (eg. `Core/GetUpdates`) or invalid body."""
+        if len(post_req.content) == 0:
+            return None
+        try:
+            return post_req.json()
+        except ValueError:
+            return None
+
+    def _post(self, APICall: str, parameters: dict, timeout: Union[float, tuple[float, float], None] = None):
+        """Sends the API Call with our current SessionID. \n
+        Only a `2xx` reply with a body (`Core/GetUpdates` may be empty) is a success. Unreachable, `5xx` or empty replies are failed attempts
+        that back off with jitter up to `AMP_Max_Attempts`; a call that uses them all counts as one failure on `self.Breaker`.
+        A `4xx` reply is returned as is without a retry. \n
+        Returns `None` when the Breaker is open or every attempt failed."""
+        if not self.Breaker.allow():
+            self.logger.debug(f"{self.FriendlyName}: circuit breaker is {self.Breaker.state}; skipping {APICall}")
+            return None
+
+        if self.SessionID != 0 and APICall != "Core/Login":
             parameters["SESSIONID"] = self.SessionID
         jsonhandler = json.dumps(parameters)
 
-        while True:
+        pool = AMP_Connection.getAMPPool()
+        metrics = AMP_Metrics.getAMPMetrics()
+        # A half-open Breaker only gets a single trial attempt.
+        attempts = 1 if self.Breaker.state == AMP_Connection.CircuitBreaker.HALF_OPEN else pool.max_attempts
+        for attempt in range(attempts):
+            if attempt > 0:
+                metrics.record_retry(self.InstanceID, self.FriendlyName, APICall)
+                time.sleep(AMP_Connection.backoff_delay(attempt))
+
+            start = time.perf_counter()
             try:
-                post_req = requests.post(self.url + APICall, headers=self.AMPheader, data=jsonhandler)
+                post_req = pool.post(
+                    self.url + APICall,
+                    data=jsonhandler,
+                    headers=self.AMPheader,
+                    target=self.TargetName,
+                    timeout=timeout,
+                )
 
-                if len(post_req.content) > 0:
-                    break
+            except Exception as e:
+                outcome = AMP_Metrics.TIMEOUT if isinstance(e, requests.Timeout) else AMP_Metrics.ERROR
+                metrics.record(self.InstanceID, self.FriendlyName, APICall, time.perf_counter() - start, len(jsonhandler), 0, outcome)
+                self.logger.warning(f"AMP API was unable to connect for {APICall} on {self.FriendlyName} (attempt {attempt + 1}/{attempts}); {type(e).__name__} {e}")
+                continue
 
-                # Since we are using GetUpdates every second for Console Updates; lets ignore them here so we don't sleep our thread.
-                if APICall == "Core/GetUpdates":
-                    break
+            metrics.record(
+                self.InstanceID,
+                self.FriendlyName,
+                APICall,
+                time.perf_counter() - start,
+                len(jsonhandler),
+                len(post_req.content),
+                AMP_Metrics.OK if 200 <= post_req.status_code < 300 else AMP_Metrics.ERROR,
+            )
 
-                self.logger.error(f"{self.FriendlyName}: AMP API recieved no Data; sleeping for 5 seconds...")
-                time.sleep(5)
+            if 200 <= post_req.status_code < 300:
+                # Since we are using GetUpdates every second for Console Updates; an empty body is expected there.
+                if len(post_req.content) > 0 or APICall == "Core/GetUpdates":
+                    self.Breaker.record_success()
+                    self.AMPHandler.SuccessfulConnection = True
+                    return post_req
 
-            except:
-                if self.AMPHandler.SuccessfulConnection == False:
-                    self.logger.critical("Unable to connect to URL; please check Tokens.py -> AMPURL")
-                    sys.exit(-1)
+                self.logger.error(f"{self.FriendlyName}: AMP API recieved no Data for {APICall} (attempt {attempt + 1}/{attempts})")
 
-                self.logger.warning("AMP API was unable to connect; sleeping for 30 seconds...")
-                time.sleep(30)
+            elif 400 <= post_req.status_code < 500:
+                # AMP answered; the same request would get the same answer. `_parseAPIResult` logs it.
+                self.Breaker.release()
+                self.AMPHandler.SuccessfulConnection = True
+                return post_req
 
-        self.AMPHandler.SuccessfulConnection = True
+            else:
+                self.logger.warning(f"AMP API returned status {post_req.status_code} for {APICall} on {self.FriendlyName} (attempt {attempt + 1}/{attempts})")
 
-        res = post_req.json()
+        self.Breaker.record_failure()
+        if self.Breaker.is_open:
+            self.logger.error(f"**ERROR** {self.FriendlyName}: circuit breaker opened after {self.Breaker.failures} failed calls; retrying in {self.Breaker.reset_timeout} seconds")
+        return None
 
+    @staticmethod
+    def _isUnauthorized(res) -> bool:
+        return isinstance(res, dict) and res.get("Title") == "Unauthorized Access"
+
+    def _parseAPIResult(self, APICall: str, status_code: int, res, raw=None) -> Union[bool, dict, None]:
+        """Handles the JSON response of an API Call; shared by `CallAPI` and `AMP_Async.AMPAsyncInstance.CallAPI`."""
         # Error catcher for API calls
-        if post_req.status_code < 200 or post_req.status_code >= 300:
-            self.logger.error(f"AMP_API `{APICall}` status_code:  {post_req.status_code}")
-            self.logger.error(post_req.raw)
+        if status_code < 200 or status_code >= 300:
+            self.logger.error(f"AMP_API `{APICall}` status_code:  {status_code}")
+            self.logger.error(raw)
             return
 
         if res == None:
             self.logger.debug(f"AMP_API {APICall} json() is `None`")
-            self.logger.debug(post_req.raw)
+            self.logger.debug(raw)
             return
 
         # {"result": Int or Bool} or dict[str, int] -> Int or Bool
 
-        self.logger.debug(f"Post Request Prints: {res}")
+        self.logger.debug("Post Request Prints: %s", res)
         # Permission errors will trigger this, unsure what else.
         # print("API CALL---->", APICall, type(res), res)
         if isinstance(res, dict) and "result" in res:
@@ -543,9 +627,10 @@ class AMPInstance:
         elif isinstance(res, dict) and "Title" in res:
             if (type(res["Title"]) == str) and (res["Title"] == "Unauthorized Access"):
                 self.logger.error(f'["Title"]: The API Call {APICall} failed because of {res}')
-                # Resetting the Session ID for the Instance; forcing a new login/SessionID
-                self.AMPHandler.SessionIDlist.pop(self.InstanceID)
-                self.SessionID = 0
+                # Resetting the Session ID for the Instance; forcing a new login/SessionID.
+                # A failed Login has no session of its own to drop, and a failed refresh keeps the current one.
+                if APICall != "Core/Login":
+                    self.AMPHandler.Sessions.invalidate(self)
                 return False
 
         else:
@@ -563,65 +648,135 @@ class AMPInstance:
             self.ADS_Running = status
             return status
 
-    def _updateInstanceAttributes(self):
-        """This updates an AMP Server Objects attributes from `getInstances()` API call."""
-        if (not self.Initialized) or (time.time() - self.Last_Update_Time < 5):
-            return
+    def _updateInstanceAttributes(self, result: list | None = None) -> list[InstanceChange]:
+        """This updates every AMP Server Objects attributes from an `ADSModule/GetInstances` API call. \n
+        Run by `AMP_Handler.amp_instance_refresher()`; each Instance gets a new `AMPInstanceSnapshot` swapped in and only its changed attributes set. \n
+        Returns the change set, which is also sent to every `AMPHandler.add_instance_listener()` callback. \n
+        `result` can be an already fetched `ADSModule/GetInstances` response."""
+        change_set: list[InstanceChange] = []
+        if not self.Initialized:
+            return change_set
 
         if self.Last_Update_Time_Mutex.acquire(blocking=False) == False:
-            return
+            return change_set
 
-        self.Login()
-        parameters = {}
-        result = self.CallAPI("ADSModule/GetInstances", parameters)
+        try:
+            if result == None:
+                self.Login()
+                parameters = {}
+                result = self.CallAPI("ADSModule/GetInstances", parameters)
 
-        if type(result) == bool:
-            self.logger.error(f"Failed to update {self.FriendlyName} attributes, API Call returned {result}")
-            return
+            if not isinstance(result, list):
+                self.logger.error(f"Failed to update {self.FriendlyName} attributes, API Call returned {result}")
+                return change_set
 
-        if len(result[0]["AvailableInstances"]) != 0:
-            # if len(result["result"][0]['AvailableInstances']) != 0:
-            # for Target in result["result"]:
+            fetched = time.time()
+            # AMP_Instances is already keyed by InstanceID; one lookup per Instance instead of a scan.
+            index = self.AMPHandler.AMP_Instances
             for Target in result:
-                for instance in Target[
-                    "AvailableInstances"
-                ]:  # entry = name['result']['AvailableInstances'][0]['InstanceIDs']
-                    # This should be a list of my AMP Servers [{'InstanceID': '<AMP Instance Object>'}]
-                    for amp_instance in self.AMPHandler.AMP_Instances:
-                        # This should be the <AMP Instance Object> comparing to the Instance Objects we got from `getInstances()`
-                        if self.AMPHandler.AMP_Instances[amp_instance].InstanceID == instance["InstanceID"]:
-                            # This gets all the dictionary values tied to AMP and makes them attributes of self.
-                            for entry in instance:
-                                setattr(self.AMPHandler.AMP_Instances[amp_instance], entry, instance[entry])
-                            break
-
-        self.Last_Update_Time = time.time()
-        self.Last_Update_Time_Mutex.release()
-
-    def _instance_ThreadManager(self):
-        """AMP Instance(s) Thread Manager"""
+                for instance in Target.get("AvailableInstances", []):
+                    server = index.get(instance.get("InstanceID"))
+                    if server == None:
+                        continue
+
+                    # Swap in the new snapshot first; anyone needing a consistent view reads `server.Snapshot.data`.
+                    server.Snapshot = AMPInstanceSnapshot(instance, fetched)
+
+                    changes = {}
+                    for entry, value in instance.items():
+                        previous = getattr(server, entry, None)
+                        if entry in server.__dict__ and previous == value:
+                            continue
+                        changes[entry] = (previous, value)
+                        setattr(server, entry, value)
+
+                    if len(changes) == 0:
+                        continue
+
+                    if "Running" in changes:
+                        self.logger.dev(f"{server.FriendlyName}: Instance Running changed {changes['Running'][0]} -> {changes['Running'][1]}")
+
+                    change_set.append(InstanceChange(InstanceID=server.InstanceID, FriendlyName=server.FriendlyName, Changes=changes))
+
+            self.Last_Update_Time = fetched
+
+        finally:
+            self.Last_Update_Time_Mutex.release()
+
+        if len(change_set):
+            self.AMPHandler._notify_instance_listeners(change_set)
+        return change_set
+
+    def _fleetStatus(self, result: list | None = None) -> set[str]:
+        """Fans out Running/ADS Running, metrics and player counts from a single `ADSModule/GetInstances` call to every AMPInstance. \n
+        Returns the InstanceIDs that were covered by the batch; anything not in it still needs its own `_ADScheck()`."""
+        if result == None:
+            result = self.getInstances()
+
+        fleet = set()
+        if not isinstance(result, list):
+            self.logger.error(f"Failed to get the Fleet Status, API Call returned {result}")
+            return fleet
+
+        for Target in result:
+            for instance in Target.get("AvailableInstances", []):
+                server = self.AMPHandler.AMP_Instances.get(instance.get("InstanceID"))
+                if server == None or "Running" not in instance:
+                    continue
+
+                server.Running = instance["Running"]
+                if not server.Running:
+                    server.ADS_Running = False
+                    server.StatusCache.invalidate()
+                    fleet.add(server.InstanceID)
+                    continue
+
+                # Older ADS versions or partial permissions may leave these out; that Instance gets a per-instance `Core/GetStatus`.
+                if "AppState" not in instance or "Metrics" not in instance:
+                    continue
+
+                # Same shape as `Core/GetStatus`; Uptime is not part of the batch so we keep the last one we saw.
+                last_status = server.StatusCache.peek(AMP_Cache.STATUS)
+                status = {
+                    "State": instance["AppState"],
+                    "Uptime": last_status.get("Uptime", "") if last_status != None else "",
+                    "Metrics": instance["Metrics"],
+                }
+                server.StatusCache.put(AMP_Cache.STATUS, status)
+                server.ADS_Running = str(instance["AppState"]) != "0"
+                fleet.add(server.InstanceID)
+
+        return fleet
+
+    def _instance_ThreadManager(self, fleet: set[str] | None = None):
+        """AMP Instance(s) Thread Manager \n
+        `fleet` is the set of InstanceIDs from `_fleetStatus()` whose Running/ADS Running is already current."""
         self.Login()
         for instance in self.AMPHandler.AMP_Instances:
             server = self.AMPHandler.AMP_Instances[instance]
 
             # Lets validate our ADS Running before we check for console threads.
-            if server.Running and server._ADScheck() and server.ADS_Running:
-                # Lets check if the Console Thread is running now.
+            if fleet != None and server.InstanceID in fleet:
+                live = server.Running and server.ADS_Running
+            else:
+                live = server.Running and server._ADScheck() and server.ADS_Running
+
+            if live:
+                # Lets check if the Console is being polled now.
                 if server.Console.console_thread_running == False:
                     self.logger.info(
-                        f"{server.FriendlyName}: Starting Console Thread, Instance Online: {server.Running} and ADS Online: {server.ADS_Running}"
+                        f"{server.FriendlyName}: Starting Console polling, Instance Online: {server.Running} and ADS Online: {server.ADS_Running}"
                     )
                     server.Console.console_thread_running = True
-
-                    if not server.Console.console_thread.is_alive():
-                        server.Console.console_thread.start()
+                    AMP_Console.getConsolePoller().wake(server.Console)
 
             if not server.Running or (server.Running and not server.ADS_Running):
                 if server.Console.console_thread_running == True:
                     self.logger.error(
-                        f"{server.FriendlyName}: Shutting down Console Thread, Instance Online: {server.Running}, ADS Online: {server.ADS_Running}."
+                        f"{server.FriendlyName}: Stopping Console polling, Instance Online: {server.Running}, ADS Online: {server.ADS_Running}."
                     )
                     server.Console.console_thread_running = False
+                    server.Console.console_watermark_save(force=True)
 
     def getInstances(self) -> dict:
         """This gets all Instances on AMP."""
@@ -659,6 +814,7 @@ class AMPInstance:
         self.Login()
         parameters = {}
         self.CallAPI("Core/Start", parameters)
+        self.StatusCache.invalidate()
         return
 
     def StopInstance(self):
@@ -666,6 +822,7 @@ class AMPInstance:
         self.Login()
         parameters = {}
         self.CallAPI("Core/Stop", parameters)
+        self.StatusCache.invalidate()
         return
 
     def RestartInstance(self):
@@ -673,6 +830,7 @@ class AMPInstance:
         self.Login()
         parameters = {}
         self.CallAPI("Core/Restart", parameters)
+        self.StatusCache.invalidate()
         return
 
     def KillInstance(self):
@@ -680,10 +838,15 @@ class AMPInstance:
         self.Login()
         parameters = {}
         self.CallAPI("Core/Kill", parameters)
+        self.StatusCache.invalidate()
         return
 
     def getStatus(self) -> dict:
-        """AMP Instance Status Information"""
+        """AMP Instance Status Information \n
+        Served from `self.StatusCache` for `AMP_Status_TTL` seconds."""
+        return self.StatusCache.get(AMP_Cache.STATUS, self._fetchStatus)
+
+    def _fetchStatus(self) -> dict:
         self.Login()
         parameters = {}
         result = self.CallAPI("Core/GetStatus", parameters)
@@ -712,6 +875,10 @@ class AMPInstance:
         if result == False:
             return TPS, Users, CPU, Memory, Uptime
 
+        return self._parseMetrics(result)
+
+    def _parseMetrics(self, result: dict) -> tuple:
+        """Turns a `Core/GetStatus` result into `getMetrics()` values; also sets `self.Metrics`."""
         Uptime = str(result["Uptime"])
         TPS = str(result["State"])
         Users = (str(result["Metrics"]["Active Users"]["RawValue"]), str(result["Metrics"]["Active Users"]["MaxValue"]))
@@ -747,9 +914,10 @@ class AMPInstance:
 
     def getUserList(self) -> list[str]:
         """Returns a List of connected users."""
-        self.Login()
-        parameters = {}
-        result = self.CallAPI("Core/GetUserList", parameters)
+        result = self.StatusCache.get(AMP_Cache.USERLIST, self._fetchUserList)
+        if not isinstance(result, dict):
+            return []
+
         user_list = []
         for user in result:
             # for user in result['result']:
@@ -757,6 +925,11 @@ class AMPInstance:
             user_list.append(result[user])
         return user_list
 
+    def _fetchUserList(self) -> dict:
+        self.Login()
+        parameters = {}
+        return self.CallAPI("Core/GetUserList", parameters)
+
     def getSchedule(self) -> dict:
         self.Login()
         parameters = {}
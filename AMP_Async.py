@@ -0,0 +1,293 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+import traceback
+from typing import TYPE_CHECKING, Union
+
+import aiohttp
+
+import AMP_Cache
+import AMP_Connection
+import AMP_Metrics
+
+if TYPE_CHECKING:
+    from AMP import AMPInstance
+
+Session: aiohttp.ClientSession | None = None
+
+
+def getAMPSession() -> aiohttp.ClientSession:
+    """Returns the Global aiohttp `ClientSession` used for every awaitable AMP API call; otherwise creates it. \n
+    Must be called from the running event loop, uses the same pool size and timeouts as `AMP_Connection.getAMPPool()`."""
+    global Session
+    if Session == None or Session.closed:
+        pool = AMP_Connection.getAMPPool()
+        Session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=pool.pool_size, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(sock_connect=pool.connect_timeout, sock_read=pool.read_timeout),
+        )
+    return Session
+
+
+async def closeAMPSession() -> None:
+    """Closes the Global aiohttp `ClientSession`; called when the Bot shuts down."""
+    global Session
+    if Session != None and not Session.closed:
+        await Session.close()
+    Session = None
+
+
+class AMPAsyncInstance:
+    """Awaitable counterpart of `AMP.AMPInstance` for the hot API endpoints. \n
+    Lives on `AMPInstance.Async` and shares its `SessionID`; logins go through `AMPHandler.Sessions` like the blocking calls. \n
+    A failed call returns `False` instead of exiting; an open `AMPInstance.Breaker` returns `False` straight away."""
+
+    def __init__(self, instance: AMPInstance) -> None:
+        self.logger = logging.getLogger()
+        self.AMPInstance = instance
+
+    async def Login(self) -> bool:
+        """Returns `True` if the Instance has a SessionID; otherwise logs in through `AMPHandler.Sessions` off the event loop."""
+        if self.AMPInstance.SessionID != 0:
+            return True
+        return await asyncio.to_thread(self.AMPInstance.Login)
+
+    async def CallAPI(self, APICall: str, parameters: dict, timeout: Union[float, None] = None) -> Union[bool, dict, None]:
+        """Awaitable `AMPInstance.CallAPI` \n
+        `timeout` is the total seconds allowed for this request; otherwise the session defaults are used."""
+        instance = self.AMPInstance
+        self.logger.debug("Function %s was called by %s", APICall, instance.InstanceID)
+
+        content, status_code = await self._post(APICall, parameters, timeout)
+        res = self._loads(APICall, content)
+
+        if instance._isUnauthorized(res):
+            self.logger.warning(f"{instance.FriendlyName}: AMP session expired during {APICall}; logging in again...")
+            instance.AMPHandler.Sessions.invalidate(instance, parameters.get("SESSIONID"))
+            if await self.Login():
+                instance.AMPHandler.Sessions.retries += 1
+                AMP_Metrics.getAMPMetrics().record_retry(instance.InstanceID, instance.FriendlyName, APICall)
+                content, status_code = await self._post(APICall, parameters, timeout)
+                res = self._loads(APICall, content)
+
+        if res == None:
+            return False
+
+        return instance._parseAPIResult(APICall, status_code, res, content)
+
+    def _loads(self, APICall: str, content: bytes | None):
+        """Decodes a response body; `None` if AMP could not be reached, sent nothing or sent invalid JSON."""
+        if content == None:
+            return None
+
+        if len(content) == 0:
+            # Core/GetUpdates can legitimately be empty; no need to make noise about it.
+            if APICall != "Core/GetUpdates":
+                self.logger.error(f"{self.AMPInstance.FriendlyName}: AMP API recieved no Data for {APICall}")
+            return None
+
+        try:
+            return json.loads(content)
+        except ValueError:
+            self.logger.error(f"AMP_API `{APICall}` returned invalid JSON: {content[:200]}")
+            return None
+
+    async def _post(self, APICall: str, parameters: dict, timeout: Union[float, None] = None) -> tuple[bytes | None, int]:
+        """Sends the API Call with the current SessionID; returns `(content, status_code)` or `(None, 0)` if AMP could not be reached. \n
+        Shares `AMPInstance.Breaker`, the `AMP_Max_Attempts` budget and what counts as a failed attempt with `AMPInstance._post`; backoff uses `asyncio.sleep`."""
+        instance = self.AMPInstance
+        if not instance.Breaker.allow():
+            self.logger.debug(f"{instance.FriendlyName}: circuit breaker is {instance.Breaker.state}; skipping {APICall}")
+            return None, 0
+
+        if instance.SessionID != 0 and APICall != "Core/Login":
+            parameters["SESSIONID"] = instance.SessionID
+        jsonhandler = json.dumps(parameters)
+
+        pool = AMP_Connection.getAMPPool()
+        metrics = AMP_Metrics.getAMPMetrics()
+        attempts = 1 if instance.Breaker.state == AMP_Connection.CircuitBreaker.HALF_OPEN else pool.max_attempts
+        for attempt in range(attempts):
+            if attempt > 0:
+                metrics.record_retry(instance.InstanceID, instance.FriendlyName, APICall)
+                await asyncio.sleep(AMP_Connection.backoff_delay(attempt))
+
+            # `timeout=None` would turn the session's connect/read timeouts off for this request; only pass one when given.
+            kwargs = {} if timeout == None else {"timeout": aiohttp.ClientTimeout(total=timeout)}
+            start = time.perf_counter()
+            try:
+                async with getAMPSession().post(instance.url + APICall, data=jsonhandler, headers=instance.AMPheader, **kwargs) as post_req:
+                    content = await post_req.read()
+                    status_code = post_req.status
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                outcome = AMP_Metrics.TIMEOUT if isinstance(e, asyncio.TimeoutError) else AMP_Metrics.ERROR
+                metrics.record(instance.InstanceID, instance.FriendlyName, APICall, time.perf_counter() - start, len(jsonhandler), 0, outcome)
+                self.logger.warning(
+                    f"AMP API was unable to connect for {APICall} on {instance.FriendlyName} (attempt {attempt + 1}/{attempts}); {type(e).__name__} {e}"
+                )
+                continue
+
+            metrics.record(
+                instance.InstanceID,
+                instance.FriendlyName,
+                APICall,
+                time.perf_counter() - start,
+                len(jsonhandler),
+                len(content),
+                AMP_Metrics.OK if 200 <= status_code < 300 else AMP_Metrics.ERROR,
+            )
+
+            if 200 <= status_code < 300:
+                # `Core/GetUpdates` can legitimately be empty.
+                if len(content) > 0 or APICall == "Core/GetUpdates":
+                    instance.Breaker.record_success()
+                    instance.AMPHandler.SuccessfulConnection = True
+                    return content, status_code
+
+                self.logger.error(f"{instance.FriendlyName}: AMP API recieved no Data for {APICall} (attempt {attempt + 1}/{attempts})")
+
+            elif 400 <= status_code < 500:
+                instance.Breaker.release()
+                instance.AMPHandler.SuccessfulConnection = True
+                return content, status_code
+
+            else:
+                self.logger.warning(f"AMP API returned status {status_code} for {APICall} on {instance.FriendlyName} (attempt {attempt + 1}/{attempts})")
+
+        instance.Breaker.record_failure()
+        return None, 0
+
+    async def _ADScheck(self) -> bool:
+        """Awaitable `AMPInstance._ADScheck`; updates `AMPInstance.ADS_Running`."""
+        Success = await self.Login()
+        self.logger.debug("Server Check, Login Sucess: " + str(Success))
+        if Success:
+            status = await self.getLiveStatus()
+            self.logger.debug(f"{self.AMPInstance.FriendlyName} ADS Running: {status}")
+            self.AMPInstance.ADS_Running = status
+            return status
+
+    async def getInstances(self) -> dict:
+        """This gets all Instances on AMP."""
+        await self.Login()
+        parameters = {}
+        result = await self.CallAPI("ADSModule/GetInstances", parameters)
+        return result
+
+    async def ConsoleUpdate(self) -> dict:
+        """Awaitable `AMPInstance.ConsoleUpdate`"""
+        await self.Login()
+        parameters = {}
+        result = await self.CallAPI("Core/GetUpdates", parameters)
+        return result
+
+    async def ConsoleMessage(self, msg: str):
+        """Basic Console Message"""
+        await self.Login()
+        parameters = {"message": msg}
+        await self.CallAPI("Core/SendConsoleMessage", parameters)
+        return
+
+    async def StartInstance(self):
+        """Awaitable `AMPInstance.StartInstance`"""
+        await self._control("Core/Start")
+
+    async def StopInstance(self):
+        """Awaitable `AMPInstance.StopInstance`"""
+        await self._control("Core/Stop")
+
+    async def RestartInstance(self):
+        """Awaitable `AMPInstance.RestartInstance`"""
+        await self._control("Core/Restart")
+
+    async def KillInstance(self):
+        """Awaitable `AMPInstance.KillInstance`"""
+        await self._control("Core/Kill")
+
+    async def _control(self, APICall: str):
+        await self.Login()
+        parameters = {}
+        await self.CallAPI(APICall, parameters)
+        self.AMPInstance.StatusCache.invalidate()
+        return
+
+    async def getStatus(self) -> dict:
+        """AMP Instance Status Information; shares `AMPInstance.StatusCache` with the blocking calls."""
+        return await self.AMPInstance.StatusCache.async_get(AMP_Cache.STATUS, self._fetchStatus)
+
+    async def _fetchStatus(self) -> dict:
+        await self.Login()
+        parameters = {}
+        result = await self.CallAPI("Core/GetStatus", parameters)
+
+        # This happens because CallAPI returns False when it fails permissions.
+        if result == False or result == None:
+            return False
+        return result
+
+    async def getMetrics(self) -> tuple:
+        """Awaitable `AMPInstance.getMetrics`"""
+        self.AMPInstance.Metrics = None
+
+        result = await self.getStatus()
+        if result == False:
+            return "", ("None", "None"), "", ("None", "None"), ""
+
+        return self.AMPInstance._parseMetrics(result)
+
+    async def getLiveStatus(self) -> bool:
+        """Server is Online and Proper AMP Permissions. \n
+        `Returns False` when 0 TPS"""
+        result = await self.getStatus()
+        if result == False:
+            return result
+
+        # This usually happens if the service is offline.
+        if isinstance(result, dict) and "State" in result:
+            return str(result["State"]) != "0"
+        return False
+
+    async def getUsersOnline(self) -> tuple[str, str]:
+        """Returns Number of Online Players over Player Limit. \n
+        `eg 2/10`"""
+        result = await self.getStatus()
+        if result != False:
+            Users = (str(result["Metrics"]["Active Users"]["RawValue"]), str(result["Metrics"]["Active Users"]["MaxValue"]))
+            return Users
+
+    async def getUserList(self) -> list[str]:
+        """Returns a List of connected users."""
+        result = await self.AMPInstance.StatusCache.async_get(AMP_Cache.USERLIST, self._fetchUserList)
+        if not isinstance(result, dict):
+            return []
+        return list(result.values())
+
+    async def _fetchUserList(self) -> dict:
+        await self.Login()
+        parameters = {}
+        return await self.CallAPI("Core/GetUserList", parameters)
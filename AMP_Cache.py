@@ -0,0 +1,126 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+STATUS = "Core/GetStatus"
+USERLIST = "Core/GetUserList"
+
+
+class AMPStatusCache:
+    """Per-Instance TTL cache of `Core/GetStatus` and `Core/GetUserList` results. \n
+    Metrics, live state and users online are all derived from the status, so one fresh snapshot answers every one of them. \n
+    Concurrent callers on a miss share a single in-flight request (single-flight); threads via a per-key `threading.Lock`,
+    coroutines via a per-key `asyncio.Lock`. Failed results (`False`/`None`) are never cached."""
+
+    def __init__(self, ttl: float = 5) -> None:
+        self.ttl: float = ttl
+
+        # {APICall: (result, time.monotonic() when fetched)}
+        self._entries: dict[str, tuple[Any, float]] = {}
+        self._locks: dict[str, threading.Lock] = {STATUS: threading.Lock(), USERLIST: threading.Lock()}
+        self._async_locks: dict[str, asyncio.Lock] = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+        # Hits that waited on someone else's in-flight request.
+        self.coalesced: int = 0
+
+    def _fresh(self, key: str) -> tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry != None and (time.monotonic() - entry[1]) < self.ttl:
+            return True, entry[0]
+        return False, None
+
+    def put(self, key: str, value: Any) -> None:
+        """Stores a result fetched elsewhere (eg. `ADSModule/GetInstances`) as fresh."""
+        if value == False or value == None:
+            return
+        self._entries[key] = (value, time.monotonic())
+
+    def peek(self, key: str) -> Any:
+        """Returns the last result for `key` regardless of its age; `None` if never fetched."""
+        entry = self._entries.get(key)
+        return entry[0] if entry != None else None
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Drops one cached result or all of them; used after Start/Stop/Restart/Kill."""
+        if key == None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def get(self, key: str, fetch: Callable[[], Any]) -> Any:
+        """Returns the cached result for `key`; otherwise calls `fetch()` once for every waiting thread."""
+        fresh, value = self._fresh(key)
+        if fresh:
+            self.hits += 1
+            return value
+
+        with self._locks.setdefault(key, threading.Lock()):
+            fresh, value = self._fresh(key)
+            if fresh:
+                self.hits += 1
+                self.coalesced += 1
+                return value
+
+            self.misses += 1
+            value = fetch()
+            self.put(key, value)
+            return value
+
+    async def async_get(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Awaitable `get()`; shares the same cached results as the blocking callers."""
+        fresh, value = self._fresh(key)
+        if fresh:
+            self.hits += 1
+            return value
+
+        lock = self._async_locks.get(key)
+        if lock == None:
+            lock = self._async_locks[key] = asyncio.Lock()
+
+        async with lock:
+            fresh, value = self._fresh(key)
+            if fresh:
+                self.hits += 1
+                self.coalesced += 1
+                return value
+
+            self.misses += 1
+            value = await fetch()
+            self.put(key, value)
+            return value
+
+    def age(self, key: str = STATUS) -> float | None:
+        """Seconds since `key` was last fetched; `None` if never."""
+        entry = self._entries.get(key)
+        if entry == None:
+            return None
+        return time.monotonic() - entry[1]
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
@@ -0,0 +1,231 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from typing import Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import DB
+
+Pool = None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30) -> float:
+    """Full jitter exponential backoff; a random delay between 0 and `min(cap, base * 2^attempt)` seconds."""
+    return random.uniform(0, min(cap, base * (2**attempt)))
+
+
+class CircuitBreaker:
+    """Per-Instance circuit breaker for the AMP API. \n
+    `closed` - calls go through. After `failure_threshold` failed calls in a row it goes `open`. \n
+    `open` - calls fail fast without touching the network, for `reset_timeout` seconds. \n
+    `half-open` - one trial call is let through; success closes the breaker, failure opens it again."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+
+        self._state: str = self.CLOSED
+        self.failures: int = 0
+        self.opened_at: float = 0
+        self._trial_in_flight: bool = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and (time.monotonic() - self.opened_at) >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """`True` while calls would fail fast; loops use this to skip the Instance."""
+        return self.state == self.OPEN
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial call through."""
+        if self._state != self.OPEN:
+            return 0
+        return max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        """Returns `True` if a call may go out; in half-open only one trial call is allowed at a time."""
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """Ends a call that neither proves nor disproves the Instance is healthy (eg. a `4xx` reply); frees the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class AMPConnectionPool:
+    """Keep-alive HTTP sessions for the AMP API. \n
+    One `requests.Session` (and its urllib3 connection pool) is kept per ADS url/target,
+    so repeated `CallAPI` requests re-use open sockets instead of doing a new TCP/TLS handshake every time."""
+
+    def __init__(
+        self,
+        pool_size: int = 10,
+        connect_timeout: float = 5,
+        read_timeout: float = 30,
+        max_attempts: int = 3,
+        breaker_threshold: int = 5,
+        breaker_reset: float = 30,
+    ) -> None:
+        self.logger = logging.getLogger()
+
+        self.pool_size: int = pool_size
+        self.connect_timeout: float = connect_timeout
+        self.read_timeout: float = read_timeout
+
+        # Attempts per API call before it counts as one failure against the Instance's CircuitBreaker.
+        self.max_attempts: int = max(1, max_attempts)
+        self.breaker_threshold: int = breaker_threshold
+        self.breaker_reset: float = breaker_reset
+
+        self._sessions: dict[tuple[str, str | None], requests.Session] = {}
+        self._session_lock = threading.Lock()
+
+    @staticmethod
+    def _pool_key(url: str, target: str | None = None) -> tuple[str, str | None]:
+        """The pool key is the ADS base url (scheme://host:port) and the Target the Instance lives on."""
+        parts = urlsplit(url)
+        return (f"{parts.scheme}://{parts.netloc}", target)
+
+    def get_session(self, url: str, target: str | None = None) -> requests.Session:
+        """Returns the `requests.Session` for the ADS url/target, creating it on first use."""
+        key = self._pool_key(url, target)
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        with self._session_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=False)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[key] = session
+                self.logger.dev(f"Created AMP connection pool for {key[0]} (Target: {key[1]}) // Pool Size: {self.pool_size}")
+        return session
+
+    def post(
+        self,
+        url: str,
+        data: str,
+        headers: dict,
+        target: str | None = None,
+        timeout: Union[float, tuple[float, float], None] = None,
+    ) -> requests.Response:
+        """POST through the pooled session for the url/target. \n
+        `timeout` overrides the default `(connect_timeout, read_timeout)` for this request only."""
+        if timeout is None:
+            timeout = (self.connect_timeout, self.read_timeout)
+        return self.get_session(url, target).post(url, data=data, headers=headers, timeout=timeout)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Returns `{'url (Target)': {'connections': int, 'requests': int}}` for every pool. \n
+        `connections` is the number of sockets opened (handshakes), `requests` the number of requests sent over them."""
+        stats = {}
+        for (base_url, target), session in list(self._sessions.items()):
+            connections = 0
+            sent = 0
+            for adapter in set(session.adapters.values()):
+                if not isinstance(adapter, HTTPAdapter):
+                    continue
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    connections += pool.num_connections
+                    sent += pool.num_requests
+            stats[f"{base_url} ({target})"] = {"connections": connections, "requests": sent}
+        return stats
+
+    def new_breaker(self) -> CircuitBreaker:
+        """A CircuitBreaker using the `AMP_Breaker_Threshold`/`AMP_Breaker_Reset` settings."""
+        return CircuitBreaker(failure_threshold=self.breaker_threshold, reset_timeout=self.breaker_reset)
+
+    def close(self) -> None:
+        """Closes every pooled session and its open sockets."""
+        with self._session_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+def getAMPPool() -> AMPConnectionPool:
+    """Returns the Global AMPConnectionPool; otherwise creates it using the `AMP_Pool_Size`, `AMP_Connect_Timeout`, `AMP_Read_Timeout`,
+    `AMP_Max_Attempts`, `AMP_Breaker_Threshold` and `AMP_Breaker_Reset` settings."""
+    global Pool
+    if Pool == None:
+        DBConfig = DB.getDBHandler().DBConfig
+        pool_size = DBConfig.GetSetting("AMP_Pool_Size")
+        connect_timeout = DBConfig.GetSetting("AMP_Connect_Timeout")
+        read_timeout = DBConfig.GetSetting("AMP_Read_Timeout")
+        max_attempts = DBConfig.GetSetting("AMP_Max_Attempts")
+        breaker_threshold = DBConfig.GetSetting("AMP_Breaker_Threshold")
+        breaker_reset = DBConfig.GetSetting("AMP_Breaker_Reset")
+        Pool = AMPConnectionPool(
+            pool_size=int(pool_size) if pool_size != None else 10,
+            connect_timeout=float(connect_timeout) if connect_timeout != None else 5,
+            read_timeout=float(read_timeout) if read_timeout != None else 30,
+            max_attempts=int(max_attempts) if max_attempts != None else 3,
+            breaker_threshold=int(breaker_threshold) if breaker_threshold != None else 5,
+            breaker_reset=float(breaker_reset) if breaker_reset != None else 30,
+        )
+    return Pool
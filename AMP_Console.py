@@ -21,14 +21,23 @@ Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
 
 from __future__ import annotations
 
+import heapq
+import itertools
 import logging
 import re
 import threading
 import time
 import traceback
-from datetime import UTC, datetime, timezone
-from typing import TYPE_CHECKING, TypedDict
-
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable, Iterator, NotRequired, TypedDict
+
+import AMP_Console_Archive
+import AMP_Console_Events
+import AMP_Console_Filter
+import AMP_Players
 import DB
 
 if TYPE_CHECKING:
@@ -42,6 +51,231 @@ class ConsoleEntry(TypedDict):
     Source: str
     Timestamp: str
     Type: str
+    # Set by `AMPConsole.console_events()` to the event type parsed from the entry.
+    Event: NotRequired[str]
+
+
+class ConsoleQueue:
+    """Bounded, thread safe FIFO between the `AMPConsolePoller` workers and the Discord relay tasks. \n
+    Once `capacity` items are queued the oldest one is dropped for every new one. With a `marker` the dropped items are
+    coalesced; the next `get()` returns `marker(count)` (eg. "12 lines skipped") in their place before the rest of the queue. \n
+    `on_ready(queue)` is called (from the putting thread) when an item is put into a queue that was drained empty; the consumer
+    keeps calling `get()`/`drain()` until the queue is empty again, so it is never signalled twice for the same backlog."""
+
+    def __init__(self, name: str, capacity: int = 500, marker: Callable[[int], Any] | None = None) -> None:
+        self.name: str = name
+        self.capacity: int = max(1, capacity)
+        self.marker: Callable[[int], Any] | None = marker
+
+        self._queue: deque[Any] = deque()
+        self._lock = threading.Lock()
+        # Lines dropped since the last marker was handed out.
+        self._skipped: int = 0
+        self.on_ready: Callable[[ConsoleQueue], None] | None = None
+        # Set once `on_ready` was called; cleared when a consumer finds the queue empty.
+        self._signalled: bool = False
+
+        self.enqueued: int = 0
+        self.dropped: int = 0
+        self.high_water: int = 0
+
+    def __len__(self) -> int:
+        return len(self._queue) + (1 if self._skipped else 0)
+
+    def put(self, item: Any) -> None:
+        with self._lock:
+            if len(self._queue) >= self.capacity:
+                dropped = self._queue.popleft()
+                self.dropped += 1
+                if self.marker != None:
+                    self._skipped += dropped.count("\n") + 1 if isinstance(dropped, str) else 1
+
+            self._queue.append(item)
+            self.enqueued += 1
+            if len(self._queue) > self.high_water:
+                self.high_water = len(self._queue)
+            signal = not self._signalled
+            self._signalled = True
+
+        if signal and self.on_ready != None:
+            self.on_ready(self)
+
+    def get(self) -> Any | None:
+        """Returns the oldest item (or the skipped marker); `None` if the queue is empty."""
+        with self._lock:
+            if self._skipped:
+                skipped, self._skipped = self._skipped, 0
+                return self.marker(skipped)
+
+            if not len(self._queue):
+                self._signalled = False
+                return None
+            return self._queue.popleft()
+
+    def drain(self, max_items: int | None = None, max_size: int | None = None) -> list[Any]:
+        """Pops the oldest items (the skipped marker first) while there are at most `max_items` of them and, joined by newlines,
+        at most `max_size` characters; always at least one. Returns `[]` if the queue is empty."""
+        with self._lock:
+            items = []
+            size = 0
+            if self._skipped:
+                items.append(self.marker(self._skipped))
+                size = len(items[0]) if isinstance(items[0], str) else 0
+                self._skipped = 0
+
+            while len(self._queue):
+                if max_items != None and len(items) >= max_items:
+                    break
+                item = self._queue[0]
+                item_size = size + (1 if len(items) else 0) + (len(item) if isinstance(item, str) else 0)
+                if max_size != None and len(items) and item_size > max_size:
+                    break
+                items.append(self._queue.popleft())
+                size = item_size
+
+            if not len(items):
+                self._signalled = False
+            return items
+
+    def clear(self) -> None:
+        with self._lock:
+            self._queue.clear()
+            self._skipped = 0
+            self._signalled = False
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "depth": len(self._queue),
+                "capacity": self.capacity,
+                "high_water": self.high_water,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+            }
+
+
+def skipped_marker(count: int) -> str:
+    return f"*... {count} line{'s' if count != 1 else ''} skipped ...*"
+
+
+# Discord's message length limit and the preferred places to split a console line that is longer, best first.
+DISCORD_MESSAGE_LIMIT = 2000
+CODE_FENCE = "```"
+_SPLIT_DELIMITERS = (";", "\n", " ")
+
+
+def chunk_line(text: str, limit: int = DISCORD_MESSAGE_LIMIT) -> Iterator[str]:
+    """Splits a console line into pieces of at most `limit` characters in one pass. \n
+    Each cut is at the last `;` (kept on the left piece), newline or space (dropped) within the window; a window without any of them is hard split."""
+    start = 0
+    end = len(text)
+    while end - start > limit:
+        # Only the current window is searched, so every character is looked at a bounded number of times.
+        for delimiter in _SPLIT_DELIMITERS:
+            cut = text.rfind(delimiter, start + 1, start + limit)
+            if cut != -1:
+                break
+
+        if cut == -1:
+            yield text[start : start + limit]
+            start += limit
+        elif delimiter == ";":
+            yield text[start : cut + 1]
+            start = cut + 1
+        else:
+            yield text[start:cut]
+            start = cut + 1
+
+    if start < end:
+        yield text[start:]
+
+
+class MessagePacker:
+    """Packs console lines, newline separated, into as few messages of at most `limit` characters as possible. \n
+    Pieces are collected in a list and joined once per message. A message that ends inside a code block gets a closing fence and the next
+    message reopens it, so one unbalanced "```" can't turn the rest of the channel into a code block."""
+
+    def __init__(self, limit: int = DISCORD_MESSAGE_LIMIT) -> None:
+        self.limit: int = limit
+        # Room for reopening and closing a code block around a chunk.
+        self.chunk_limit: int = limit - 2 * (len(CODE_FENCE) + 1)
+        self.messages: list[str] = []
+        self._parts: list[str] = []
+        self._size: int = 0
+        self._fenced: bool = False
+
+    def add(self, line: str) -> None:
+        for piece in chunk_line(line, self.chunk_limit):
+            fenced = self._fenced ^ (piece.count(CODE_FENCE) % 2 == 1)
+            size = self._size + (1 if len(self._parts) else 0) + len(piece)
+            if len(self._parts) and size + (len(CODE_FENCE) + 1 if fenced else 0) > self.limit:
+                self._close()
+                size = self._size + (1 if len(self._parts) else 0) + len(piece)
+
+            self._parts.append(piece)
+            self._size = size
+            self._fenced = fenced
+
+    def _close(self) -> None:
+        if self._fenced:
+            self._parts.append(CODE_FENCE)
+        self.messages.append("\n".join(self._parts))
+        self._parts = [CODE_FENCE] if self._fenced else []
+        self._size = len(CODE_FENCE) if self._fenced else 0
+
+    def flush(self) -> list[str]:
+        """Returns the packed messages and starts over."""
+        if len(self._parts) and self._parts != [CODE_FENCE]:
+            self._close()
+        messages = self.messages
+        self.messages = []
+        self._parts = []
+        self._size = 0
+        self._fenced = False
+        return messages
+
+
+# `/Date(1651703130702)/` with an optional UTC offset; the offset doesn't change the epoch milliseconds.
+_DOTNET_DATE = re.compile(r"/Date\((-?\d+)(?:[+-]\d{4})?\)/")
+
+
+# `AMPConsole.clock_offset` is rounded to this many milliseconds (a quarter hour, the smallest timezone step).
+CLOCK_OFFSET_STEP = 15 * 60 * 1000
+
+
+def _decode_dotnet(stamp: str) -> int:
+    return int(stamp[6:-2])
+
+
+def _decode_dotnet_offset(stamp: str) -> int:
+    match = _DOTNET_DATE.fullmatch(stamp)
+    if match == None:
+        raise ValueError(f"Not a /Date()/ timestamp {stamp}")
+    return int(match.group(1))
+
+
+def _decode_iso(stamp: str) -> int:
+    # AMP v2.6.0.0; naive times are the AMP host's wall clock. We don't know its timezone, so they are read as UTC; that keeps them
+    # comparable with each other whatever timezone the bot runs in. `AMPConsole.clock_offset` maps them onto the bot's clock.
+    value = datetime.fromisoformat(stamp)
+    if value.tzinfo == None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def timestamp_decoder(stamp: str) -> Callable[[str], int]:
+    """Picks the decoder for an AMP Console entry `Timestamp`; every decoder returns epoch milliseconds. \n
+    AMP doesn't change formats between entries, so `AMPConsole` picks one from its first entry and only looks again if it fails."""
+    if stamp.startswith("/Date(") and stamp.endswith(")/"):
+        if stamp[6:-2].lstrip("-").isdigit():
+            return _decode_dotnet
+        return _decode_dotnet_offset
+    return _decode_iso
+
+
+def entry_hash(entry: ConsoleEntry) -> int:
+    """Stable across restarts (unlike `hash()`) so it can be saved with the watermark."""
+    return zlib.crc32(f"{entry['Source']}\x00{entry['Contents']}".encode(errors="replace"))
 
 
 class AMPConsole:
@@ -49,6 +283,18 @@ class AMPConsole:
     FILTER_TYPE_EVENT = 1
     FILTER_TYPE_BLACKLIST = 0
     FILTER_TYPE_WHITELIST = 1
+    PRIORITY_LOW = 0
+    PRIORITY_NORMAL = 1
+    PRIORITY_HIGH = 2
+    # Empty polls in a row before an idle console starts backing off.
+    IDLE_GRACE = 3
+    # Seconds between saves of a moved watermark; stopping the Console or the bot saves it right away.
+    WATERMARK_SAVE_INTERVAL = 30
+    # Set by the game module Console classes (eg. `AMPMinecraftConsole`); see `console_events()`.
+    EVENT_PARSER: AMP_Console_Events.EventParser | None = None
+    # Set by game modules that log their join line again during a session (eg. Valheim on every spawn); joins of players
+    # the `AMP_Players.PlayerTracker` already has an open session for are then dropped.
+    REPEATED_JOINS: bool = False
 
     def __init__(self, AMPInstance: AMPInstance) -> None:
         self.logger = logging.getLogger()
@@ -62,24 +308,69 @@ class AMPConsole:
         self.DBConfig = self.DBHandler.DBConfig
         self.DB_Server: DBServer | None = self.DB.GetServer(InstanceID=self.AMPInstance.InstanceID)
 
-        self.console_thread = None
+        # `True` while the Instance and its ADS are running; the AMPConsolePoller only polls us then.
         self.console_thread_running = False
 
-        self.console_messages = []
-        self.console_message_list = []
-        self.console_message_lock = threading.Lock()
-
-        self.console_chat_messages = []
-        self.console_chat_message_lock = threading.Lock()
-
-        self.console_event_messages = []
-        self.console_event_message_lock = threading.Lock()
+        # Seconds between `Core/GetUpdates` polls and how many of them may be in flight at once.
+        # `poll_interval` grows from `poll_base` towards `poll_ceiling` while the console is idle; see `poll_adapt()`.
+        interval = self.DBConfig.GetSetting("AMP_Console_Interval")
+        self.poll_base: float = float(interval) if interval != None else 1
+        self.poll_interval: float = self.poll_base
+        ceiling = self.DBConfig.GetSetting("AMP_Console_Idle_Ceiling")
+        self.poll_ceiling: float = float(ceiling) if ceiling != None else 30
+        self.idle_polls: int = 0
+        self.poll_limit: int = 1
+        self.poll_inflight: int = 0
+
+        # Dedupe watermark; entries before `watermark` (see `entry_time()`) or already in `watermark_hashes` at it are skipped.
+        # It is saved on the DBServer so a restart neither replays AMP's console backlog nor loses what was printed meanwhile.
+        # A Server without one (first start) starts it at the newest entry of its first `Core/GetUpdates` batch; see `console_baseline()`.
+        # Only AMP's own Timestamps are ever compared with it, never the bot's clock.
+        self.timestamp_decoder: Callable[[str], int] | None = None
+        self.watermark: int | None = None
+        self.watermark_hashes: set[int] = set()
+        self.watermark_dirty: bool = False
+        self.watermark_saved: float = time.monotonic()
+        # Milliseconds from the AMP host's Timestamps to the bot's clock, in whole quarter hours; for the archive and events.
+        self.clock_offset: int = 0
+        self.first_batch: bool = True
+        if self.DB_Server != None and self.DB_Server.Console_Watermark != None:
+            self.watermark = int(self.DB_Server.Console_Watermark)
+            self.watermark_hashes = {int(digest) for digest in (self.DB_Server.Console_Watermark_Hash or "").split(",") if digest}
+
+        # Bounded queues the `AMP_Tasks` relay drains; a rate limited Discord drops the oldest entries instead of growing forever.
+        # Chat entries are relayed to other Servers too, so they are never replaced by a "skipped" marker.
+        capacity = self.DBConfig.GetSetting("AMP_Console_Queue_Size")
+        capacity = int(capacity) if capacity != None else 500
+        marker = skipped_marker if self.DBConfig.GetSetting("AMP_Console_Queue_Coalesce") != False else None
+        self.console_messages = ConsoleQueue("Console", capacity, marker)
+        self.console_packer = MessagePacker()
+
+        self.console_chat_messages = ConsoleQueue("Chat", capacity)
+
+        self.console_event_messages = ConsoleQueue("Event", capacity, marker)
+        for queue in (self.console_messages, self.console_chat_messages, self.console_event_messages):
+            queue.on_ready = self._queue_ready
+
+        # Every entry is archived on disk for `/server console search`; `Console_Archive_Days` 0 turns it off.
+        self.archive: AMP_Console_Archive.ConsoleArchive | None = None
+        retention = self.DBConfig.GetSetting("Console_Archive_Days")
+        if retention == None or float(retention) > 0:
+            segment_size = self.DBConfig.GetSetting("Console_Archive_Segment_Size")
+            try:
+                self.archive = AMP_Console_Archive.ConsoleArchive(
+                    self.AMPInstance.InstanceID,
+                    retention_days=float(retention) if retention != None else 14,
+                    segment_size=int(segment_size) if segment_size != None else 16,
+                )
+            except OSError as e:
+                self.logger.error(f"**ERROR** Failed to open the Console archive for {self.AMPInstance.FriendlyName} - {e}")
 
         self.logger.dev(f"**SUCCESS** Setting up {self.AMPInstance.FriendlyName} Console")
         self.console_init()
 
     def console_init(self) -> None:
-        """This starts our console threads..."""
+        """Registers this Console with the shared `AMPConsolePoller`; polling starts once the Instance and its ADS are running."""
         if self.AMPInstance.Console_Flag:
             try:
                 # self.AMP_Modules[DIS] = getattr(class_module,f'AMP{module_name}')
@@ -92,136 +383,200 @@ class AMPConsole:
 
                 self.logger.dev(f"Loaded {name} for {self.AMPInstance.FriendlyName}")
 
-                # This starts the console parse on our self in a separate thread.
-                self.console_thread = threading.Thread(target=self.console_parse_loop, name=self.AMPInstance.FriendlyName)
-
-                # This adds the AMPConsole Thread Object into a dictionary with the key value of AMPInstance.InstanceID
-                self.AMP_Console_Threads[self.AMPInstance.InstanceID] = self.console_thread
+                # This adds the AMPConsole into a dictionary with the key value of AMPInstance.InstanceID
+                self.AMP_Console_Threads[self.AMPInstance.InstanceID] = self
 
                 if self.AMPInstance.Running and self.AMPInstance._ADScheck() and self.AMPInstance.ADS_Running:
-                    self.console_thread.start()
                     self.console_thread_running = True
-                    self.logger.dev(f"**SUCCESS** Starting Console Thread for {self.AMPInstance.FriendlyName}...")
+                    self.logger.dev(f"**SUCCESS** Starting Console polling for {self.AMPInstance.FriendlyName}...")
+
+                getConsolePoller().register(self)
 
             except Exception:
-                self.AMP_Console_Threads[self.AMPInstance.InstanceID] = self.AMPHandler.AMP_Console_Modules["Generic"]
                 self.logger.critical(
                     f"**ERROR** Failed to Start the Console for {self.AMPInstance.FriendlyName}...with {traceback.format_exc()}"
                 )
 
-    def console_parse_loop(self) -> None:
-        """This handles AMP Console Updates; turns them into bite size messages and sends them to Discord"""
-        time.sleep(5)
-        last_entry_time = 0
-        while 1:
-            time.sleep(1)
+    def poll_delay(self) -> float:
+        """Seconds the `AMPConsolePoller` should wait before polling again without calling AMP; `0` if we should poll now."""
+        if not self.console_thread_running:
+            return 10
+
+        if not self.AMPInstance.Running:
+            return 10
+
+        # AMP isn't answering for this Instance; wait for the breaker to let a trial call through.
+        if self.AMPInstance.Breaker.is_open:
+            return min(10, max(1, self.AMPInstance.Breaker.retry_in()))
+
+        return 0
+
+    def _queue_ready(self, queue: ConsoleQueue) -> None:
+        if Relay_Listener != None:
+            Relay_Listener(self, queue)
+
+    def queue_stats(self) -> dict[str, dict[str, int]]:
+        return {queue.name: queue.stats() for queue in (self.console_messages, self.console_chat_messages, self.console_event_messages)}
+
+    def poll_adapt(self, entries: int) -> None:
+        """Called after every poll with the number of console entries it returned. \n
+        After `IDLE_GRACE` empty polls in a row `poll_interval` doubles per empty poll up to `poll_ceiling`; any entry snaps it back to `poll_base`. \n
+        The Servers `Console_Priority` shifts the ceiling; High never backs off and Low backs off to twice the ceiling."""
+        if entries > 0:
+            self.idle_polls = 0
+            self.poll_interval = self.poll_base
+            return
+
+        self.idle_polls += 1
+        priority = self.AMPInstance.Console_Priority
+        if priority == self.PRIORITY_HIGH or self.idle_polls <= self.IDLE_GRACE:
+            return
+
+        ceiling = self.poll_ceiling * 2 if priority == self.PRIORITY_LOW else self.poll_ceiling
+        self.poll_interval = max(self.poll_base, min(ceiling, self.poll_base * 2 ** min(self.idle_polls - self.IDLE_GRACE, 16)))
+
+    def console_activity(self) -> None:
+        """Snaps polling back to `poll_base` and polls right away; call when a Discord user sends something to the Console."""
+        self.idle_polls = 0
+        self.poll_interval = self.poll_base
+        getConsolePoller().wake(self)
+
+    def entry_time(self, entry: ConsoleEntry) -> int | None:
+        """The entry `Timestamp` in epoch milliseconds; `None` if AMP sent something we can't read."""
+        stamp = entry["Timestamp"]
+        if self.timestamp_decoder != None:
+            try:
+                return self.timestamp_decoder(stamp)
+            except (ValueError, TypeError):
+                pass
+
+        try:
+            self.timestamp_decoder = timestamp_decoder(stamp)
+            return self.timestamp_decoder(stamp)
+        except (ValueError, TypeError, AttributeError):
+            self.logger.error(f"**ERROR** Unknown Console Timestamp format `{stamp}` for {self.AMPInstance.FriendlyName}")
+            return None
+
+    def console_seen(self, stamp: int | None, entry: ConsoleEntry) -> bool:
+        """`True` if the entry (at `stamp`, see `entry_time()`) is at or behind the watermark; otherwise moves the watermark past it. \n
+        Entries sharing a millisecond are told apart by `entry_hash()`; identical lines within the same millisecond collapse into one."""
+        if stamp == None:
+            # Relay it rather than lose it.
+            return False
+
+        if self.watermark == None or stamp < self.watermark:
+            return True
 
-            if not self.console_thread_running:
-                time.sleep(10)
+        digest = entry_hash(entry)
+        if stamp == self.watermark:
+            if digest in self.watermark_hashes:
+                return True
+            self.watermark_hashes.add(digest)
+        else:
+            self.watermark = stamp
+            self.watermark_hashes = {digest}
+        return False
+
+    def console_baseline(self, entries: list[ConsoleEntry]) -> None:
+        """Called with every `Core/GetUpdates` batch before it is relayed. \n
+        The first batch is AMP's backlog; without a saved watermark it starts at that batch's newest entry so the backlog isn't relayed.
+        Entries of later batches were printed since the last poll, so the newest of them gives `clock_offset`; rounded to quarter hours
+        it only moves for a host in another timezone or with a badly skewed clock."""
+        stamps = [stamp for stamp in (self.entry_time(entry) for entry in entries) if stamp != None]
+        if self.first_batch:
+            self.first_batch = False
+            if self.watermark == None:
+                self.watermark = max(stamps) if len(stamps) else 0
+                self.watermark_hashes = {entry_hash(entry) for entry, stamp in zip(entries, map(self.entry_time, entries)) if stamp == self.watermark}
+            return
+
+        if len(stamps):
+            self.clock_offset = round((time.time() * 1000 - max(stamps)) / CLOCK_OFFSET_STEP) * CLOCK_OFFSET_STEP
+
+    def console_watermark_save(self, force: bool = False) -> None:
+        """Saves a moved watermark at most every `WATERMARK_SAVE_INTERVAL` seconds; `force` saves it now (Console stopped, bot closing)."""
+        if self.DB_Server == None or self.watermark == None or not self.watermark_dirty:
+            return
+        if not force and time.monotonic() - self.watermark_saved < self.WATERMARK_SAVE_INTERVAL:
+            return
+
+        self.watermark_dirty = False
+        self.watermark_saved = time.monotonic()
+        try:
+            self.DB_Server.setConsoleWatermark(Timestamp=self.watermark, Hashes=",".join(str(digest) for digest in self.watermark_hashes))
+        except Exception as e:
+            self.watermark_dirty = True
+            self.logger.error(f"**ERROR** Failed to save the Console watermark for {self.AMPInstance.FriendlyName} - {e}")
+
+    def console_poll(self) -> None:
+        """One `Core/GetUpdates` round; turns the entries into bite size messages and queues them for Discord. \n
+        Called from the `AMPConsolePoller` workers."""
+        console = self.AMPInstance.ConsoleUpdate()
+        if isinstance(console, dict) and "ConsoleEntries" not in console:
+            self.logger.error(f"Console Entries not found for {self.AMPInstance.FriendlyName}")
+            self.AMPInstance._ADScheck()
+            return
+
+        if isinstance(console, bool) or console == None:
+            self.logger.error(f"Console Update Failed {self.AMPInstance.FriendlyName}")
+            self.AMPInstance._ADScheck()
+            return
+
+        console_entries: list[ConsoleEntry] = console["ConsoleEntries"]
+        self.poll_adapt(len(console_entries))
+        watermark = (self.watermark, len(self.watermark_hashes))
+        self.console_baseline(console_entries)
+        for entry in console_entries:
+            # This prevents old messages from getting handled again and spamming on restart.
+            stamp = self.entry_time(entry)
+            if self.console_seen(stamp, entry):
                 continue
 
-            if not self.AMPInstance.Running:
-                time.sleep(10)
+            # The entry on the bot's clock.
+            stamp = stamp + self.clock_offset if stamp != None else int(time.time() * 1000)
+            # Archived before any filtering; a search should find everything the Server printed.
+            if self.archive != None:
+                self.archive.append(stamp, entry)
+
+            self.logger.dev(
+                f"Name: {self.AMPInstance.FriendlyName} | DisplayImageSource: {self.AMPInstance.DisplayImageSource} | Console Channel: {self.AMPInstance.Discord_Console_Channel}\n Console Entry: {entry}"
+            )
+            # This will add the Servers Discord_Chat_Prefix to the beginning of any of the messages.
+            # Its done down here to prevent breaking of any existing filtering.
+            # TODO - Unsure what I was using this for. Removing the logic at this time.
+            # if self.DB_Server is not None and self.DB_Server.Discord_Chat_Prefix != None:
+            #     entry["Prefix"] = self.DB_Server.Discord_Chat_Prefix
+
+            # This should handle server events(such as join/leave/disconnects)
+            if self.console_events(entry, stamp):
                 continue
 
-            console = self.AMPInstance.ConsoleUpdate()
-            if isinstance(console, dict) and "ConsoleEntries" not in console:
-                self.logger.error(f"Console Entries not found for {self.AMPInstance.FriendlyName}")
-                self.AMPInstance._ADScheck()
+            # This will vary depending on the server type.
+            # I don't want to filter out the chat message here though. Just send it to two different places!
+            if self.console_chat(entry):
                 continue
 
-            if isinstance(console, bool) or console == None:
-                self.logger.error(f"Console Update Failed {self.AMPInstance.FriendlyName}")
-                self.AMPInstance._ADScheck()
+            # This will filter any messages such as errors or mods loading, etc..
+            if self.console_filter(entry):
                 continue
 
-            console_entries: list[ConsoleEntry] = console["ConsoleEntries"]
-            for entry in console_entries:
-                # This prevents old messages from getting handled again and spamming on restart.
-                try:
-                    entry_time = datetime.fromtimestamp(float(entry["Timestamp"][6:-2]) / 1000, tz=UTC)
-                except:
-                    # This is to support v2.6.0.0 of AMP API.
-                    entry_time: datetime = datetime.fromisoformat(entry["Timestamp"])
-                if last_entry_time == 0:
-                    last_entry_time = entry_time
-                    break
+            self.console_packer.add(entry["Contents"])
 
-                if entry_time < last_entry_time:
-                    last_entry_time = entry_time
-                    continue
+        for message in self.console_packer.flush():
+            self.console_messages.put(message)
+            self.logger.debug(self.AMPInstance.FriendlyName + message)
 
-                self.logger.dev(
-                    f"Name: {self.AMPInstance.FriendlyName} | DisplayImageSource: {self.AMPInstance.DisplayImageSource} | Console Channel: {self.AMPInstance.Discord_Console_Channel}\n Console Entry: {entry}"
-                )
-                # This will add the Servers Discord_Chat_Prefix to the beginning of any of the messages.
-                # Its done down here to prevent breaking of any existing filtering.
-                # TODO - Unsure what I was using this for. Removing the logic at this time.
-                # if self.DB_Server is not None and self.DB_Server.Discord_Chat_Prefix != None:
-                #     entry["Prefix"] = self.DB_Server.Discord_Chat_Prefix
-
-                # This should handle server events(such as join/leave/disconnects)
-                # if self.console_events(entry):
-                # continue
-
-                # This will vary depending on the server type.
-                # I don't want to filter out the chat message here though. Just send it to two different places!
-                if self.console_chat(entry):
-                    continue
+        if watermark != (self.watermark, len(self.watermark_hashes)):
+            self.watermark_dirty = True
+        self.console_watermark_save()
 
-                # This will filter any messages such as errors or mods loading, etc..
-                # if self.console_filter(entry):
-                #    continue
-
-                if len(entry["Contents"]) > 1500:
-                    index_hunt = entry["Contents"].find(";")
-                    if index_hunt == -1:
-                        continue
-
-                    msg_len_index = entry["Contents"].rindex(";")
-
-                    while msg_len_index > 1500:
-                        msg_len_index_end = msg_len_index
-                        msg_len_index = entry["Contents"].rindex(";", 0, msg_len_index_end)
-
-                        if msg_len_index < 1500:
-                            new_msg = entry["Contents"][0:msg_len_index]
-                            self.console_message_list.append(new_msg.lstrip())
-                            entry["Contents"] = entry["Contents"][msg_len_index + 1 : len(entry["Contents"])]
-                            msg_len_index = len(entry["Contents"])
-                            continue
-                else:
-                    self.console_message_list.append(entry["Contents"])
-
-            if len(self.console_message_list) > 0:
-                bulkentry = ""
-                for entry in self.console_message_list:
-                    if len(bulkentry + entry) < 1500:
-                        bulkentry = bulkentry + entry + "\n"
-
-                    else:
-                        self.console_message_lock.acquire()
-                        self.console_messages.append(bulkentry[:-1])
-                        self.console_message_lock.release()
-                        self.logger.debug(self.AMPInstance.FriendlyName + bulkentry[:-1])
-                        bulkentry = entry + "\n"
-
-                if len(bulkentry):
-                    self.console_message_lock.acquire()
-                    self.console_messages.append(bulkentry[:-1])
-                    self.console_message_lock.release()
-                    self.logger.debug(self.AMPInstance.FriendlyName + bulkentry[:-1])
-
-            self.console_message_list = []
-
-        self.logger.warning(f"{self.AMPInstance.FriendlyName} Thread Loop is Ending")
+        if self.archive != None:
+            self.archive.flush(force=False)
 
     def console_filter(self, message: ConsoleEntry) -> bool:
         """Controls what will be sent to the Discord Console Channel via AMP Console. \n
-        Return `True` to Continue, `False` to Return Message"""
-        self.logger.dev(
-            f"Console Filtered: {bool(self.AMPInstance.Console_Filtered)} | Console Filtered Type: {self.AMPInstance.Console_Filtered_Type}"
-        )
+        Return `True` to Continue, `False` to Return Message \n
+        Matches against the Server's compiled `AMPRegexFilter`; see `AMP_Console_Filter`."""
         if self.AMPInstance.Console_Filtered:
             # This is to prevent Regex filtering on Chat Messages.
             if message["Type"] == "Chat":
@@ -232,31 +587,22 @@ class AMPConsole:
 
             if self.DB_Server is None:
                 return False
-            regex = self.DB_Server.GetServerRegexPatterns()
+            regex = AMP_Console_Filter.getFilterCache().get(self.DB_Server)
 
             if len(regex) == 0:
                 return return_bool
 
-            for pattern in regex:
-                flag = re.search(regex[pattern]["Pattern"], message["Contents"])
-                if flag != None:
-                    # 0 = Console | 1 = Event
-                    # This is Console Regex Filtering
-                    self.logger.dev(f"Regex Pattern Type: {regex[pattern]['Type']} == Console Filter Type")
-                    if regex[pattern]["Type"] == self.FILTER_TYPE_CONSOLE:
-                        return not return_bool
-
-                    # This is Event Regex Filtering
-                    self.logger.dev(f"Regex Pattern Type: {regex[pattern]['Type']} == Event Filter Type")
-                    if regex[pattern]["Type"] == self.FILTER_TYPE_EVENT:
-                        if return_bool == True:  # If Whitelist; then allow Event messages to be handled.
-                            self.console_event_message_lock.acquire()
-                            self.console_event_messages.append(message["Contents"])
-                            self.console_event_message_lock.release()
-                        return not return_bool
-            else:
-                self.logger.dev(f"Filtered Message: {message}")
+            pattern_type, name = regex.match(message["Contents"])
+            if pattern_type == None:
+                self.logger.dev("Filtered Message: %s", message)
                 return return_bool
+
+            # 0 = Console | 1 = Event
+            self.logger.dev("Regex Pattern %s (Type: %s) matched", name, pattern_type)
+            if pattern_type == self.FILTER_TYPE_EVENT and return_bool == True and "Event" not in message:
+                # If Whitelist; then allow Event messages to be handled (unless `console_events()` already sent it).
+                self.console_event_messages.put(message["Contents"])
+            return not return_bool
         return False
 
     def console_chat(self, message: ConsoleEntry) -> None | bool:
@@ -276,17 +622,176 @@ class AMPConsole:
             # Removed the odd character for color indicators on text
             message["Contents"] = message["Contents"].replace("�", "")
 
-            self.console_chat_message_lock.acquire()
-            self.console_chat_messages.append(message)
-            self.console_chat_message_lock.release()
-
-            self.console_message_lock.acquire()
-            self.console_messages.append(f"{message['Source']}: {message['Contents']}")
-            self.console_message_lock.release()
+            self.console_chat_messages.put(message)
+            # Packed with the rest of the batch; a long chat line is split to Discord's limit like any other console line.
+            self.console_packer.add(f"{message['Source']}: {message['Contents']}")
             return True
         return False
 
-    # def console_events(self, message):
-    #     """This will handle all player join/leave/disconnects and other achievements. THIS SHOULD ALWAYS RETURN FALSE!
-    #     ALL events go to `self.console_event_messages` """
-    #     return False
+    def console_events(self, message: ConsoleEntry, stamp: int | None = None) -> bool:
+        """This will handle all player join/leave/disconnects and other achievements. THIS SHOULD ALWAYS RETURN FALSE! \n
+        ALL events go to `self.console_event_messages` and the `AMP_Console_Events.EventDispatcher` listeners; the line itself still goes on to the Console."""
+        if self.EVENT_PARSER == None:
+            return False
+
+        event = self.EVENT_PARSER.parse(message, self.AMPInstance.InstanceID, self.AMPInstance.FriendlyName, stamp if stamp != None else int(time.time() * 1000))
+        if event == None:
+            return False
+
+        if self.REPEATED_JOINS and event.type == AMP_Console_Events.EVENT_JOIN and AMP_Players.Tracker != None and AMP_Players.Tracker.is_online(event.InstanceID, event.player):
+            return False
+
+        self.logger.dev(f"Console Event {event!r}")
+        message["Event"] = event.type
+        self.console_event_messages.put(str(event))
+        AMP_Console_Events.getEventDispatcher().publish(event)
+        return False
+
+
+class AMPConsolePoller:
+    """Polls `Core/GetUpdates` for every AMPConsole from one scheduler thread and a bounded pool of worker threads. \n
+    Replaces the thread per Instance `console_parse_loop`; each AMPConsole sets its own `poll_interval` and `poll_limit` (requests in flight).
+    `poll_interval` is read when a poll is handed out; a poll that shortens it (entries arrived) pulls the next poll forward."""
+
+    def __init__(self, workers: int = 4) -> None:
+        self.logger = logging.getLogger()
+        self.workers: int = max(1, workers)
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="AMP Console")
+        # [(when the poll is due (time.monotonic()), sequence, AMPConsole)]
+        self._heap: list[tuple[float, int, AMPConsole]] = []
+        self._sequence = itertools.count()
+        self._consoles: dict[str | int, AMPConsole] = {}
+        # {InstanceID: sequence of the console's live schedule entry}
+        self._latest: dict[str | int, int] = {}
+        # {InstanceID: when the console's live schedule entry is due}
+        self._due: dict[str | int, float] = {}
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+        self.polls: int = 0
+        # Polls held back because the Instance already had `poll_limit` requests in flight.
+        self.deferred: int = 0
+        self.poll_time: float = 0
+
+    def _schedule(self, console: AMPConsole, due: float) -> None:
+        """Replaces the console's schedule entry; the older one is skipped when it comes due."""
+        sequence = next(self._sequence)
+        self._latest[console.AMPInstance.InstanceID] = sequence
+        self._due[console.AMPInstance.InstanceID] = due
+        heapq.heappush(self._heap, (due, sequence, console))
+        self._cond.notify()
+
+    def register(self, console: AMPConsole, delay: float = 5) -> None:
+        """Starts polling `console` after `delay` seconds; also starts the scheduler thread on first use."""
+        with self._cond:
+            if self._consoles.get(console.AMPInstance.InstanceID) is console:
+                return
+            self._consoles[console.AMPInstance.InstanceID] = console
+            self._schedule(console, time.monotonic() + delay)
+
+            if self._thread == None:
+                self._thread = threading.Thread(target=self.run, name="AMP Console Poller", daemon=True)
+                self._thread.start()
+
+    def unregister(self, console: AMPConsole) -> None:
+        """Stops polling `console`; its pending schedule entry is dropped when it comes due."""
+        with self._cond:
+            if self._consoles.get(console.AMPInstance.InstanceID) is console:
+                self._consoles.pop(console.AMPInstance.InstanceID)
+
+    def _pull_forward(self, console: AMPConsole, due: float) -> None:
+        """Moves the console's next poll up to `due` if it is currently scheduled later; call with `_cond` held."""
+        instance_id = console.AMPInstance.InstanceID
+        if self._consoles.get(instance_id) is console and self._due.get(instance_id, 0) > due:
+            self._schedule(console, due)
+
+    def wake(self, console: AMPConsole) -> None:
+        """Polls `console` as soon as a worker is free instead of waiting out its current delay."""
+        with self._cond:
+            self._pull_forward(console, time.monotonic())
+
+    def run(self) -> None:
+        """The `AMP Console Poller` thread; hands due polls to the worker pool."""
+        while True:
+            with self._cond:
+                while not len(self._heap) or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(timeout=(self._heap[0][0] - time.monotonic()) if len(self._heap) else None)
+
+                due, sequence, console = heapq.heappop(self._heap)
+                # Unregistered, or replaced by a later `_schedule()` (eg. `wake()`).
+                instance_id = console.AMPInstance.InstanceID
+                if self._consoles.get(instance_id) is not console or self._latest.get(instance_id) != sequence:
+                    continue
+
+                now = time.monotonic()
+                try:
+                    delay = console.poll_delay()
+                except Exception:
+                    self.logger.error(f"**ERROR** Console poll check failed for {console.AMPInstance.FriendlyName} - {traceback.format_exc()}")
+                    delay = 10
+
+                if delay > 0:
+                    self._schedule(console, now + delay)
+                    continue
+
+                if console.poll_inflight >= console.poll_limit:
+                    self.deferred += 1
+                    self._schedule(console, now + console.poll_interval)
+                    continue
+
+                console.poll_inflight += 1
+                # Keep the cadence of `poll_interval`, unless we are already behind.
+                self._schedule(console, max(due + console.poll_interval, now))
+
+            self._executor.submit(self._poll, console)
+
+    def _poll(self, console: AMPConsole) -> None:
+        start = time.perf_counter()
+        try:
+            console.console_poll()
+        except Exception:
+            self.logger.error(f"**ERROR** Console poll failed for {console.AMPInstance.FriendlyName} - {traceback.format_exc()}")
+        finally:
+            with self._cond:
+                console.poll_inflight -= 1
+                self.polls += 1
+                self.poll_time += time.perf_counter() - start
+                # An idle console that just got entries; don't wait out the backed off interval.
+                self._pull_forward(console, time.monotonic() + console.poll_interval)
+
+    def stats(self) -> dict[str, int | float]:
+        with self._cond:
+            polling = [console for console in self._consoles.values() if console.console_thread_running]
+            return {
+                "consoles": len(self._consoles),
+                "polling": len(polling),
+                # Consoles polled slower than their `poll_base` because they have been idle.
+                "idle": sum(1 for console in polling if console.poll_interval > console.poll_base),
+                "mean_interval": sum(console.poll_interval for console in polling) / len(polling) if len(polling) else 0,
+                "workers": self.workers,
+                "in_flight": sum(console.poll_inflight for console in self._consoles.values()),
+                "polls": self.polls,
+                "deferred": self.deferred,
+                "mean_poll": self.poll_time / self.polls if self.polls else 0,
+            }
+
+
+Poller = None
+# Called with `(AMPConsole, ConsoleQueue)` from the poller threads when a console queue has something to relay; see `set_relay_listener()`.
+Relay_Listener: Callable[[AMPConsole, ConsoleQueue], None] | None = None
+
+
+def set_relay_listener(listener: Callable[[AMPConsole, ConsoleQueue], None] | None) -> None:
+    """Sets the Global console queue listener (the `AMP_Tasks` relay); `None` removes it."""
+    global Relay_Listener
+    Relay_Listener = listener
+
+
+def getConsolePoller() -> AMPConsolePoller:
+    """Returns the Global AMPConsolePoller; otherwise creates it using the `AMP_Console_Workers` setting."""
+    global Poller
+    if Poller == None:
+        workers = DB.getDBHandler().DBConfig.GetSetting("AMP_Console_Workers")
+        Poller = AMPConsolePoller(workers=int(workers) if workers != None else 4)
+    return Poller
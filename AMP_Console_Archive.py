@@ -0,0 +1,263 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Per Instance console archive. \n
+Every console entry is appended to gzip compressed segments in `console_archive/<InstanceID>/`. Lines are buffered and written
+as one gzip member per block; each segment has a sparse `.idx` with a `first last offset length` line per block, so a search
+only decompresses the blocks overlapping its time range, one at a time. \n
+Segments rotate by size and age and are deleted after `Console_Archive_Days`.
+"""
+
+from __future__ import annotations
+
+import gzip
+import logging
+import pathlib
+import re
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from AMP_Console import ConsoleEntry
+
+ARCHIVE_DIR = "console_archive"
+# Uncompressed bytes or seconds a block buffers before it is written; a crash loses at most this much.
+BLOCK_SIZE = 64 * 1024
+BLOCK_AGE = 10
+SEGMENT_AGE = 24 * 60 * 60
+
+# Relative `since`/`until` values; eg. `30m`, `2h`, `7d`.
+_RELATIVE = re.compile(r"(\d+)\s*([smhdw])")
+_RELATIVE_FULL = re.compile(r"(?:\d+\s*[smhdw]\s*)+")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class ArchiveMatch:
+    __slots__ = ("timestamp", "type", "source", "contents")
+
+    def __init__(self, timestamp: int, type: str, source: str, contents: str) -> None:
+        self.timestamp: int = timestamp
+        self.type: str = type
+        self.source: str = source
+        self.contents: str = contents
+
+    def __str__(self) -> str:
+        return f"[{datetime.fromtimestamp(self.timestamp / 1000).strftime('%Y-%m-%d %H:%M:%S')}] {self.source}: {self.contents}"
+
+
+def parse_time(value: str) -> int:
+    """Epoch milliseconds from `30m`/`2h`/`7d` ago (combinations like `1d12h` work) or an ISO date/time (local time). \n
+    Raises `ValueError` for anything else."""
+    value = value.strip()
+    if _RELATIVE_FULL.fullmatch(value):
+        seconds = sum(int(amount) * _UNITS[unit] for amount, unit in _RELATIVE.findall(value))
+        return int((time.time() - seconds) * 1000)
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return re.sub(r"\\(.)", lambda match: {"n": "\n", "r": "\r"}.get(match.group(1), match.group(1)), value)
+
+
+class ConsoleArchive:
+    """Append only, rotated and compressed console history of one Instance. \n
+    `append()` is called by the console poll of the Instance and `search()` from the command thread; both take `_lock` only while touching the buffer or a segment."""
+
+    def __init__(self, InstanceID: str, retention_days: float = 14, segment_size: int = 16, root: pathlib.Path | str | None = None) -> None:
+        self.logger = logging.getLogger()
+        self.InstanceID: str = InstanceID
+        self.retention: float = retention_days * 86400
+        # Compressed MB before a segment rotates.
+        self.segment_size: int = segment_size * 1024 * 1024
+        self.path: pathlib.Path = pathlib.Path(root if root != None else pathlib.Path.cwd().joinpath(ARCHIVE_DIR)).joinpath(InstanceID)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._buffer: list[str] = []
+        self._buffer_size: int = 0
+        self._buffer_started: float = 0
+        self._first: int | None = None
+        self._last: int | None = None
+
+        # The newest segment keeps growing after a restart until it is due to rotate.
+        segments = self.segments()
+        self._segment: int | None = segments[-1] if len(segments) else None
+        if self._segment != None:
+            self._repair_index(self._segment)
+
+        self.blocks: int = 0
+        self.bytes_in: int = 0
+        self.bytes_out: int = 0
+
+    def segments(self) -> list[int]:
+        """Segment names (epoch ms of their first entry), oldest first."""
+        return sorted(int(path.name.split(".")[0]) for path in self.path.glob("*.log.gz") if path.name.split(".")[0].isdigit())
+
+    def _segment_path(self, segment: int) -> pathlib.Path:
+        return self.path.joinpath(f"{segment}.log.gz")
+
+    def _index_path(self, segment: int) -> pathlib.Path:
+        return self.path.joinpath(f"{segment}.idx")
+
+    def _repair_index(self, segment: int) -> None:
+        """Ends a line torn by a crash mid write; the next block's line would otherwise be glued onto it and lost with it."""
+        try:
+            with open(self._index_path(segment), "rb+") as index:
+                if index.seek(0, 2) == 0:
+                    return
+                index.seek(-1, 2)
+                if index.read(1) != b"\n":
+                    index.write(b"\n")
+        except OSError:
+            pass
+
+    def append(self, timestamp: int, entry: ConsoleEntry) -> None:
+        line = f"{timestamp}\t{entry['Type']}\t{_escape(entry['Source']).replace(chr(9), ' ')}\t{_escape(entry['Contents'])}\n"
+        with self._lock:
+            if not len(self._buffer):
+                self._buffer_started = time.monotonic()
+                self._first = timestamp
+            self._buffer.append(line)
+            self._buffer_size += len(line)
+            self._last = max(timestamp, self._last if self._last != None else timestamp)
+
+    def flush(self, force: bool = True) -> None:
+        """Writes the buffered lines as a block; without `force` only once the block is `BLOCK_SIZE` or `BLOCK_AGE` seconds old."""
+        with self._lock:
+            if not len(self._buffer):
+                return
+            if not force and self._buffer_size < BLOCK_SIZE and time.monotonic() - self._buffer_started < BLOCK_AGE:
+                return
+            try:
+                self._write_block()
+            except OSError as e:
+                self.logger.error(f"**ERROR** Failed to write the Console archive of {self.InstanceID} - {e}")
+
+    def _write_block(self) -> None:
+        data = "".join(self._buffer).encode("utf-8", errors="replace")
+        first, last = self._first, self._last
+        self._buffer = []
+        self._buffer_size = 0
+        self._first = self._last = None
+
+        if self._segment == None or first - self._segment >= SEGMENT_AGE * 1000 or self._segment_path(self._segment).stat().st_size >= self.segment_size:
+            self._rotate(first)
+
+        block = gzip.compress(data, mtime=0)
+        with open(self._segment_path(self._segment), "ab") as segment:
+            offset = segment.tell()
+            segment.write(block)
+        with open(self._index_path(self._segment), "a", encoding="utf-8") as index:
+            index.write(f"{first} {last} {offset} {len(block)}\n")
+
+        self.blocks += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(block)
+
+    def _rotate(self, first: int) -> None:
+        """Starts a new segment at `first` and deletes segments that ended before the retention window."""
+        segments = self.segments()
+        self._segment = max(first, segments[-1] + 1 if len(segments) else first)
+        self._segment_path(self._segment).touch()
+
+        expired = first - self.retention * 1000
+        for segment in segments:
+            last = self._segment_last(segment)
+            if last != None and last < expired:
+                self._segment_path(segment).unlink(missing_ok=True)
+                self._index_path(segment).unlink(missing_ok=True)
+                self.logger.dev(f"Removed the Console archive segment {segment} of {self.InstanceID}")
+
+    def _segment_last(self, segment: int) -> int | None:
+        last = None
+        try:
+            with open(self._index_path(segment), encoding="utf-8") as index:
+                for line in index:
+                    last = int(line.split(" ", 2)[1])
+        except (OSError, ValueError, IndexError):
+            pass
+        return last
+
+    def _blocks(self, segment: int) -> Iterator[tuple[int, int, int, int]]:
+        try:
+            with open(self._index_path(segment), encoding="utf-8") as index:
+                for line in index:
+                    try:
+                        first, last, offset, length = (int(value) for value in line.split())
+                    except ValueError:
+                        # A torn line from a crash mid write.
+                        continue
+                    yield first, last, offset, length
+        except FileNotFoundError:
+            return
+
+    def search(self, pattern: re.Pattern, since: int | None = None, until: int | None = None) -> Iterator[ArchiveMatch]:
+        """Yields the archived entries whose Contents match `pattern` between `since` and `until` (epoch ms), oldest first. \n
+        Only the blocks overlapping the range are read and each one is decompressed on its own."""
+        self.flush()
+        for segment in self.segments():
+            # Segments are named after their first entry; this and every later one start after `until`.
+            if until != None and segment > until:
+                break
+
+            for first, last, offset, length in self._blocks(segment):
+                if since != None and last < since:
+                    continue
+                if until != None and first > until:
+                    break
+
+                try:
+                    with open(self._segment_path(segment), "rb") as file:
+                        file.seek(offset)
+                        data = gzip.decompress(file.read(length)).decode("utf-8", errors="replace")
+                except (OSError, EOFError) as e:
+                    # Removed by retention meanwhile or damaged; skip the block.
+                    self.logger.warning(f"**ATTENTION** Skipping a Console archive block of {self.InstanceID} - {e}")
+                    continue
+
+                # Records end in `\n` only; `splitlines()` would also split on the `\x0b`, `\x1c` or `\u2028` a console line may contain.
+                for line in data.split("\n"):
+                    parts = line.split("\t", 3)
+                    if len(parts) != 4:
+                        continue
+                    timestamp = int(parts[0])
+                    if (since != None and timestamp < since) or (until != None and timestamp > until):
+                        continue
+                    contents = _unescape(parts[3])
+                    if pattern.search(contents) != None:
+                        yield ArchiveMatch(timestamp, parts[1], _unescape(parts[2]), contents)
+
+    def stats(self) -> dict[str, int]:
+        segments = self.segments()
+        return {
+            "segments": len(segments),
+            "size": sum(self._segment_path(segment).stat().st_size for segment in segments),
+            "blocks": self.blocks,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
@@ -0,0 +1,162 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Structured player events from console lines. \n
+Each game module's Console class sets `EVENT_PARSER` to an `EventParser` with its join/leave/death/achievement matchers;
+`AMPConsole.console_events()` runs it on every console entry, queues the event for the Servers Event channel and hands it
+to the `EventDispatcher` listeners (player tracking, stats, etc.).
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from typing import TYPE_CHECKING, Callable
+
+from AMP_Console_Filter import required_literals
+
+if TYPE_CHECKING:
+    from AMP_Console import ConsoleEntry
+
+EVENT_JOIN = "join"
+EVENT_LEAVE = "leave"
+EVENT_DEATH = "death"
+EVENT_ACHIEVEMENT = "achievement"
+
+Dispatcher = None
+
+
+class ConsoleEvent:
+    """A player event; `detail` is the death message or achievement name when the game prints one."""
+
+    __slots__ = ("type", "player", "detail", "InstanceID", "FriendlyName", "timestamp", "contents")
+
+    def __init__(self, type: str, player: str, detail: str | None, InstanceID: str, FriendlyName: str, timestamp: int, contents: str) -> None:
+        self.type: str = type
+        self.player: str = player
+        self.detail: str | None = detail
+        self.InstanceID: str = InstanceID
+        self.FriendlyName: str = FriendlyName
+        # Epoch milliseconds of the console entry.
+        self.timestamp: int = timestamp
+        self.contents: str = contents
+
+    def __str__(self) -> str:
+        if self.type == EVENT_JOIN:
+            return f"**{self.player}** joined the server"
+        if self.type == EVENT_LEAVE:
+            return f"**{self.player}** left the server"
+        if self.type == EVENT_DEATH:
+            return f"**{self.player}** {self.detail}" if self.detail != None else f"**{self.player}** died"
+        if self.type == EVENT_ACHIEVEMENT:
+            return f"**{self.player}** earned **{self.detail}**" if self.detail != None else f"**{self.player}** earned an achievement"
+        return self.contents
+
+    def __repr__(self) -> str:
+        return f"ConsoleEvent({self.type!r}, {self.player!r}, {self.detail!r}, {self.FriendlyName!r})"
+
+
+class EventParser:
+    """A game's event matchers, compiled once. \n
+    `rules` are `(event type, pattern)`; every pattern names the player with a `player` group and may capture a `detail` group.
+    Rules are tried in order and the first match wins. A rule whose pattern has a required literal (see `AMP_Console_Filter.required_literals()`)
+    is only run on lines containing it. `Chat` entries are never parsed; players can type anything."""
+
+    def __init__(self, name: str, rules: list[tuple[str, str]]) -> None:
+        self.name: str = name
+        # [(event type, pattern, [(literal, ignorecase)] or None)]
+        self.rules: list[tuple[str, re.Pattern, list[tuple[str, bool]] | None]] = []
+        for event_type, pattern in rules:
+            compiled = re.compile(pattern)
+            if "player" not in compiled.groupindex:
+                raise ValueError(f"{name} {event_type} pattern has no `player` group: {pattern}")
+            try:
+                literals = required_literals(pattern)
+            except Exception:
+                literals = None
+            # Case insensitive literals would need a lowered line; just run those patterns.
+            if literals != None and any(ignorecase for _, ignorecase in literals):
+                literals = None
+            self.rules.append((event_type, compiled, literals))
+
+    def match(self, contents: str) -> tuple[str, str, str | None] | None:
+        """`(event type, player, detail)` of the first rule matching `contents`; `None` without a match."""
+        for event_type, compiled, literals in self.rules:
+            if literals != None:
+                for literal, _ in literals:
+                    if literal in contents:
+                        break
+                else:
+                    continue
+
+            match = compiled.search(contents)
+            if match != None:
+                groups = match.groupdict()
+                return event_type, groups["player"], groups.get("detail")
+        return None
+
+    def parse(self, entry: ConsoleEntry, InstanceID: str, FriendlyName: str, timestamp: int) -> ConsoleEvent | None:
+        if entry["Type"] == "Chat":
+            return None
+        found = self.match(entry["Contents"])
+        if found == None:
+            return None
+        return ConsoleEvent(found[0], found[1].strip(), found[2], InstanceID, FriendlyName, timestamp, entry["Contents"])
+
+
+class EventDispatcher:
+    """Hands every `ConsoleEvent` to the subscribed listeners. \n
+    Listeners run on the `AMPConsolePoller` worker thread that parsed the event; they must be quick and thread safe,
+    and hand anything slow (DB writes, Discord) off to their own queue or loop (`loop.call_soon_threadsafe`)."""
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger()
+        self._listeners: list[tuple[Callable[[ConsoleEvent], None], frozenset[str] | None]] = []
+        self._lock = threading.Lock()
+        self.published: int = 0
+
+    def subscribe(self, listener: Callable[[ConsoleEvent], None], types: list[str] | None = None) -> None:
+        """Calls `listener(event)` for every event, or only those of `types`."""
+        with self._lock:
+            self._listeners = self._listeners + [(listener, frozenset(types) if types != None else None)]
+
+    def unsubscribe(self, listener: Callable[[ConsoleEvent], None]) -> None:
+        with self._lock:
+            self._listeners = [entry for entry in self._listeners if entry[0] != listener]
+
+    def publish(self, event: ConsoleEvent) -> None:
+        self.published += 1
+        # `subscribe()` replaces the list, so iterating the current one needs no lock.
+        for listener, types in self._listeners:
+            if types != None and event.type not in types:
+                continue
+            try:
+                listener(event)
+            except Exception as e:
+                self.logger.error(f"**ERROR** Console event listener {getattr(listener, '__qualname__', listener)} failed on {event!r} - {e}")
+
+
+def getEventDispatcher() -> EventDispatcher:
+    """Returns the Global EventDispatcher; otherwise creates it."""
+    global Dispatcher
+    if Dispatcher == None:
+        Dispatcher = EventDispatcher()
+    return Dispatcher
@@ -0,0 +1,466 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Callable
+
+import DB
+
+# The `re` parser is private; without it patterns simply get no literal prefilter and no nested quantifier check.
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    try:  # Python < 3.11
+        import sre_constants
+        import sre_parse
+    except ImportError:
+        sre_constants = None
+        sre_parse = None
+
+if TYPE_CHECKING:
+    from DB import DBServer
+
+# RegexPatterns `Type`
+FILTER_TYPE_CONSOLE = 0
+FILTER_TYPE_EVENT = 1
+
+# A leading global inline flag group, eg. `(?i)`; rewritten as a scoped group so the pattern can share an alternation.
+# Verbose `(?x)` patterns are left alone, a trailing comment would swallow the closing parenthesis.
+_GLOBAL_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+# Numbered or named back references only work against their own pattern's groups.
+_BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+# Shortest literal worth prefiltering on; anything shorter is in nearly every line anyway.
+MIN_LITERAL = 3
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) if sre_constants != None else ()
+
+# A pattern is only Disabled once it blows the budget on `OVERRUN_LIMIT` lines within `OVERRUN_WINDOW` seconds; one slow line
+# is logged, then further warnings for that pattern back off from `OVERRUN_BACKOFF` seconds doubling up to `OVERRUN_BACKOFF_MAX`.
+OVERRUN_LIMIT = 3
+OVERRUN_WINDOW = 600
+OVERRUN_BACKOFF = 60
+OVERRUN_BACKOFF_MAX = 3600
+
+# Runs in a child process so a runaway pattern can be killed; prints the slowest sample time in seconds.
+_PROBE = """
+import json, re, sys, time
+job = json.load(sys.stdin)
+compiled = re.compile(job["pattern"])
+slowest = 0
+for sample in job["samples"]:
+    start = time.perf_counter()
+    compiled.search(sample)
+    slowest = max(slowest, time.perf_counter() - start)
+print(slowest)
+"""
+
+Filters = None
+
+
+def required_literals(pattern: str) -> list[tuple[str, bool]] | None:
+    """Literal substrings of which at least one appears in every match of `pattern`, as `[(literal, ignorecase)]`. \n
+    Found by walking the `re` parser's tree: runs of literal characters, required groups, repeats with a minimum of one
+    and alternations whose every branch has a literal. Returns `None` when the pattern has no literal of `MIN_LITERAL` characters or the `re` parser is unavailable."""
+    if sre_parse == None:
+        return None
+    parsed = sre_parse.parse(pattern)
+    return _literals(parsed, bool(parsed.state.flags & sre_constants.SRE_FLAG_IGNORECASE))
+
+
+def _literals(items, ignorecase: bool) -> list[tuple[str, bool]] | None:
+    candidates: list[list[tuple[str, bool]]] = []
+    run: list[str] = []
+
+    def flush() -> None:
+        if len(run):
+            candidates.append([("".join(run).lower() if ignorecase else "".join(run), ignorecase)])
+            run.clear()
+
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+
+        flush()
+        found = None
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            found = _literals(sub, (ignorecase or bool(add_flags & sre_constants.SRE_FLAG_IGNORECASE)) and not del_flags & sre_constants.SRE_FLAG_IGNORECASE)
+        elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+            found = _literals(av, ignorecase)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, "POSSESSIVE_REPEAT", None)):
+            if av[0] >= 1:
+                found = _literals(av[2], ignorecase)
+        elif op is sre_constants.BRANCH:
+            branches = [_literals(branch, ignorecase) for branch in av[1]]
+            if all(branch != None for branch in branches):
+                found = [literal for branch in branches for literal in branch]
+
+        if found != None:
+            candidates.append(found)
+    flush()
+
+    # The alternative whose shortest literal is longest; it rules out the most lines.
+    candidates = [candidate for candidate in candidates if min(len(literal) for literal, _ in candidate) >= MIN_LITERAL]
+    if not len(candidates):
+        return None
+    return max(candidates, key=lambda candidate: (min(len(literal) for literal, _ in candidate), -len(candidate)))
+
+
+def nested_quantifier(pattern: str) -> bool:
+    """`True` if `pattern` repeats something that itself repeats a variable number of times, eg. `(a+)+` or `(\\w+\\s?)*`. \n
+    The classic catastrophic backtracking shape; the `re` module tries every way of splitting the input between the two repeats.
+    Atomic groups and possessive repeats never backtrack and are skipped; `False` when the `re` parser is unavailable or has changed shape."""
+    if sre_parse == None:
+        return False
+    try:
+        return _nested(sre_parse.parse(pattern), False)
+    except (AttributeError, TypeError, ValueError):
+        return False
+
+
+def _nested(items, repeated: bool) -> bool:
+    for op, av in items:
+        if op in _REPEATS:
+            low, high, sub = av
+            variable = low != high
+            if repeated and variable:
+                return True
+            if _nested(sub, repeated or (high > 1 and (variable or high == sre_constants.MAXREPEAT))):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _nested(av[3], repeated):
+                return True
+        elif op is sre_constants.BRANCH:
+            if any(_nested(branch, repeated) for branch in av[1]):
+                return True
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            if _nested(av[1], repeated):
+                return True
+    return False
+
+
+def sample_lines(pattern: str) -> list[str]:
+    """Lines that tend to expose slow patterns: short and long runs of the pattern's own characters (and a few common classes)
+    ending in a character that breaks the match, plus a couple of ordinary console lines."""
+    characters = [character for character in dict.fromkeys(pattern) if character.isprintable() and character not in "\\()[]{}?*+|^$"]
+    characters = (characters + ["a", "A", "0", " ", "_", "-", ".", ":"])[:24]
+
+    samples = [
+        "[12:00:00] [Server thread/INFO]: Steve joined the game",
+        "[12:00:00] [Server thread/WARN]: Can't keep up! Is the server overloaded? Running 2012ms or 40 ticks behind",
+    ]
+    for character in characters:
+        samples.append(character * 32 + "\x00")
+        samples.append(character * 4096 + "\x00")
+    return samples
+
+
+def check_pattern(pattern: str, budget: float = 0.05) -> str | None:
+    """Vets a moderator supplied Regex Pattern before it is stored; returns why it was rejected or `None` if it is fine. \n
+    Checks that it compiles, has no nested quantifiers and that none of `sample_lines()` takes longer than `budget` seconds;
+    the samples run in a child process that is killed once the whole run exceeds its share of the budget."""
+    try:
+        re.compile(pattern)
+    except (re.error, TypeError) as e:
+        return f"Invalid pattern - {e}"
+
+    if nested_quantifier(pattern):
+        return "Nested quantifiers (eg. `(a+)+`) can backtrack catastrophically; use a single quantifier or a possessive/atomic group"
+
+    samples = sample_lines(pattern)
+    try:
+        probe = subprocess.run(
+            [sys.executable, "-c", _PROBE],
+            input=json.dumps({"pattern": pattern, "samples": samples}),
+            capture_output=True,
+            text=True,
+            # Interpreter start up plus every sample at the budget.
+            timeout=2 + budget * len(samples),
+        )
+    except subprocess.TimeoutExpired:
+        return f"Timed out against the sample lines (budget {budget * 1000:.0f}ms per line)"
+
+    try:
+        slowest = float(probe.stdout)
+    except ValueError:
+        return f"Failed against the sample lines - {probe.stderr.strip()[-200:]}"
+
+    if slowest > budget:
+        return f"Took {slowest * 1000:.0f}ms on one sample line (budget {budget * 1000:.0f}ms)"
+    return None
+
+
+class AMPRegexFilter:
+    """One Server's `ServerRegexPatterns`, compiled. \n
+    Most console filters are really literal strings ("Can't keep up!", "[Server thread/INFO]", mod loader spam), so every pattern
+    with a required literal (see `required_literals()`) is only run on lines that contain one of its literals; a line is scanned
+    with C level substring searches and the regex engine never sees the lines that cannot match. \n
+    The remaining patterns of a Type are joined into a single non capturing alternation, so a line costs one `search()` per Type
+    instead of one per pattern; only after it matches are its patterns tried one by one to name the match. Capturing (named) groups in
+    the alternation make every search about ten times slower. Patterns that cannot share an alternation (back references, their own
+    named groups, verbose flags) get a pass of their own. \n
+    Event patterns are checked before Console patterns; Disabled patterns are skipped. \n
+    Every regex search is timed into `timings`; a pattern that takes longer than `budget` seconds on a line is reported through
+    `on_overrun(ID, Name, seconds)` each time, or logged once when there is no `on_overrun`. A slow alternation is re-run pattern by
+    pattern on that line to find the culprit."""
+
+    def __init__(
+        self,
+        patterns: dict[int, dict[str, Any]],
+        budget: float | None = None,
+        on_overrun: Callable[[int, str, float], None] | None = None,
+        timings: dict[int | None, list[float]] | None = None,
+    ) -> None:
+        self.logger = logging.getLogger()
+        self.budget: float | None = budget
+        self.on_overrun = on_overrun
+        # {RegexPatterns ID (`None` for the alternations): [searches, total seconds, slowest seconds]}
+        self.timings: dict[int | None, list[float]] = timings if timings != None else {}
+        self._overran: set[int] = set()
+
+        # {Type: [([(literal, ignorecase)], pattern, RegexPatterns ID, Name)]}
+        self.prefiltered: dict[int, list[tuple[list[tuple[str, bool]], re.Pattern, int, str]]] = {}
+        # {Type: [(alternation or standalone pattern, [(pattern, RegexPatterns ID, Name)])]}
+        self.passes: dict[int, list[tuple[re.Pattern, list[tuple[re.Pattern, int, str]]]]] = {}
+        # Set if any prefilter literal is case insensitive; `match()` then lowers each line once.
+        self.ignorecase: bool = False
+        self.count: int = 0
+
+        # {Type: ([alternatives], [(pattern, ID, Name)])}
+        combined: dict[int, tuple[list[str], list[tuple[re.Pattern, int, str]]]] = {}
+        for ID, entry in patterns.items():
+            if entry.get("Disabled"):
+                continue
+
+            try:
+                compiled = re.compile(entry["Pattern"])
+            except (re.error, TypeError) as e:
+                self.logger.error(f"**ERROR** Skipping the invalid Regex Pattern `{entry['Name']}` - {e}")
+                continue
+
+            self.count += 1
+            try:
+                literals = required_literals(entry["Pattern"])
+            except Exception:
+                literals = None
+
+            if literals != None:
+                self.prefiltered.setdefault(entry["Type"], []).append((literals, compiled, ID, entry["Name"]))
+                self.ignorecase = self.ignorecase or any(ignorecase for _, ignorecase in literals)
+                continue
+
+            pattern: str = entry["Pattern"]
+            flags = _GLOBAL_FLAGS.match(pattern)
+            if flags != None and "x" not in flags.group(1):
+                pattern = f"(?{flags.group(1)}:{pattern[flags.end():]})"
+                flags = None
+
+            if flags != None or len(compiled.groupindex) or _BACKREFERENCE.search(pattern):
+                self.passes.setdefault(entry["Type"], []).append((compiled, [(compiled, ID, entry["Name"])]))
+                continue
+
+            alternatives, members = combined.setdefault(entry["Type"], ([], []))
+            alternatives.append(f"(?:{pattern})")
+            members.append((compiled, ID, entry["Name"]))
+
+        for pattern_type, (alternatives, members) in combined.items():
+            try:
+                self.passes.setdefault(pattern_type, []).insert(0, (re.compile("|".join(alternatives)), members))
+            except re.error as e:
+                # Shouldn't happen after the checks above; fall back to one pass per pattern.
+                self.logger.warning(f"**ATTENTION** Regex Patterns could not be combined, matching them one by one - {e}")
+                for member in members:
+                    self.passes[pattern_type].append((member[0], [member]))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _search(self, compiled: re.Pattern, ID: int | None, name: str | None, contents: str, members: list | None = None) -> bool:
+        start = time.perf_counter()
+        found = compiled.search(contents) != None
+        elapsed = time.perf_counter() - start
+
+        # Unlocked; a lost update between two console workers only skews the stats.
+        timing = self.timings.get(ID)
+        if timing == None:
+            timing = self.timings.setdefault(ID, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += elapsed
+        if elapsed > timing[2]:
+            timing[2] = elapsed
+
+        if self.budget != None and elapsed > self.budget:
+            if members != None:
+                # An alternation; find out which of its patterns is slow on this line.
+                for member in members:
+                    self._search(member[0], member[1], member[2], contents)
+            elif self.on_overrun != None:
+                self.on_overrun(ID, name, elapsed)
+            elif ID not in self._overran:
+                self._overran.add(ID)
+                self.logger.warning(f"**ATTENTION** Regex Pattern `{name}` took {elapsed * 1000:.0f}ms on one console line (budget {self.budget * 1000:.0f}ms)")
+        return found
+
+    def match(self, contents: str) -> tuple[int | None, str | None]:
+        """Returns the `(Type, Name)` of a Regex Pattern that matches `contents`; `(None, None)` without a match."""
+        # Lowering is only exact for ASCII; any other line passes the case insensitive literals straight to the regex.
+        folded = contents.lower() if self.ignorecase and contents.isascii() else None
+        for pattern_type in (FILTER_TYPE_EVENT, FILTER_TYPE_CONSOLE):
+            for literals, compiled, ID, name in self.prefiltered.get(pattern_type, ()):
+                for literal, ignorecase in literals:
+                    if ignorecase:
+                        if folded == None or literal in folded:
+                            break
+                    elif literal in contents:
+                        break
+                else:
+                    continue
+
+                if self._search(compiled, ID, name, contents):
+                    return pattern_type, name
+
+            for combined, members in self.passes.get(pattern_type, ()):
+                if len(members) == 1:
+                    compiled, ID, name = members[0]
+                    if self._search(compiled, ID, name, contents):
+                        return pattern_type, name
+                    continue
+
+                if not self._search(combined, None, None, contents, members):
+                    continue
+
+                for compiled, ID, name in members:
+                    if compiled.search(contents) != None:
+                        return pattern_type, name
+                return pattern_type, None
+        return None, None
+
+
+class AMPFilterCache:
+    """`AMPRegexFilter` per Server, built on first use and kept until `invalidate()`. \n
+    The regex cogs call `invalidate()` whenever RegexPatterns or ServerRegexPatterns change. \n
+    A pattern that blows the `Regex_Time_Budget` on a console line is tracked by `overrun()`; an occasional slow line is only logged,
+    repeated ones mark it Disabled in the DB (see `disable()`) and every filter is rebuilt without it."""
+
+    def __init__(self, budget: float | None = 0.05) -> None:
+        self.logger = logging.getLogger()
+        self.budget: float | None = budget
+        # {DBServer.ID: AMPRegexFilter}
+        self._filters: dict[int, AMPRegexFilter] = {}
+        self._lock = threading.Lock()
+        # Bumped by `invalidate()`; a filter built from rows read before that is not cached.
+        self._generation: int = 0
+        # Shared by every filter so they survive a rebuild; see `AMPRegexFilter.timings`.
+        self.timings: dict[int | None, list[float]] = {}
+        # {RegexPatterns ID: monotonic times of its recent overruns}
+        self._overruns: dict[int, deque[float]] = {}
+        # {RegexPatterns ID: (monotonic time the next warning may be logged, current back off in seconds)}
+        self._backoff: dict[int, tuple[float, float]] = {}
+
+        self.hits: int = 0
+        self.builds: int = 0
+
+    def get(self, db_server: DBServer) -> AMPRegexFilter:
+        with self._lock:
+            regex_filter = self._filters.get(db_server.ID)
+            if regex_filter != None:
+                self.hits += 1
+                return regex_filter
+            generation = self._generation
+
+        regex_filter = AMPRegexFilter(db_server.GetServerRegexPatterns(), budget=self.budget, on_overrun=self.overrun, timings=self.timings)
+        with self._lock:
+            self.builds += 1
+            if generation == self._generation:
+                self._filters[db_server.ID] = regex_filter
+        return regex_filter
+
+    def invalidate(self, ServerID: int | None = None) -> None:
+        """Drops one Server's filter (by `DBServer.ID`) or every filter."""
+        with self._lock:
+            self._generation += 1
+            if ServerID == None:
+                self._filters.clear()
+            else:
+                self._filters.pop(ServerID, None)
+
+    def overrun(self, ID: int, name: str, elapsed: float) -> None:
+        """Called by `AMPRegexFilter` each time a pattern takes longer than the budget on a line. \n
+        The `OVERRUN_LIMIT`th overrun within `OVERRUN_WINDOW` seconds disables the pattern; before that the overrun is logged,
+        backing off so a pattern that is slow now and then does not flood the log."""
+        now = time.monotonic()
+        with self._lock:
+            recent = self._overruns.setdefault(ID, deque(maxlen=OVERRUN_LIMIT))
+            recent.append(now)
+            if len(recent) == OVERRUN_LIMIT and now - recent[0] <= OVERRUN_WINDOW:
+                # Start over; a filter built before the rebuild may still report this pattern a few more times.
+                recent.clear()
+                self._backoff.pop(ID, None)
+                repeated = True
+            else:
+                repeated = False
+                quiet_until, backoff = self._backoff.get(ID, (0.0, OVERRUN_BACKOFF))
+                if now < quiet_until:
+                    return
+                self._backoff[ID] = (now + backoff, min(backoff * 2, OVERRUN_BACKOFF_MAX))
+
+        if repeated:
+            self.disable(ID, name, elapsed)
+        else:
+            self.logger.warning(f"**ATTENTION** Regex Pattern `{name}` took {elapsed * 1000:.0f}ms on one console line (budget {self.budget * 1000:.0f}ms)")
+
+    def disable(self, ID: int, name: str, elapsed: float) -> None:
+        """Marks the Regex Pattern Disabled with the reason shown in `/bot regex_pattern list`; patterns are shared, so every filter is rebuilt."""
+        reason = f"Over budget on {OVERRUN_LIMIT} console lines within {OVERRUN_WINDOW // 60} minutes, the last took {elapsed * 1000:.0f}ms (budget {self.budget * 1000:.0f}ms)"
+        try:
+            DB.getDBHandler().DB.SetRegexPatternDisabled(ID=ID, Disabled=True, Reason=reason)
+        except Exception as e:
+            self.logger.error(f"**ERROR** Failed to disable the Regex Pattern `{name}` - {e}")
+        self.logger.warning(f"**ATTENTION** Disabled the Regex Pattern `{name}`; {reason}. Update its pattern to enable it again.")
+        self.invalidate()
+
+    def timing(self, ID: int) -> tuple[int, float, float] | None:
+        """`(searches, mean seconds, slowest seconds)` of a pattern since start up; `None` if it never ran on its own."""
+        timing = self.timings.get(ID)
+        if timing == None or timing[0] == 0:
+            return None
+        return int(timing[0]), timing[1] / timing[0], timing[2]
+
+
+def getFilterCache() -> AMPFilterCache:
+    """Returns the Global AMPFilterCache; otherwise creates it using the `Regex_Time_Budget` setting (milliseconds)."""
+    global Filters
+    if Filters == None:
+        budget = DB.getDBHandler().DBConfig.GetSetting("Regex_Time_Budget")
+        Filters = AMPFilterCache(budget=float(budget) / 1000 if budget != None else 0.05)
+    return Filters
@@ -26,11 +26,15 @@ import os
 import pathlib
 import re
 import sys
+import threading
 import time
 import traceback
 from argparse import Namespace
+from typing import Callable
 
 import AMP
+import AMP_Players
+import AMP_Session
 import DB
 
 # import utils
@@ -41,18 +45,56 @@ AMP_setup = False
 def AMP_init(args: Namespace):
     global AMP_setup
     handler = getAMPHandler(args=args)
-    handler.setup_AMPInstances()
+    # Subscribed to the console events before any console is polled.
+    players = AMP_Players.getPlayerTracker()
+    try:
+        handler.setup_AMPInstances()
+    except Exception:
+        if handler.SuccessfulConnection:
+            raise
+
+    # Failed API calls just return; whether AMP was ever reached is only checked here, once.
+    if handler.SuccessfulConnection == False:
+        handler.logger.critical('Unable to connect to URL; please check Tokens.py -> AMPURL')
+        # We are on the `AMP Handler` thread; `sys.exit()` would only end this thread.
+        os._exit(-1)
     AMP_setup = True
+    threading.Thread(target=amp_instance_refresher, name='AMP Refresher', daemon=True).start()
+    threading.Thread(target=handler.Sessions.run, name='AMP Sessions', daemon=True).start()
+    threading.Thread(target=players.run, args=[handler], name='AMP Players', daemon=True).start()
     amp_server_instance_check()
 
 
+def amp_instance_refresher():
+    """Refreshes every AMP Instance's attributes (and the fleet status) from one `ADSModule/GetInstances` call every `AMP_Refresh_Interval` seconds."""
+    handler = getAMPHandler()
+    while True:
+        try:
+            result = handler.AMP.getInstances()
+            handler.AMP._updateInstanceAttributes(result)
+            if handler.DBConfig.GetSetting('AMP_Fleet_Status'):
+                handler.AMP._fleetStatus(result)
+
+        except Exception:
+            handler.logger.error(f'**ERROR** Failed to refresh the AMP Instance attributes - {traceback.format_exc()}')
+
+        interval = handler.DBConfig.GetSetting('AMP_Refresh_Interval')
+        time.sleep(float(interval) if interval != None else 5)
+
+
 def amp_server_instance_check():
     """Checks for new AMP Instances every 30 seconds.."""
     while True:
         handler = getAMPHandler()
         handler.logger.dev('Checking AMP Instance(s) Status...')
-        handler._instanceValidation(AMP=handler.AMP)
-        handler.AMP._instance_ThreadManager()
+        # One GetInstances call is used for both new Instance validation and the fleet status.
+        result = handler.AMP.getInstances()
+        handler._instanceValidation(AMP=handler.AMP, result=result)
+
+        fleet = None
+        if handler.DBConfig.GetSetting('AMP_Fleet_Status'):
+            fleet = handler.AMP._fleetStatus(result)
+        handler.AMP._instance_ThreadManager(fleet=fleet)
         time.sleep(30)
 
 
@@ -69,6 +111,7 @@ class AMPHandler():
         self.superUser = False
 
         self.SessionIDlist = {}
+        self.Sessions: AMP_Session.AMPSessionManager = None
 
         self.AMP_Modules = {}
         self.AMP_Instances: dict[str, AMP.AMPInstance] = {}
@@ -77,6 +120,9 @@ class AMPHandler():
         self.AMP_Console_Threads = {}
 
         self.SuccessfulConnection = False
+
+        # Callbacks for `AMP.InstanceChange` sets from the Instance refresher.
+        self.Instance_Listeners: list[Callable[[list[AMP.InstanceChange]], None]] = []
         # self.InstancesFound = False
 
         self.DBHandler = DB.getDBHandler()
@@ -86,6 +132,9 @@ class AMPHandler():
         self.val_settings()
         self.moduleHandler()
 
+        session_lifetime = self.DBConfig.GetSetting('AMP_Session_Lifetime')
+        self.Sessions = AMP_Session.AMPSessionManager(self, lifetime=float(session_lifetime) if session_lifetime != None else 1800)
+
     def setup_AMPInstances(self):
         """Intializes the connection to AMP and creates AMP_Instance objects."""
         self.AMP = AMP.AMPInstance(Handler=self)
@@ -96,6 +145,23 @@ class AMPHandler():
             self.AMP.setAMPUserRoleMembership(self.AMP.AMP_UserID, self.AMP.super_AdminID, False)
             self.logger.warning(f'***ATTENTION*** Removing {self.tokens.AMPUser} from `Super Admins` Role!')
 
+    def add_instance_listener(self, callback: Callable[[list[AMP.InstanceChange]], None]):
+        """Subscribes to the Instance change sets (eg. `Running` flipped, `FriendlyName` changed). \n
+        Callbacks run on the `AMP Refresher` thread; use `loop.call_soon_threadsafe` to get back onto the Discord event loop."""
+        if callback not in self.Instance_Listeners:
+            self.Instance_Listeners.append(callback)
+
+    def remove_instance_listener(self, callback: Callable[[list[AMP.InstanceChange]], None]):
+        if callback in self.Instance_Listeners:
+            self.Instance_Listeners.remove(callback)
+
+    def _notify_instance_listeners(self, change_set: list[AMP.InstanceChange]):
+        for callback in list(self.Instance_Listeners):
+            try:
+                callback(change_set)
+            except Exception:
+                self.logger.error(f'**ERROR** Instance change listener {callback} failed - {traceback.format_exc()}')
+
     def get_AMP_instance_names(self, public: bool = False) -> dict[str, str]:
         """Creates a list of Instance Names/DisplayName or Friendly Name."""
         AMP_Instances_Names = {}
@@ -192,9 +258,17 @@ class AMPHandler():
         except Exception as e:
             self.logger.error(f'**ERROR** {self.name} Loading AMP Module ** - File Not Found {traceback.format_exc()}')
 
-    def _instanceValidation(self, AMP: AMP.AMPInstance, startup: bool = False):
-        """This checks if any new instances have been created since last check. If so, updates AMP_Instances and creates the object."""
-        result = AMP.getInstances()
+    def _instanceValidation(self, AMP: AMP.AMPInstance, startup: bool = False, result: list | None = None):
+        """This checks if any new instances have been created since last check. If so, updates AMP_Instances and creates the object. \n
+        `result` can be an already fetched `ADSModule/GetInstances` response."""
+        if result == None:
+            result = AMP.getInstances()
+
+        # CallAPI returns `False` when AMP can't be reached or its circuit breaker is open.
+        if not isinstance(result, list):
+            self.logger.warning(f'Unable to fetch the AMP Instances (circuit breaker {AMP.Breaker.state}); skipping Instance validation.')
+            return
+
         amp_instance_keys = list(self.AMP_Instances.keys())  # This could be empty on startup;
         available_instances = []
         # if len(result["result"][0]['AvailableInstances']) == 0:
@@ -0,0 +1,228 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+"""
+
+from __future__ import annotations
+
+import json
+import pathlib
+import threading
+import time
+from typing import Any, Union
+
+# Latency histogram bucket upper bounds in seconds; the same layout as the Prometheus client defaults.
+BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Outcomes passed to `AMPMetrics.record()`
+OK = "ok"
+ERROR = "error"
+TIMEOUT = "timeout"
+
+Metrics = None
+
+
+class EndpointStats:
+    """Counters and a latency histogram for one (Instance, API Call) pair."""
+
+    __slots__ = ("requests", "errors", "timeouts", "retries", "bytes_sent", "bytes_received", "latency_sum", "buckets")
+
+    def __init__(self) -> None:
+        self.requests: int = 0
+        self.errors: int = 0
+        self.timeouts: int = 0
+        self.retries: int = 0
+        self.bytes_sent: int = 0
+        self.bytes_received: int = 0
+        self.latency_sum: float = 0
+        # Non cumulative counts per bucket; the last one is `+Inf`.
+        self.buckets: list[int] = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, latency: float) -> None:
+        self.latency_sum += latency
+        for index, bound in enumerate(BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+                return
+        self.buckets[-1] += 1
+
+    def merge(self, other: EndpointStats) -> None:
+        for name in ("requests", "errors", "timeouts", "retries", "bytes_sent", "bytes_received", "latency_sum"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+
+    def quantile(self, q: float) -> float | None:
+        """Estimated from the histogram (bucket upper bound); `None` without any observations."""
+        total = sum(self.buckets)
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else float("inf")
+        return float("inf")
+
+    def to_dict(self) -> dict[str, Any]:
+        observed = sum(self.buckets)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_sum": round(self.latency_sum, 6),
+            "latency_mean": round(self.latency_sum / observed, 6) if observed else None,
+            "latency_p50": self.quantile(0.5),
+            "latency_p95": self.quantile(0.95),
+            "buckets": {str(bound): count for bound, count in zip(list(BUCKETS) + ["+Inf"], self.buckets)},
+        }
+
+
+class AMPMetrics:
+    """Per Instance and per endpoint instrumentation of the AMP API layer. \n
+    `AMPInstance._post` and `AMPAsyncInstance._post` call `record()` for every HTTP attempt and `record_retry()` for every retry
+    (backoff or "Unauthorized Access"); readable through `/bot utils api_metrics` and exportable as JSON or Prometheus text."""
+
+    def __init__(self) -> None:
+        self.started: float = time.time()
+        # {(InstanceID, FriendlyName, APICall): EndpointStats}
+        self._stats: dict[tuple[str, str, str], EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, instance_id: Union[str, int], name: str | None, APICall: str) -> EndpointStats:
+        key = (str(instance_id), name if name != None else "AMP", APICall)
+        stats = self._stats.get(key)
+        if stats == None:
+            stats = self._stats.setdefault(key, EndpointStats())
+        return stats
+
+    def record(
+        self,
+        instance_id: Union[str, int],
+        name: str | None,
+        APICall: str,
+        latency: float,
+        bytes_sent: int = 0,
+        bytes_received: int = 0,
+        outcome: str = OK,
+    ) -> None:
+        with self._lock:
+            stats = self._entry(instance_id, name, APICall)
+            stats.requests += 1
+            stats.bytes_sent += bytes_sent
+            stats.bytes_received += bytes_received
+            stats.observe(latency)
+            if outcome == ERROR:
+                stats.errors += 1
+            elif outcome == TIMEOUT:
+                stats.timeouts += 1
+
+    def record_retry(self, instance_id: Union[str, int], name: str | None, APICall: str) -> None:
+        with self._lock:
+            self._entry(instance_id, name, APICall).retries += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.started = time.time()
+
+    def by_endpoint(self) -> dict[str, EndpointStats]:
+        """Every Instance folded together per API Call."""
+        totals: dict[str, EndpointStats] = {}
+        with self._lock:
+            for (_, _, APICall), stats in self._stats.items():
+                totals.setdefault(APICall, EndpointStats()).merge(stats)
+        return totals
+
+    def by_instance(self) -> dict[str, EndpointStats]:
+        """Every API Call folded together per Instance (by FriendlyName)."""
+        totals: dict[str, EndpointStats] = {}
+        with self._lock:
+            for (_, name, _), stats in self._stats.items():
+                totals.setdefault(name, EndpointStats()).merge(stats)
+        return totals
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            entries = [
+                {"instance_id": instance_id, "instance": name, "endpoint": APICall, **stats.to_dict()}
+                for (instance_id, name, APICall), stats in self._stats.items()
+            ]
+        return {"started": self.started, "generated": time.time(), "buckets": list(BUCKETS), "entries": entries}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def write_snapshot(self, path: Union[str, pathlib.Path]) -> pathlib.Path:
+        """Writes `snapshot()` as JSON to `path`; returns the path."""
+        path = pathlib.Path(path)
+        path.write_text(self.to_json(), encoding="utf-8")
+        return path
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            items = [(key, stats) for key, stats in self._stats.items()]
+
+        lines = []
+        counters = (
+            ("gatekeeper_amp_requests_total", "requests", "AMP API HTTP attempts."),
+            ("gatekeeper_amp_errors_total", "errors", "AMP API attempts that failed to connect or returned a non 2xx status."),
+            ("gatekeeper_amp_timeouts_total", "timeouts", "AMP API attempts that timed out."),
+            ("gatekeeper_amp_retries_total", "retries", "AMP API attempts that were retries."),
+            ("gatekeeper_amp_request_bytes_total", "bytes_sent", "AMP API request body bytes."),
+            ("gatekeeper_amp_response_bytes_total", "bytes_received", "AMP API response body bytes."),
+        )
+        for metric, attr, help_text in counters:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for key, stats in items:
+                lines.append(f"{metric}{{{_labels(*key)}}} {getattr(stats, attr)}")
+
+        metric = "gatekeeper_amp_request_duration_seconds"
+        lines.append(f"# HELP {metric} AMP API attempt latency.")
+        lines.append(f"# TYPE {metric} histogram")
+        for key, stats in items:
+            labels = _labels(*key)
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS) + ["+Inf"], stats.buckets):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{labels}}} {stats.latency_sum}")
+            lines.append(f"{metric}_count{{{labels}}} {cumulative}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(instance_id: str, name: str, APICall: str) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return f'instance_id="{escape(instance_id)}",instance="{escape(name)}",endpoint="{escape(APICall)}"'
+
+
+def getAMPMetrics() -> AMPMetrics:
+    """Returns the Global AMPMetrics; otherwise creates it."""
+    global Metrics
+    if Metrics == None:
+        Metrics = AMPMetrics()
+    return Metrics
@@ -0,0 +1,263 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Player sessions and playtime. \n
+`PlayerTracker` opens a `PlayerSessions` row when a player joins and closes it when they leave, adding the session to the
+`PlayerPlaytime` rollup and raising the Servers `ServerConcurrency` peak for the hour. Joins/leaves come from the console
+event parsers (`AMP_Console_Events`) as they happen, queued and written from the `AMP Players` thread; a periodic
+`Core/GetUserList` snapshot per Instance reconciles anything the console missed and covers games without an event parser. \n
+Each snapshot stamps the open sessions' `Last_Seen`; sessions left open by a crash are closed at it on the next start,
+and `close()` ends every session when the bot shuts down, so the time the bot was down is never booked as playtime. \n
+The playtime commands read the rollups plus the few open sessions held in memory; raw sessions are never scanned.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING
+
+import AMP_Cache
+import AMP_Console_Events
+import DB
+
+if TYPE_CHECKING:
+    from AMP import AMPInstance
+    from AMP_Handler import AMPHandler
+
+Tracker = None
+
+
+class PlayerTracker:
+    def __init__(self) -> None:
+        self.logger = logging.getLogger()
+        self.DBHandler = DB.getDBHandler()
+        self.DB = self.DBHandler.DB
+        self.DBConfig = self.DBHandler.DBConfig
+
+        self._lock = threading.Lock()
+        # {DBServer.ID: {player name lowered: (PlayerSessions ID, player name, joined epoch seconds)}}; loaded per Server on first use.
+        self._online: dict[int, dict[str, tuple[int, str, int]]] = {}
+        # {InstanceID: DBServer.ID}
+        self._servers: dict[str, int] = {}
+        # {DBServer.ID: (hour, peak written for it)}; skips the write unless the peak grows.
+        self._peaks: dict[int, tuple[int, int]] = {}
+        # Console events waiting for the `AMP Players` thread; see `on_event()`.
+        self._events: queue.Queue[AMP_Console_Events.ConsoleEvent] = queue.Queue()
+        self._closed: bool = False
+
+        self.joins: int = 0
+        self.leaves: int = 0
+        self.snapshots: int = 0
+
+        AMP_Console_Events.getEventDispatcher().subscribe(self.on_event, [AMP_Console_Events.EVENT_JOIN, AMP_Console_Events.EVENT_LEAVE])
+
+    def _server_id(self, InstanceID: str) -> int | None:
+        ServerID = self._servers.get(InstanceID)
+        if ServerID == None:
+            db_server = self.DB.GetServer(InstanceID=InstanceID)
+            if db_server == None:
+                return None
+            ServerID = self._servers[InstanceID] = db_server.ID
+        return ServerID
+
+    def _players(self, ServerID: int) -> dict[str, tuple[int, str, int]]:
+        players = self._online.get(ServerID)
+        if players == None:
+            # Sessions left open by a crash end when a snapshot last saw them; the next snapshot opens new ones for whoever is still online.
+            for session in self.DB.GetOpenPlayerSessions(ServerID):
+                left = max(session["Joined"], session["Last_Seen"] if session["Last_Seen"] != None else session["Joined"])
+                self.DB.ClosePlayerSession(ID=session["ID"], ServerID=ServerID, Player=session["Player"], Joined=session["Joined"], Left=left)
+                self.logger.dev(f"Closed the leftover session of {session['Player']} on Server {ServerID}")
+            players = self._online[ServerID] = {}
+        return players
+
+    def _peak(self, ServerID: int, when: int, count: int) -> None:
+        hour = when // 3600
+        last = self._peaks.get(ServerID)
+        if last != None and last[0] == hour and last[1] >= count:
+            return
+        self.DB.UpdateServerConcurrency(ServerID=ServerID, Hour=hour, Peak=count)
+        self._peaks[ServerID] = (hour, max(count, last[1]) if last != None and last[0] == hour else count)
+
+    def join(self, ServerID: int, player: str, when: int) -> bool:
+        """Opens a session unless the player is already online; `when` is epoch seconds."""
+        with self._lock:
+            players = self._players(ServerID)
+            if self._closed or player.lower() in players:
+                return False
+            ID = self.DB.AddPlayerSession(ServerID=ServerID, Player=player, Joined=when)
+            players[player.lower()] = (ID, player, when)
+            self.joins += 1
+            self._peak(ServerID, when, len(players))
+        return True
+
+    def leave(self, ServerID: int, player: str, when: int) -> bool:
+        """Closes the players session and adds it to their playtime; `False` if they weren't online."""
+        with self._lock:
+            session = self._players(ServerID).pop(player.lower(), None)
+            if session == None:
+                return False
+            ID, name, joined = session
+            self.DB.ClosePlayerSession(ID=ID, ServerID=ServerID, Player=name, Joined=joined, Left=max(when, joined))
+            self.leaves += 1
+        return True
+
+    def on_event(self, event: AMP_Console_Events.ConsoleEvent) -> None:
+        """Runs on a console poller worker; the DB writes are left to the `AMP Players` thread (see `run()`)."""
+        self._events.put(event)
+
+    def _apply(self, event: AMP_Console_Events.ConsoleEvent) -> None:
+        ServerID = self._server_id(event.InstanceID)
+        if ServerID == None:
+            return
+        when = event.timestamp // 1000
+        if event.type == AMP_Console_Events.EVENT_JOIN:
+            self.join(ServerID, event.player, when)
+        elif event.type == AMP_Console_Events.EVENT_LEAVE:
+            self.leave(ServerID, event.player, when)
+
+    def snapshot(self, amp_server: AMPInstance) -> None:
+        """Reconciles the open sessions with who `Core/GetUserList` says is online; a stopped Server has no one online."""
+        ServerID = self._server_id(amp_server.InstanceID)
+        if ServerID == None:
+            return
+
+        if amp_server.Running and amp_server.ADS_Running:
+            # `getUserList()` turns a failed call into an empty list; that must not end everyone's session.
+            result = amp_server.StatusCache.get(AMP_Cache.USERLIST, amp_server._fetchUserList)
+            if not isinstance(result, dict):
+                return
+            online = {str(name).lower(): str(name) for name in result.values()}
+        else:
+            online = {}
+
+        now = int(time.time())
+        with self._lock:
+            players = dict(self._players(ServerID))
+        for key, (_, name, _) in players.items():
+            if key not in online:
+                self.leave(ServerID, name, now)
+        for key, name in online.items():
+            if key not in players:
+                self.join(ServerID, name, now)
+
+        # Hours without any join still get a peak row while players stay online.
+        with self._lock:
+            count = len(self._players(ServerID))
+            if count:
+                self._peak(ServerID, now, count)
+                self.DB.TouchPlayerSessions(ServerID=ServerID, Last_Seen=now)
+        self.snapshots += 1
+
+    def is_online(self, InstanceID: str, player: str) -> bool:
+        """`True` if the player has an open session on the Instance; only reads memory, so it is safe on a console poller worker."""
+        ServerID = self._servers.get(InstanceID)
+        players = self._online.get(ServerID) if ServerID != None else None
+        return players != None and player.lower() in players
+
+    def close(self) -> None:
+        """Ends every open session now; called when the bot shuts down. Events and snapshots after this are ignored."""
+        now = int(time.time())
+        with self._lock:
+            self._closed = True
+            online = [(ServerID, name) for ServerID, players in self._online.items() for _, name, _ in players.values()]
+        for ServerID, name in online:
+            self.leave(ServerID, name, now)
+
+    def online(self, ServerID: int) -> list[tuple[str, int]]:
+        """`[(player, joined epoch seconds)]` of the Servers open sessions."""
+        with self._lock:
+            return [(name, joined) for _, name, joined in self._players(ServerID).values()]
+
+    def playtime(self, ServerID: int = None, Player: str = None, Limit: int = None) -> list[dict]:
+        """The `PlayerPlaytime` rollup with the time of open sessions added, most played first. \n
+        Returns `[{'ServerID', 'Player', 'Seconds', 'Sessions', 'Last_Seen', 'Online'}]`."""
+        now = int(time.time())
+        # Before the rollup is read; loading a Server's sessions may close leftovers into it.
+        with self._lock:
+            servers = [ServerID] if ServerID != None else list(self._online)
+            sessions = [(server, key, name, joined) for server in servers for key, (_, name, joined) in self._players(server).items()]
+
+        rows = {(row["ServerID"], row["Player"].lower()): dict(row, Online=False) for row in self.DB.GetPlayerPlaytime(ServerID=ServerID, Player=Player)}
+        for server, key, name, joined in sessions:
+            if Player != None and key != Player.lower():
+                continue
+            row = rows.setdefault((server, key), {"ServerID": server, "Player": name, "Seconds": 0, "Sessions": 0, "Last_Seen": None, "Online": False})
+            row["Seconds"] += max(0, now - joined)
+            row["Sessions"] += 1
+            row["Last_Seen"] = now
+            row["Online"] = True
+
+        playtime = sorted(rows.values(), key=lambda row: row["Seconds"], reverse=True)
+        return playtime[:Limit] if Limit != None else playtime
+
+    def peaks(self, ServerID: int, hours: int = 24) -> dict[int, int]:
+        """`{hour: peak online players}` of the last `hours`; hours without players are left out."""
+        return self.DB.GetServerConcurrency(ServerID=ServerID, Since=int(time.time()) // 3600 - hours + 1)
+
+    def run(self, handler: AMPHandler) -> None:
+        """Applies the queued console events as they come and snapshots every Instance every `Player_Snapshot_Interval` seconds; run on its own thread."""
+        next_snapshot = 0.0
+        while True:
+            if time.monotonic() >= next_snapshot and not self._closed:
+                for amp_server in list(handler.AMP_Instances.values()):
+                    try:
+                        self.snapshot(amp_server)
+                    except Exception:
+                        self.logger.error(f"**ERROR** Player snapshot of {amp_server.FriendlyName} failed - {traceback.format_exc()}")
+
+                interval = self.DBConfig.GetSetting("Player_Snapshot_Interval")
+                next_snapshot = time.monotonic() + (max(5, float(interval)) if interval != None else 60)
+
+            try:
+                event = self._events.get(timeout=max(0, next_snapshot - time.monotonic()))
+            except queue.Empty:
+                continue
+
+            if self._closed:
+                continue
+            try:
+                self._apply(event)
+            except Exception:
+                self.logger.error(f"**ERROR** Failed to record the player event {event!r} - {traceback.format_exc()}")
+
+
+def format_duration(seconds: int) -> str:
+    """`3d 4h 12m`"""
+    minutes = seconds // 60
+    days, minutes = divmod(minutes, 1440)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h {minutes}m"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+
+def getPlayerTracker() -> PlayerTracker:
+    """Returns the Global PlayerTracker; otherwise creates it."""
+    global Tracker
+    if Tracker == None:
+        Tracker = PlayerTracker()
+    return Tracker
@@ -0,0 +1,168 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import traceback
+from typing import TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from AMP import AMPInstance
+    from AMP_Handler import AMPHandler
+
+# Sessions are refreshed once they reach this fraction of `AMP_Session_Lifetime`.
+REFRESH_AT = 0.8
+
+
+class AMPSessionManager:
+    """Owns the AMP `SessionID` of every AMPInstance. \n
+    `AMPInstance.Login()` only comes here when an Instance has no SessionID; otherwise the hot path just reads the cached one. \n
+    The `AMP Sessions` thread logs in again (with a fresh 2FA code) before a session reaches `AMP_Session_Lifetime`,
+    and `CallAPI` retries once after an "Unauthorized Access" using `invalidate()` + `Login()`."""
+
+    def __init__(self, handler: AMPHandler, lifetime: float = 1800) -> None:
+        self.logger = logging.getLogger()
+        self.AMPHandler = handler
+        self.lifetime: float = lifetime
+
+        # {InstanceID: time.monotonic() of the Login}
+        self._created: dict[Union[str, int], float] = {}
+        # Re-entrant; `login()` holds it across `CallAPI`, which may end up in `invalidate()` on the same thread.
+        self._locks: dict[Union[str, int], threading.RLock] = {}
+        self._locks_lock = threading.Lock()
+
+        self.logins: int = 0
+        self.refreshes: int = 0
+        self.retries: int = 0
+
+    def _lock(self, instance: AMPInstance) -> threading.RLock:
+        lock = self._locks.get(instance.InstanceID)
+        if lock == None:
+            with self._locks_lock:
+                lock = self._locks.setdefault(instance.InstanceID, threading.RLock())
+        return lock
+
+    def age(self, instance: AMPInstance) -> float | None:
+        """Seconds since the Instance's SessionID was issued; `None` if it has none."""
+        created = self._created.get(instance.InstanceID)
+        if created == None or instance.SessionID == 0:
+            return None
+        return time.monotonic() - created
+
+    def login(self, instance: AMPInstance, refresh: bool = False) -> bool:
+        """Logs the Instance in; concurrent callers wait on the same Login and re-use its SessionID. \n
+        With `refresh=True` a new session replaces a still valid one; if that fails the old SessionID is kept."""
+        with self._lock(instance):
+            if not refresh:
+                if instance.SessionID != 0:
+                    return True
+
+                # Another AMPInstance object for the same Instance may already have a session.
+                if instance.InstanceID in self.AMPHandler.SessionIDlist:
+                    instance.SessionID = self.AMPHandler.SessionIDlist[instance.InstanceID]
+                    self._created.setdefault(instance.InstanceID, time.monotonic())
+                    return True
+
+            self.logger.dev(f"AMPInstance {'Refreshing session' if refresh else 'Logging in'} {instance.InstanceID}")
+
+            if instance.AMP2Factor != None:
+                token = instance.AMP2Factor.now()
+
+            else:
+                token = ""
+
+            parameters = {
+                "username": self.AMPHandler.tokens.AMPUser,
+                "password": self.AMPHandler.tokens.AMPPassword,
+                "token": token,  # get current 2Factor Code
+                "rememberMe": True,
+            }
+
+            result = None
+            try:
+                result = instance.CallAPI("Core/Login", parameters)
+                if isinstance(result, dict) and result.get("sessionID"):
+                    # A single reference swap; callers already holding the old SessionID finish with it.
+                    instance.SessionID = result["sessionID"]
+                    self.AMPHandler.SessionIDlist[instance.InstanceID] = instance.SessionID
+                    self._created[instance.InstanceID] = time.monotonic()
+                    instance.Running = True
+                    if refresh:
+                        self.refreshes += 1
+                    else:
+                        self.logins += 1
+                    return True
+
+            except Exception:
+                self.logger.dev(f"Core/Login Exception: {traceback.format_exc()}")
+                self.logger.dev(result)
+
+            if refresh:
+                self.logger.warning(f"{instance.FriendlyName} - Failed to refresh the AMP session, keeping the current one.")
+                return False
+
+            self.logger.warning(f"{instance.FriendlyName} - Instance is Offline")
+            instance.Running = False
+            return False
+
+    def invalidate(self, instance: AMPInstance, session_id: Union[str, int, None] = None) -> None:
+        """Drops the Instance's SessionID after an "Unauthorized Access"; forcing a new Login. \n
+        If `session_id` is given it is only dropped when still current, so a session someone else just refreshed survives."""
+        with self._lock(instance):
+            if session_id != None and instance.SessionID != session_id:
+                return
+            instance.SessionID = 0
+            self.AMPHandler.SessionIDlist.pop(instance.InstanceID, None)
+            self._created.pop(instance.InstanceID, None)
+
+    def refresh_expiring(self) -> None:
+        """Logs in again for every session past `REFRESH_AT` of its lifetime."""
+        instances = list(self.AMPHandler.AMP_Instances.values())
+        if hasattr(self.AMPHandler, "AMP"):
+            instances.insert(0, self.AMPHandler.AMP)
+
+        for instance in instances:
+            age = self.age(instance)
+            if age == None or age < self.lifetime * REFRESH_AT:
+                continue
+            self.login(instance, refresh=True)
+
+    def run(self, interval: float = 60) -> None:
+        """The `AMP Sessions` thread."""
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh_expiring()
+            except Exception:
+                self.logger.error(f"**ERROR** AMP Session refresh failed - {traceback.format_exc()}")
+
+    def stats(self) -> dict[str, Union[int, float, None]]:
+        ages = [age for age in (self.age(instance) for instance in self.AMPHandler.AMP_Instances.values()) if age != None]
+        return {
+            "active": len(ages),
+            "oldest": max(ages) if len(ages) else None,
+            "logins": self.logins,
+            "refreshes": self.refreshes,
+            "retries": self.retries,
+        }
@@ -27,6 +27,7 @@ import json
 import logging
 import pathlib
 import sqlite3
+import threading
 import time
 from typing import Union
 
@@ -44,7 +45,7 @@ def dump_to_json(data):
 
 Handler = None
 #!DB Version
-DB_Version = 3.0
+DB_Version = 4.7
 
 
 class DBHandler:
@@ -114,6 +115,8 @@ class Database:
             "discordBot.db", detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES, check_same_thread=False
         )
         self._db.row_factory = sqlite3.Row
+        # The connection is shared by the Discord loop and the AMP console/refresher threads; one statement at a time.
+        self._lock = threading.RLock()
         if not self.DBExists:
             self._InitializeDatabase()
             # self._InitializeDefaultData()
@@ -142,14 +145,19 @@ class Database:
                         Discord_Event_Channel text nocase,
                         Discord_Role text collate nocase,
                         Avatar_url text,
-                        Hidden integer not null
+                        Hidden integer not null,
+                        Console_Priority integer not null default 1,
+                        Console_Watermark integer,
+                        Console_Watermark_Hash text
                         )""")
 
         cur.execute("""create table RegexPatterns (
                         ID integer primary key,
                         Name text unique not null,
                         Type integer not null,
-                        Pattern text unique not null
+                        Pattern text unique not null,
+                        Disabled integer not null default 0,
+                        Disabled_Reason text
                         )""")
 
         cur.execute("""create table ServerRegexPatterns (
@@ -214,6 +222,36 @@ class Database:
                         foreign key(ServerID) references Servers(ID)
                         )""")
 
+        cur.execute("""create table PlayerSessions (
+                        ID integer primary key,
+                        ServerID integer not null,
+                        Player text not null collate nocase,
+                        Joined integer not null,
+                        Left integer,
+                        Last_Seen integer,
+                        foreign key (ServerID) references Servers(ID)
+                        )""")
+
+        cur.execute("""create index PlayerSessionsServer on PlayerSessions(ServerID, Left)""")
+
+        cur.execute("""create table PlayerPlaytime (
+                        ServerID integer not null,
+                        Player text not null collate nocase,
+                        Seconds integer not null default 0,
+                        Sessions integer not null default 0,
+                        Last_Seen integer,
+                        foreign key (ServerID) references Servers(ID),
+                        UNIQUE(ServerID, Player)
+                        )""")
+
+        cur.execute("""create table ServerConcurrency (
+                        ServerID integer not null,
+                        Hour integer not null,
+                        Peak integer not null,
+                        foreign key (ServerID) references Servers(ID),
+                        UNIQUE(ServerID, Hour)
+                        )""")
+
         cur.execute("""create table WhitelistReply (
                         ID integer primary key,
                         Message text
@@ -254,16 +292,53 @@ class Database:
         self._AddConfig("Donator_role_id", None)
         # Prevent Server being removed from Banner Group
         self._AddConfig("Auto_BG_Remove", False)
+        # AMP API Connection Pool Settings
+        self._AddConfig("AMP_Pool_Size", 10)
+        self._AddConfig("AMP_Connect_Timeout", 5)
+        self._AddConfig("AMP_Read_Timeout", 30)
+        # Seconds a GetStatus/GetUserList result is re-used
+        self._AddConfig("AMP_Status_TTL", 5)
+        # Use one ADSModule/GetInstances call for every Instances status
+        self._AddConfig("AMP_Fleet_Status", True)
+        # Seconds between background Instance attribute refreshes
+        self._AddConfig("AMP_Refresh_Interval", 5)
+        # Seconds an AMP session is used before it is refreshed in the background
+        self._AddConfig("AMP_Session_Lifetime", 1800)
+        # AMP API attempts per call, failed calls before an Instances circuit breaker opens and seconds it stays open
+        self._AddConfig("AMP_Max_Attempts", 3)
+        self._AddConfig("AMP_Breaker_Threshold", 5)
+        self._AddConfig("AMP_Breaker_Reset", 30)
+        # Worker threads shared by every Instance console poll and seconds between polls
+        self._AddConfig("AMP_Console_Workers", 4)
+        self._AddConfig("AMP_Console_Interval", 1)
+        # Longest seconds between polls of an idle console
+        self._AddConfig("AMP_Console_Idle_Ceiling", 30)
+        # Entries each console queue holds before dropping the oldest and whether dropped lines leave a "skipped" marker
+        self._AddConfig("AMP_Console_Queue_Size", 500)
+        self._AddConfig("AMP_Console_Queue_Coalesce", True)
+        # Milliseconds a Regex Pattern may take on a console line; repeated overruns disable it
+        self._AddConfig("Regex_Time_Budget", 50)
+        # Days the on disk Console archive is kept (0 turns it off) and the compressed MB of each archive segment
+        self._AddConfig("Console_Archive_Days", 14)
+        self._AddConfig("Console_Archive_Segment_Size", 16)
+        # Seconds between the online player snapshots that reconcile player sessions
+        self._AddConfig("Player_Snapshot_Interval", 60)
+        # Milliseconds the Discord relay waits to batch a burst of console output into fewer sends
+        self._AddConfig("Relay_Flush_Window", 250)
+        # Discord relay workers per destination channel and webhook sends in flight across all channels
+        self._AddConfig("Relay_Channel_Workers", 2)
+        self._AddConfig("Relay_Max_Sends", 8)
 
     def _execute(self, SQL, params):
         Retry = 0
 
         while 1:
             try:
-                cur = self._db.cursor()
-                cur.execute(SQL, params)
-                cur.close()
-                self._db.commit()
+                with self._lock:
+                    cur = self._db.cursor()
+                    cur.execute(SQL, params)
+                    cur.close()
+                    self._db.commit()
                 return
 
             except sqlite3.OperationalError as ex:
@@ -278,14 +353,16 @@ class Database:
                 raise e
 
     def _fetchone(self, SQL, params):
-        cur = self._db.cursor()
-        cur.execute(SQL, params)
-        return (cur.fetchone(), cur)
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute(SQL, params)
+            return (cur.fetchone(), cur)
 
     def _fetchall(self, SQL, params):
-        cur = self._db.cursor()
-        cur.execute(SQL, params)
-        return (cur.fetchall(), cur)
+        with self._lock:
+            cur = self._db.cursor()
+            cur.execute(SQL, params)
+            return (cur.fetchall(), cur)
 
     def _logdata(self, data):
         self._execute("insert into log(log) values(?)", (data,))
@@ -427,14 +504,14 @@ class Database:
 
     def GetRegexPattern(self, ID: int = None, Name: str = None):
         """Returns RegexPatterns Table \n
-        Returns `row['ID'] = {'Name': row['Name'], 'Type': row['Type'], 'Pattern': row['Pattern']}`
+        Returns `row['ID'] = {'Name': row['Name'], 'Type': row['Type'], 'Pattern': row['Pattern'], 'Disabled': row['Disabled'], 'Disabled_Reason': row['Disabled_Reason']}`
         """
-        (row, cur) = self._fetchone("SELECT ID, Name, Type, Pattern FROM RegexPatterns WHERE Name=? or ID=?", (Name, ID))
+        (row, cur) = self._fetchone("SELECT ID, Name, Type, Pattern, Disabled, Disabled_Reason FROM RegexPatterns WHERE Name=? or ID=?", (Name, ID))
         if not row:
             cur.close()
             return False
 
-        regex = {"ID": row["ID"], "Name": row["Name"], "Type": row["Type"], "Pattern": row["Pattern"]}
+        regex = {"ID": row["ID"], "Name": row["Name"], "Type": row["Type"], "Pattern": row["Pattern"], "Disabled": row["Disabled"], "Disabled_Reason": row["Disabled_Reason"]}
         cur.close()
         return regex
 
@@ -470,16 +547,83 @@ class Database:
 
     def GetAllRegexPatterns(self):
         """Gets all Regex Patterns from the RegexPatterns Table. \n
-        Returns `dict[entry['ID']] = {'Name': entry['Name'], 'Type': entry['Type'], 'Pattern': entry['Pattern']}`"""
+        Returns `dict[entry['ID']] = {'Name': entry['Name'], 'Type': entry['Type'], 'Pattern': entry['Pattern'], 'Disabled': entry['Disabled'], 'Disabled_Reason': entry['Disabled_Reason']}`"""
         regex_patterns = {}
         SQLArgs = []
-        (rows, cur) = self._fetchall("SELECT ID, Name, Type, Pattern FROM RegexPatterns ORDER BY ID", tuple(SQLArgs))
+        (rows, cur) = self._fetchall("SELECT ID, Name, Type, Pattern, Disabled, Disabled_Reason FROM RegexPatterns ORDER BY ID", tuple(SQLArgs))
         for entry in rows:
-            regex_patterns[entry["ID"]] = {"Name": entry["Name"], "Type": entry["Type"], "Pattern": entry["Pattern"]}
+            regex_patterns[entry["ID"]] = {"Name": entry["Name"], "Type": entry["Type"], "Pattern": entry["Pattern"], "Disabled": entry["Disabled"], "Disabled_Reason": entry["Disabled_Reason"]}
 
         cur.close()
         return regex_patterns
 
+    def SetRegexPatternDisabled(self, ID: int, Disabled: bool, Reason: str = None) -> None:
+        """Disables (with the `Reason` shown in `/bot regex_pattern list`) or re-enables a Regex Pattern using its `ID`"""
+        self._execute("UPDATE RegexPatterns SET Disabled=?, Disabled_Reason=? WHERE ID=?", (int(Disabled), Reason if Disabled else None, ID))
+
+    def AddPlayerSession(self, ServerID: int, Player: str, Joined: int) -> int:
+        """Opens a PlayerSessions row (`Joined` in epoch seconds); returns its ID"""
+        self._execute("INSERT INTO PlayerSessions(ServerID, Player, Joined) VALUES(?, ?, ?)", (ServerID, Player, Joined))
+        (row, cur) = self._fetchone("SELECT ID FROM PlayerSessions WHERE ServerID=? and Player=? and Left IS NULL ORDER BY ID DESC", (ServerID, Player))
+        ID = row["ID"]
+        cur.close()
+        return ID
+
+    def ClosePlayerSession(self, ID: int, ServerID: int, Player: str, Joined: int, Left: int) -> None:
+        """Closes a PlayerSessions row and adds it to the Players PlayerPlaytime rollup"""
+        self._execute("UPDATE PlayerSessions SET Left=? WHERE ID=?", (Left, ID))
+        self._execute(
+            """INSERT INTO PlayerPlaytime(ServerID, Player, Seconds, Sessions, Last_Seen) VALUES(?, ?, ?, 1, ?)
+            ON CONFLICT(ServerID, Player) DO UPDATE SET Seconds=Seconds + excluded.Seconds, Sessions=Sessions + 1, Last_Seen=excluded.Last_Seen""",
+            (ServerID, Player, max(0, Left - Joined), Left),
+        )
+
+    def TouchPlayerSessions(self, ServerID: int, Last_Seen: int) -> None:
+        """Sets `Last_Seen` (epoch seconds) of the Servers open PlayerSessions; sessions left open by a crash are closed at it"""
+        self._execute("UPDATE PlayerSessions SET Last_Seen=? WHERE ServerID=? and Left IS NULL", (Last_Seen, ServerID))
+
+    def GetOpenPlayerSessions(self, ServerID: int) -> list[dict]:
+        """Returns `[{'ID': row['ID'], 'Player': row['Player'], 'Joined': row['Joined'], 'Last_Seen': row['Last_Seen']}]` of the Servers PlayerSessions without a Left time"""
+        (rows, cur) = self._fetchall("SELECT ID, Player, Joined, Last_Seen FROM PlayerSessions WHERE ServerID=? and Left IS NULL", (ServerID,))
+        sessions = [{"ID": row["ID"], "Player": row["Player"], "Joined": row["Joined"], "Last_Seen": row["Last_Seen"]} for row in rows]
+        cur.close()
+        return sessions
+
+    def GetPlayerPlaytime(self, ServerID: int = None, Player: str = None, Limit: int = None) -> list[dict]:
+        """Returns the PlayerPlaytime rollup of a Server, a Player or both, most played first \n
+        `[{'ServerID': row['ServerID'], 'Player': row['Player'], 'Seconds': row['Seconds'], 'Sessions': row['Sessions'], 'Last_Seen': row['Last_Seen']}]`"""
+        SQL = "SELECT ServerID, Player, Seconds, Sessions, Last_Seen FROM PlayerPlaytime WHERE 1=1"
+        SQLArgs = []
+        if ServerID != None:
+            SQL += " and ServerID=?"
+            SQLArgs.append(ServerID)
+        if Player != None:
+            SQL += " and Player=?"
+            SQLArgs.append(Player)
+        SQL += " ORDER BY Seconds DESC"
+        if Limit != None:
+            SQL += " LIMIT ?"
+            SQLArgs.append(Limit)
+
+        (rows, cur) = self._fetchall(SQL, tuple(SQLArgs))
+        playtime = [{"ServerID": row["ServerID"], "Player": row["Player"], "Seconds": row["Seconds"], "Sessions": row["Sessions"], "Last_Seen": row["Last_Seen"]} for row in rows]
+        cur.close()
+        return playtime
+
+    def UpdateServerConcurrency(self, ServerID: int, Hour: int, Peak: int) -> None:
+        """Raises the Servers peak online players for `Hour` (epoch seconds // 3600) to `Peak`"""
+        self._execute(
+            "INSERT INTO ServerConcurrency(ServerID, Hour, Peak) VALUES(?, ?, ?) ON CONFLICT(ServerID, Hour) DO UPDATE SET Peak=max(Peak, excluded.Peak)",
+            (ServerID, Hour, Peak),
+        )
+
+    def GetServerConcurrency(self, ServerID: int, Since: int) -> dict[int, int]:
+        """Returns `{Hour: Peak}` of the Server from the `Since` hour on"""
+        (rows, cur) = self._fetchall("SELECT Hour, Peak FROM ServerConcurrency WHERE ServerID=? and Hour>=? ORDER BY Hour", (ServerID, Since))
+        concurrency = {row["Hour"]: row["Peak"] for row in rows}
+        cur.close()
+        return concurrency
+
     def GetAllWhitelistReplies(self):
         """Gets all Whitelist Replies currently in the DB"""
         whitelist_replies = []
@@ -1013,6 +1157,9 @@ class DBServer:
     `Console_Filtered_Type: integer (0 = Blacklist| 1 = Whitelist)` \n
     `Avatar_url: str` \n
     `Hidden: bool (0/1)` \n
+    `Console_Priority: integer (0 = Low| 1 = Normal| 2 = High)` \n
+    `Console_Watermark: integer (epoch ms of the newest relayed Console entry)` \n
+    `Console_Watermark_Hash: str (comma separated hashes of the entries relayed at Console_Watermark)` \n
     """
 
     Discord_Chat_Prefix: str
@@ -1043,6 +1190,9 @@ class DBServer:
             "Discord_Role": None,
             "Avatar_url": None,
             "Hidden": 0,
+            "Console_Priority": 1,
+            "Console_Watermark": None,
+            "Console_Watermark_Hash": None,
         }
 
         for key, value in server_attr.items():
@@ -1130,6 +1280,7 @@ class DBServer:
             "Discord_Event_Channel",
             "Discord_Role",
             "Console_Filtered_Type",
+            "Console_Priority",
         ]:
             if value is not None:
                 value = int(value)
@@ -1150,6 +1301,12 @@ class DBServer:
         jdata = dump_to_json({"Type": "UpdateServerDisplayName", "ServerID": self.ID, "DisplayName": DisplayName})
         self._db._logdata(jdata)
 
+    def setConsoleWatermark(self, Timestamp: int, Hashes: str):
+        """Saves the Console dedupe watermark in one write; called after every Console poll that relayed something."""
+        self._db._execute("update Servers set Console_Watermark=?, Console_Watermark_Hash=? where ID=?", (Timestamp, Hashes, self.ID))
+        super().__setattr__("Console_Watermark", Timestamp)
+        super().__setattr__("Console_Watermark_Hash", Hashes)
+
     def getBanner(self, background_path: str = None):
         return DBBanner(self._db, self.ID, background_path)
 
@@ -1184,15 +1341,15 @@ class DBServer:
 
     def GetServerRegexPatterns(self):
         """Gets all Regex Patterns related to Server \n
-        Returns `dict['ID': {'Name': entry['Name'], 'Type': entry['Type'], 'Pattern': entry['Pattern']}]`"""
+        Returns `dict['ID': {'Name': entry['Name'], 'Type': entry['Type'], 'Pattern': entry['Pattern'], 'Disabled': entry['Disabled'], 'Disabled_Reason': entry['Disabled_Reason']}]`"""
         regex_patterns = {}
         SQLArgs = []
         (rows, cur) = self._db._fetchall(
-            "SELECT RP.ID, RP.Name, RP.Type, RP.Pattern FROM ServerRegexPatterns SRP, RegexPatterns RP WHERE SRP.ServerID=? and SRP.RegexPatternID = RP.ID",
+            "SELECT RP.ID, RP.Name, RP.Type, RP.Pattern, RP.Disabled, RP.Disabled_Reason FROM ServerRegexPatterns SRP, RegexPatterns RP WHERE SRP.ServerID=? and SRP.RegexPatternID = RP.ID",
             (self.ID,),
         )
         for entry in rows:
-            regex_patterns[entry["ID"]] = {"Name": entry["Name"], "Type": entry["Type"], "Pattern": entry["Pattern"]}
+            regex_patterns[entry["ID"]] = {"Name": entry["Name"], "Type": entry["Type"], "Pattern": entry["Pattern"], "Disabled": entry["Disabled"], "Disabled_Reason": entry["Disabled_Reason"]}
 
         cur.close()
         return regex_patterns
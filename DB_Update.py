@@ -140,6 +140,117 @@ class DB_Update:
             self.add_bannergroupmessages_table()
             self.DBConfig.SetSetting('DB_Version', '3.0')
 
+        if 3.1 > Version:
+            """Adds the AMP API Connection Pool settings"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.1')
+            self.db_config_add_amp_pool_settings()
+            self.DBConfig.SetSetting('DB_Version', '3.1')
+
+        if 3.2 > Version:
+            """Adds the AMP Status cache TTL setting"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.2')
+            self.DBConfig.AddSetting("AMP_Status_TTL", 5)
+            self.DBConfig.SetSetting('DB_Version', '3.2')
+
+        if 3.3 > Version:
+            """Adds the AMP Fleet Status setting"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.3')
+            self.DBConfig.AddSetting("AMP_Fleet_Status", True)
+            self.DBConfig.SetSetting('DB_Version', '3.3')
+
+        if 3.4 > Version:
+            """Adds the AMP Instance refresher interval setting"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.4')
+            self.DBConfig.AddSetting("AMP_Refresh_Interval", 5)
+            self.DBConfig.SetSetting('DB_Version', '3.4')
+
+        if 3.5 > Version:
+            """Adds the AMP Session lifetime setting"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.5')
+            self.DBConfig.AddSetting("AMP_Session_Lifetime", 1800)
+            self.DBConfig.SetSetting('DB_Version', '3.5')
+
+        if 3.6 > Version:
+            """Adds the AMP API attempt budget and circuit breaker settings"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.6')
+            self.DBConfig.AddSetting("AMP_Max_Attempts", 3)
+            self.DBConfig.AddSetting("AMP_Breaker_Threshold", 5)
+            self.DBConfig.AddSetting("AMP_Breaker_Reset", 30)
+            self.DBConfig.SetSetting('DB_Version', '3.6')
+
+        if 3.7 > Version:
+            """Adds the shared console poller settings"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.7')
+            self.DBConfig.AddSetting("AMP_Console_Workers", 4)
+            self.DBConfig.AddSetting("AMP_Console_Interval", 1)
+            self.DBConfig.SetSetting('DB_Version', '3.7')
+
+        if 3.8 > Version:
+            """Adds the Servers Console Priority column and the idle console poll ceiling setting"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.8')
+            self.server_console_priority()
+            self.DBConfig.AddSetting("AMP_Console_Idle_Ceiling", 30)
+            self.DBConfig.SetSetting('DB_Version', '3.8')
+
+        if 3.9 > Version:
+            """Adds the bounded console queue settings"""
+            self.logger.info('**ATTENTION** Updating DB to Version 3.9')
+            self.DBConfig.AddSetting("AMP_Console_Queue_Size", 500)
+            self.DBConfig.AddSetting("AMP_Console_Queue_Coalesce", True)
+            self.DBConfig.SetSetting('DB_Version', '3.9')
+
+        if 4.0 > Version:
+            """Adds the Regex Pattern Disabled columns and the Regex time budget setting"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.0')
+            self.regex_pattern_disabled_columns()
+            self.DBConfig.AddSetting("Regex_Time_Budget", 50)
+            self.DBConfig.SetSetting('DB_Version', '4.0')
+
+        if 4.1 > Version:
+            """Adds the Servers Console watermark columns"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.1')
+            self.server_console_watermark()
+            self.DBConfig.SetSetting('DB_Version', '4.1')
+
+        if 4.2 > Version:
+            """Adds the Console archive settings"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.2')
+            self.DBConfig.AddSetting("Console_Archive_Days", 14)
+            self.DBConfig.AddSetting("Console_Archive_Segment_Size", 16)
+            self.DBConfig.SetSetting('DB_Version', '4.2')
+
+        if 4.3 > Version:
+            """Adds the Player session, playtime and concurrency tables"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.3')
+            self.add_player_session_tables()
+            self.DBConfig.AddSetting("Player_Snapshot_Interval", 60)
+            self.DBConfig.SetSetting('DB_Version', '4.3')
+
+        if 4.4 > Version:
+            """Adds the Discord relay flush window setting"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.4')
+            self.DBConfig.AddSetting("Relay_Flush_Window", 250)
+            self.DBConfig.SetSetting('DB_Version', '4.4')
+
+        if 4.5 > Version:
+            """Adds the Discord relay worker settings"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.5')
+            self.DBConfig.AddSetting("Relay_Channel_Workers", 2)
+            self.DBConfig.AddSetting("Relay_Max_Sends", 8)
+            self.DBConfig.SetSetting('DB_Version', '4.5')
+
+        if 4.6 > Version:
+            """Resets the Servers Console watermarks; naive AMP Timestamps are no longer read in the bot's timezone"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.6')
+            self.reset_console_watermarks()
+            self.DBConfig.SetSetting('DB_Version', '4.6')
+
+        if 4.7 > Version:
+            """Adds Last_Seen to PlayerSessions; sessions left open by a crash are closed at it instead of at the next start up"""
+            self.logger.info('**ATTENTION** Updating DB to Version 4.7')
+            self.player_sessions_last_seen()
+            self.DBConfig.SetSetting('DB_Version', '4.7')
+
 
     def user_roles(self):
         try:
@@ -364,6 +475,88 @@ class DB_Update:
         except Exception as e:
             self.logger.critical(f'db_config_add_donator_settings {e}')
 
+    def db_config_add_amp_pool_settings(self):
+        #Adds the keep-alive connection pool size and request timeouts for the AMP API.
+        try:
+            self.DBConfig.AddSetting("AMP_Pool_Size", 10)
+            self.DBConfig.AddSetting("AMP_Connect_Timeout", 5)
+            self.DBConfig.AddSetting("AMP_Read_Timeout", 30)
+        except Exception as e:
+            self.logger.critical(f'db_config_add_amp_pool_settings {e}')
+
+
+    def server_console_priority(self):
+        try:
+            SQL = 'alter table Servers add column Console_Priority integer not null default 1'
+            self.DB._execute(SQL, ())
+        except Exception as e:
+            self.logger.critical(f'server_console_priority {e}')
+
+    def regex_pattern_disabled_columns(self):
+        try:
+            SQL = 'alter table RegexPatterns add column Disabled integer not null default 0'
+            self.DB._execute(SQL, ())
+            SQL = 'alter table RegexPatterns add column Disabled_Reason text'
+            self.DB._execute(SQL, ())
+        except Exception as e:
+            self.logger.critical(f'regex_pattern_disabled_columns {e}')
+
+    def server_console_watermark(self):
+        try:
+            SQL = 'alter table Servers add column Console_Watermark integer'
+            self.DB._execute(SQL, ())
+            SQL = 'alter table Servers add column Console_Watermark_Hash text'
+            self.DB._execute(SQL, ())
+        except Exception as e:
+            self.logger.critical(f'server_console_watermark {e}')
+
+    def reset_console_watermarks(self):
+        try:
+            SQL = 'update Servers set Console_Watermark=NULL, Console_Watermark_Hash=NULL'
+            self.DB._execute(SQL, ())
+        except Exception as e:
+            self.logger.critical(f'reset_console_watermarks {e}')
+
+    def player_sessions_last_seen(self):
+        try:
+            SQL = 'alter table PlayerSessions add column Last_Seen integer'
+            self.DB._execute(SQL, ())
+        except Exception as e:
+            self.logger.critical(f'player_sessions_last_seen {e}')
+
+    def add_player_session_tables(self):
+        try:
+            SQL = """create table PlayerSessions (
+                        ID integer primary key,
+                        ServerID integer not null,
+                        Player text not null collate nocase,
+                        Joined integer not null,
+                        Left integer,
+                        foreign key (ServerID) references Servers(ID)
+                        )"""
+            self.DB._execute(SQL, ())
+            SQL = 'create index PlayerSessionsServer on PlayerSessions(ServerID, Left)'
+            self.DB._execute(SQL, ())
+            SQL = """create table PlayerPlaytime (
+                        ServerID integer not null,
+                        Player text not null collate nocase,
+                        Seconds integer not null default 0,
+                        Sessions integer not null default 0,
+                        Last_Seen integer,
+                        foreign key (ServerID) references Servers(ID),
+                        UNIQUE(ServerID, Player)
+                        )"""
+            self.DB._execute(SQL, ())
+            SQL = """create table ServerConcurrency (
+                        ServerID integer not null,
+                        Hour integer not null,
+                        Peak integer not null,
+                        foreign key (ServerID) references Servers(ID),
+                        UNIQUE(ServerID, Hour)
+                        )"""
+            self.DB._execute(SQL, ())
+        except Exception as e:
+            self.logger.critical(f'add_player_session_tables {e}')
 
     def add_bannergroup_table(self):
         try:
@@ -24,6 +24,9 @@ import os
 import logging
 from datetime import datetime, timezone
 import asyncio
+import io
+import itertools
+import re
 
 import discord
 from discord.ext import commands, tasks
@@ -31,7 +34,10 @@ from discord import app_commands
 from discord.app_commands import Choice
 from numpy import isin
 
+import AMP_Console_Archive
+import AMP_Console_Filter
 import AMP_Handler
+import AMP_Players
 import DB
 import utils
 import utils_ui
@@ -43,6 +49,9 @@ Dependencies = None
 
 
 class AMP_Server(commands.Cog):
+    # Most matches `/server console search` returns.
+    CONSOLE_SEARCH_LIMIT = 1000
+
     def __init__(self, client: discord.Client):
         self._client = client
         self.name = os.path.basename(__file__)
@@ -115,8 +124,8 @@ class AMP_Server(commands.Cog):
         discord_message = await context.send('Sending Broadcast...', ephemeral=True)
         for amp_server in self.AMPInstances:
             if self.AMPInstances[amp_server].Running:
-                if self.AMPInstances[amp_server]._ADScheck():
-                    self.AMPInstances[amp_server].Broadcast_Message(message, prefix=prefix.value)
+                if await self.AMPInstances[amp_server].Async._ADScheck():
+                    await asyncio.to_thread(self.AMPInstances[amp_server].Broadcast_Message, message, prefix=prefix.value)
 
         await discord_message.edit(content=f'{prefix.value} Sent!')
         await discord_message.delete(delay=self._client.Message_Timeout)
@@ -135,8 +144,8 @@ class AMP_Server(commands.Cog):
 
         amp_server = self.uBot.serverparse(server, context, context.guild.id)
 
-        if not amp_server._ADScheck():
-            amp_server.StartInstance()
+        if not await amp_server.Async._ADScheck():
+            await amp_server.Async.StartInstance()
             amp_server.ADS_Running = True
             await context.send(f'Starting the AMP Dedicated Server **{amp_server.InstanceName}**', ephemeral=True, delete_after=self._client.Message_Timeout)
         else:
@@ -152,7 +161,7 @@ class AMP_Server(commands.Cog):
 
         amp_server = await self.uBot._serverCheck(context, server)
         if amp_server:
-            amp_server.StopInstance()
+            await amp_server.Async.StopInstance()
             amp_server.ADS_Running = False
             await context.send(f'Stopping the AMP Dedicated Server **{amp_server.InstanceName}**', ephemeral=True, delete_after=self._client.Message_Timeout)
 
@@ -166,7 +175,7 @@ class AMP_Server(commands.Cog):
 
         amp_server = await self.uBot._serverCheck(context, server)
         if amp_server:
-            amp_server.RestartInstance()
+            await amp_server.Async.RestartInstance()
             amp_server.ADS_Running = True
             await context.send(f'Restarting the AMP Dedicated Server **{amp_server.InstanceName}**', ephemeral=True, delete_after=self._client.Message_Timeout)
 
@@ -180,7 +189,7 @@ class AMP_Server(commands.Cog):
 
         amp_server = await self.uBot._serverCheck(context, server)
         if amp_server:
-            amp_server.KillInstance()
+            await amp_server.Async.KillInstance()
             amp_server.ADS_Running = False
             await context.send(f'Killing the AMP Dedicated Server **{amp_server.InstanceName}**', ephemeral=True, delete_after=self._client.Message_Timeout)
 
@@ -193,7 +202,8 @@ class AMP_Server(commands.Cog):
 
         amp_server = await self.uBot._serverCheck(context, server)
         if amp_server:
-            amp_server.ConsoleMessage(message)
+            await amp_server.Async.ConsoleMessage(message)
+            amp_server.Console.console_activity()
         await context.send(f'Sent {message} to {amp_server.InstanceName}', ephemeral=True, delete_after=self._client.Message_Timeout)
 
     @server.command(name='backup')
@@ -227,26 +237,26 @@ class AMP_Server(commands.Cog):
         if amp_server.Running == False:
             await context.send(f'Well this is awkward, it appears the **{amp_server.InstanceName}** is `Offline`.', ephemeral=True, delete_after=self._client.Message_Timeout)
 
-        if amp_server._ADScheck():
-            tps, Users, cpu, Memory, Uptime = amp_server.getMetrics()
-            Users_online = ', '.join(amp_server.getUserList())
+        if await amp_server.Async._ADScheck():
+            tps, Users, cpu, Memory, Uptime = await amp_server.Async.getMetrics()
+            Users_online = ', '.join(await amp_server.Async.getUserList())
             if len(Users_online) == 0:
                 Users_online = 'None'
             server_embed = await self.eBot.server_status_embed(context, amp_server, tps, Users, cpu, Memory, Uptime, Users_online)
             view = self.uiBot.StatusView(context=context, amp_server=amp_server)
-            self.uiBot.ServerButton(amp_server, view, amp_server.StartInstance, 'Start', callback_label='Starting...', callback_disabled=True)
-            self.uiBot.StopButton(amp_server, view, amp_server.StopInstance)
-            self.uiBot.RestartButton(server, view, amp_server.RestartInstance)
-            self.uiBot.KillButton(server, view, amp_server.KillInstance)
+            self.uiBot.ServerButton(amp_server, view, amp_server.Async.StartInstance, 'Start', callback_label='Starting...', callback_disabled=True)
+            self.uiBot.StopButton(amp_server, view, amp_server.Async.StopInstance)
+            self.uiBot.RestartButton(server, view, amp_server.Async.RestartInstance)
+            self.uiBot.KillButton(server, view, amp_server.Async.KillInstance)
             await context.send(embed=server_embed, view=view, ephemeral=True)
 
         else:
             server_embed = await self.eBot.server_status_embed(context, amp_server)
             view = self.uiBot.StatusView()
-            self.uiBot.StartButton(amp_server, view, amp_server.StartInstance)
-            self.uiBot.StopButton(amp_server, view, amp_server.StopInstance).disabled = True
-            self.uiBot.RestartButton(amp_server, view, amp_server.RestartInstance).disabled = True
-            self.uiBot.KillButton(amp_server, view, amp_server.KillInstance).disabled = True
+            self.uiBot.StartButton(amp_server, view, amp_server.Async.StartInstance)
+            self.uiBot.StopButton(amp_server, view, amp_server.Async.StopInstance).disabled = True
+            self.uiBot.RestartButton(amp_server, view, amp_server.Async.RestartInstance).disabled = True
+            self.uiBot.KillButton(amp_server, view, amp_server.Async.KillInstance).disabled = True
             await context.send(embed=server_embed, view=view, ephemeral=True)
 
     @server.command(name='users')
@@ -258,12 +268,46 @@ class AMP_Server(commands.Cog):
 
         amp_server = await self.uBot._serverCheck(context, server)
         if amp_server:
-            cur_users = (', ').join(amp_server.getUserList())
+            cur_users = (', ').join(await amp_server.Async.getUserList())
             if len(cur_users) != 0:
                 await context.send("**Server Users**" + '\n' + cur_users, ephemeral=True, delete_after=self._client.Message_Timeout)
             else:
                 await context.send('The Server currently has no online players.', ephemeral=True, delete_after=self._client.Message_Timeout)
 
+    @server.group(name='stats')
+    @utils.role_check()
+    async def amp_server_stats(self, context: commands.Context):
+        if context.invoked_subcommand is None:
+            await context.send('Please try your command again...', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+    @amp_server_stats.command(name='playtime')
+    @utils.role_check()
+    @app_commands.autocomplete(server=utils.autocomplete_servers)
+    async def amp_server_stats_playtime(self, context: commands.Context, server):
+        """Shows the Servers most active players of all time and its peak online players per hour over the last day."""
+        self.logger.command(f'{context.author.name} used AMP Server Stats Playtime')
+
+        amp_server = await self.uBot._serverCheck(context, server, False)
+        if amp_server:
+            db_server = self.DB.GetServer(InstanceID=amp_server.InstanceID)
+            tracker = AMP_Players.getPlayerTracker()
+            playtime, peaks = await asyncio.to_thread(lambda: (tracker.playtime(ServerID=db_server.ID, Limit=15), tracker.peaks(db_server.ID, 24)))
+            if not len(playtime):
+                return await context.send(f'No one has played on **{amp_server.InstanceName}** yet.', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+            lines = [f'**{amp_server.InstanceName}** Playtime (all time)']
+            for rank, row in enumerate(playtime, start=1):
+                seen = 'online now' if row['Online'] else f'last seen {discord.utils.format_dt(datetime.fromtimestamp(row["Last_Seen"], timezone.utc), "R")}'
+                lines.append(f'`{rank:>2}.` **{row["Player"]}** - {AMP_Players.format_duration(row["Seconds"])} over {row["Sessions"]} session{"s" if row["Sessions"] != 1 else ""} ({seen})')
+
+            if len(peaks):
+                hour, peak = max(peaks.items(), key=lambda item: item[1])
+                lines.append(f'\n__**Peak online (24h)**__: {peak} at {discord.utils.format_dt(datetime.fromtimestamp(hour * 3600, timezone.utc), "t")}')
+                first = int(datetime.now(timezone.utc).timestamp()) // 3600 - 23
+                lines.append('```\n' + ' '.join(f'{peaks.get(first + offset, 0):>2}' for offset in range(24)) + '\n```')
+
+            await context.send('\n'.join(lines), ephemeral=True, delete_after=self._client.Message_Timeout)
+
 # This Section is AMP/DB Server Settings -----------------------------------------------------------------------------------------------------
     @server.group(name='settings')
     @utils.role_check()
@@ -434,6 +478,62 @@ class AMP_Server(commands.Cog):
             amp_server._setDBattr()  # This will update the AMPConsole Attributes
             return await context.send(f'Set **{amp_server.InstanceName}** Console Filtering to `{flag.name}` using `{filter_type.name}` filtering.', ephemeral=True, delete_after=self._client.Message_Timeout)
 
+    @amp_server_console_settings.command(name='priority')
+    @utils.role_check()
+    @app_commands.autocomplete(server=utils.autocomplete_servers)
+    @app_commands.choices(priority=[Choice(name='Low', value=0), Choice(name='Normal', value=1), Choice(name='High', value=2)])
+    async def amp_server_console_priority(self, context: commands.Context, server, priority: Choice[int]):
+        """Sets how far the Console polling may slow down while the Server is idle."""
+        self.logger.command(f'{context.author.name} used Database Server Console Priority')
+
+        amp_server = await self.uBot._serverCheck(context, server, False)
+        if amp_server:
+            self.DB.GetServer(InstanceID=amp_server.InstanceID).Console_Priority = priority.value
+            amp_server._setDBattr()  # This will update the AMPConsole Attributes
+            amp_server.Console.console_activity()
+            return await context.send(f'Set **{amp_server.InstanceName}** Console Priority to `{priority.name}`', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+    @amp_server_console_settings.command(name='search')
+    @utils.role_check()
+    @app_commands.autocomplete(server=utils.autocomplete_servers)
+    @app_commands.describe(pattern='Regex matched with `re.search(pattern)` against each archived Console line')
+    @app_commands.describe(since='How far back; eg. `30m`, `2h`, `7d` or a date/time like `2024-05-01 18:00`')
+    @app_commands.describe(until='Same format as since; defaults to now')
+    async def amp_server_console_search(self, context: commands.Context, server, pattern: str, since: str = None, until: str = None):
+        """Searches the Servers archived Console output."""
+        self.logger.command(f'{context.author.name} used Server Console Search')
+
+        amp_server = await self.uBot._serverCheck(context, server, False)
+        if amp_server:
+            archive = getattr(getattr(amp_server, 'Console', None), 'archive', None)
+            if archive == None:
+                return await context.send(f'**{amp_server.InstanceName}** has no Console archive; check `Console_Archive_Days` and that its Console is enabled.', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+            try:
+                since_ms = AMP_Console_Archive.parse_time(since) if since != None else None
+                until_ms = AMP_Console_Archive.parse_time(until) if until != None else None
+            except ValueError:
+                return await context.send('I could not read that time; use something like `30m`, `2h`, `7d` or `2024-05-01 18:00`.', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+            await context.defer(ephemeral=True)
+            # The same vetting as `/bot regex_pattern add`; the search runs over a lot of lines.
+            reason = await asyncio.to_thread(AMP_Console_Filter.check_pattern, pattern, AMP_Console_Filter.getFilterCache().budget)
+            if reason != None:
+                return await context.send(f'The Pattern you provided was rejected; {reason}. \n `{pattern}`', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+            matches = await asyncio.to_thread(lambda: list(itertools.islice(archive.search(re.compile(pattern), since_ms, until_ms), self.CONSOLE_SEARCH_LIMIT + 1)))
+            if not len(matches):
+                return await context.send(f'No archived Console lines of **{amp_server.InstanceName}** match `{pattern}`.', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+            header = f'**{amp_server.InstanceName}** Console lines matching `{pattern}`'
+            if len(matches) > self.CONSOLE_SEARCH_LIMIT:
+                matches = matches[: self.CONSOLE_SEARCH_LIMIT]
+                header += f' (first {self.CONSOLE_SEARCH_LIMIT}; narrow it down with since/until)'
+            content = '\n'.join(str(match) for match in matches)
+            if len(content) > 1800:
+                return await context.send(content=header, file=discord.File(io.BytesIO(content.encode()), filename=f'{amp_server.InstanceName}_console_search.txt'), ephemeral=True, delete_after=self._client.Message_Timeout)
+            await context.send(f'{header}\n```\n{content.replace("```", "`` `")}\n```', ephemeral=True, delete_after=self._client.Message_Timeout)
+
 # This section is AMP Server Chat Specific Settings -------------------------------------------------------------------------------------------------------------------------------------------------
     @server.group(name='chat')
     @utils.role_check()
@@ -501,6 +601,7 @@ class AMP_Server(commands.Cog):
         db_server = self.DB.GetServer(InstanceID=server)
         if db_server != None:
             if db_server.AddServerRegexPattern(Name=name):
+                AMP_Console_Filter.getFilterCache().invalidate(db_server.ID)
                 regex = self.DB.GetRegexPattern(Name=name)
                 if regex:
                     if regex['Type'] == 0:
@@ -525,6 +626,7 @@ class AMP_Server(commands.Cog):
         if db_server != None:
             if name != 'None':
                 if db_server.DelServerRegexPattern(Name=name):
+                    AMP_Console_Filter.getFilterCache().invalidate(db_server.ID)
                     regex = self.DB.GetRegexPattern(Name=name)
                     if regex['Type'] == 0:
                         pattern_type = 'Console'
@@ -557,7 +659,10 @@ class AMP_Server(commands.Cog):
             if regex_patterns[pattern]['Type'] == 1:
                 pattern_type = 'Events'
 
-            embed.add_field(name=f"__**Name**:__ {regex_patterns[pattern]['Name']}\n__**Type**__: {pattern_type}", value=regex_patterns[pattern]['Pattern'], inline=False)
+            value = regex_patterns[pattern]['Pattern']
+            if regex_patterns[pattern]['Disabled']:
+                value += f"\n__**Disabled**__: {regex_patterns[pattern]['Disabled_Reason']}"
+            embed.add_field(name=f"__**Name**:__ {regex_patterns[pattern]['Name']}\n__**Type**__: {pattern_type}", value=value, inline=False)
 
             if embed_field >= 25:
                 embed_list.append(embed)
@@ -20,16 +20,21 @@
 '''
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
+import time
 from typing import TYPE_CHECKING
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 
+import AMP_Console
 import AMP_Handler
 import DB
+from AMP_Console import DISCORD_MESSAGE_LIMIT, AMPConsole, ConsoleQueue
 import utils
+import utils_webhooks
 from AMP import AMPInstance
 
 if TYPE_CHECKING:
@@ -56,16 +61,34 @@ class AMP_Tasks(commands.Cog):
         self.bPerms = utils.get_botPerms()
 
         self.uBot = utils.botUtils(client)
+        self.webhooks = utils_webhooks.getWebhookRegistry()
+        # Milliseconds the relay waits once it finds queued output, so the rest of a burst goes out in the same sends.
+        flush_window = self.DBConfig.GetSetting("Relay_Flush_Window")
+        self.flush_window: float = int(flush_window) / 1000 if flush_window != None else 0.25
         self.logger.info(f'**SUCCESS** Initializing {self.name.title().replace("Amp", "AMP")}')
 
-        self.amp_server_console_messages_send.start()
-        self.logger.dev('AMP_Cog Console Message Handler Running: ' + str(self.amp_server_console_messages_send.is_running()))
-
-        self.amp_server_console_chat_messages_send.start()
-        self.logger.dev('AMP_Cog Console Chat Message Handler Running: ' + str(self.amp_server_console_chat_messages_send.is_running()))
-
-        self.amp_server_console_event_messages_send.start()
-        self.logger.dev('AMP_Cog Console Event Message Handler Running: ' + str(self.amp_server_console_event_messages_send.is_running()))
+        # The console queues signal us (from the poller threads) when they have something to relay; see `_relay_signal()`.
+        # `Relay_Channel_Workers` consumer tasks per destination Discord channel await that work, so an idle bot does nothing at all
+        # and a slow or rate limited channel only holds up its own Servers.
+        self._loop = asyncio.get_running_loop()
+        channel_workers = self.DBConfig.GetSetting("Relay_Channel_Workers")
+        self.channel_workers: int = max(1, int(channel_workers)) if channel_workers != None else 2
+        self._relay_roles = {
+            'Console': ('Discord_Console_Channel', self._relay_console),
+            'Event': ('Discord_Event_Channel', self._relay_events),
+            'Chat': ('Discord_Chat_Channel', self._relay_chat),
+        }
+        # (AMPConsole, ConsoleQueue, time.monotonic() it was queued, whether it is a new burst)
+        self._relay_queues: dict[int, asyncio.Queue[tuple[AMPConsole, ConsoleQueue, float, bool]]] = {}
+        self._relay_workers: dict[int, list[asyncio.Task]] = {}
+        # Queues a worker is sending from right now; a queue's messages are only ever sent by one worker at a time to keep them in order.
+        self._relay_active: set[int] = set()
+        AMP_Console.set_relay_listener(self._relay_signal)
+        # Anything queued before we were listening.
+        for AMPServer in self.AMPInstances.values():
+            for queue in (AMPServer.Console.console_messages, AMPServer.Console.console_chat_messages, AMPServer.Console.console_event_messages):
+                self._relay_dispatch(AMPServer.Console, queue)
+        self.logger.dev('AMP_Cog Console Relay Listening')
 
         # self.amp_server_instance_check.start()
         # self.logger.dev('AMP_Cog Instance Check Event Loop: ' + str(self.amp_server_instance_check.is_running()))
@@ -78,13 +101,14 @@ class AMP_Tasks(commands.Cog):
             return
 
         for amp_server in self.AMPInstances:
-            self.AMPServer = self.AMPInstances[amp_server]
-            if not self.AMPServer.Running:
+            # Local reference; other `on_message` calls can run while we await the AMP API.
+            AMPServer = self.AMPInstances[amp_server]
+            if not AMPServer.Running:
                 continue
-            self.AMPServer._ADScheck()
+            await AMPServer.Async._ADScheck()
 
             # Check and see if our Discord Console Channel matches the current message.id
-            if self.AMPServer.Discord_Console_Channel == message.channel.id:
+            if AMPServer.Discord_Console_Channel == message.channel.id:
 
                 # Makes sure we are not responding to a webhook message (ourselves/bots/etc)
                 if message.webhook_id == None:
@@ -95,11 +119,13 @@ class AMP_Tasks(commands.Cog):
                             # Remove the prefix char.
                             message.content = message.content[1:]
 
-                        self.AMPServer.ConsoleMessage(message.content)
+                        await AMPServer.Async.ConsoleMessage(message.content)
+                        # Poll the Console quickly again so the reply shows up even if it was idle.
+                        AMPServer.Console.console_activity()
                         return
 
             # Check and see if our Discord Chat channel matches the message.id
-            if self.AMPServer.Discord_Chat_Channel == message.channel.id:
+            if AMPServer.Discord_Chat_Channel == message.channel.id:
                 if message.author == self._client.user:
                     self.logger.dev('AMP_Tasks_Cog Found my own Message, oops')
                     return
@@ -109,219 +135,176 @@ class AMP_Tasks(commands.Cog):
                     author_prefix = await self.bPerms.get_role_prefix(str(message.author.id))
 
                     # This calls the generic AMP Function; each server will handle this differently
-                    self.AMPServer.Chat_Message(message.content, author=message.author.name, author_prefix=author_prefix)
+                    await asyncio.to_thread(AMPServer.Chat_Message, message.content, author=message.author.name, author_prefix=author_prefix)
+                    AMPServer.Console.console_activity()
 
         return message
 
-    @tasks.loop(seconds=1)
-    async def amp_server_console_messages_send(self):
+    @commands.Cog.listener('on_webhooks_update')
+    async def on_webhooks_update(self, channel: discord.abc.GuildChannel):
+        # Someone added, edited or deleted a webhook in this channel; resolve ours again on the next send.
+        self.webhooks.invalidate(channel.id)
+
+    async def cog_unload(self):
+        AMP_Console.set_relay_listener(None)
+        for workers in self._relay_workers.values():
+            for worker in workers:
+                worker.cancel()
+        await self.webhooks.close()
+
+    def _relay_signal(self, console: AMPConsole, queue: ConsoleQueue) -> None:
+        """Called from a console poller thread; hands the queue to the bot's event loop."""
+        self._loop.call_soon_threadsafe(self._relay_dispatch, console, queue)
+
+    def _relay_dispatch(self, console: AMPConsole, queue: ConsoleQueue, burst: bool = True) -> None:
+        """Queues `queue` for the workers of the Discord channel its Server relays it to; starts the workers if needed."""
+        channel_attr, _ = self._relay_roles[queue.name]
+        channel_id = getattr(console.AMPInstance, channel_attr)
+        if channel_id == None:
+            # Nowhere to relay to; don't let it pile up for a channel that may never be set.
+            queue.clear()
+            return
+
+        work = self._relay_queues.get(channel_id)
+        if work == None:
+            work = self._relay_queues[channel_id] = asyncio.Queue()
+            self._relay_workers[channel_id] = [self._loop.create_task(self._relay_worker(channel_id, work), name=f'AMP Relay {channel_id}') for _ in range(self.channel_workers)]
+        work.put_nowait((console, queue, time.monotonic(), burst))
+
+    async def _relay_worker(self, channel_id: int, work: asyncio.Queue[tuple[AMPConsole, ConsoleQueue, float, bool]]) -> None:
+        """One of the workers of a Discord channel. Each turn sends one batch from a queue and puts the queue back at the end of
+        the line if it has more, so Servers sharing the channel (eg. `AMPChatChannels`) take turns instead of one draining first."""
+        await self._client.wait_until_ready()
+        while True:
+            console, queue, queued, burst = await work.get()
+            AMPServer = console.AMPInstance
+            channel_attr, relay = self._relay_roles[queue.name]
+            # The Servers channel was changed since the queue was handed to us.
+            if getattr(AMPServer, channel_attr) != channel_id:
+                self._relay_dispatch(console, queue)
+                continue
+
+            # Another worker is sending from it; that worker puts it back if there is more.
+            if id(queue) in self._relay_active:
+                continue
+
+            channel = self._client.get_channel(channel_id)
+            if channel == None:
+                queue.clear()
+                continue
+
+            self._relay_active.add(id(queue))
+            self.webhooks.record_wait(channel_id, time.monotonic() - queued, work.qsize())
+            sent = False
+            try:
+                # Give the rest of a burst a moment to arrive so it goes out in the same sends.
+                if burst and self.flush_window > 0:
+                    await asyncio.sleep(self.flush_window)
+                sent = await relay(channel, AMPServer, queue)
+            except Exception as e:
+                self.logger.error(f'**ERROR** Relaying {queue.name} messages for {AMPServer.FriendlyName} to {channel_id} failed - {e}')
+                # The queue still thinks we are draining it; come back to it later.
+                self._loop.call_later(5, self._relay_dispatch, console, queue)
+            finally:
+                self._relay_active.discard(id(queue))
+
+            if sent:
+                work.put_nowait((console, queue, time.monotonic(), False))
+
+    async def _relay_console(self, channel: discord.abc.Messageable, AMPServer: AMPInstance, queue: ConsoleQueue) -> bool:
         """This handles AMP Console messages and sends them to discord."""
-        if self._client.is_ready():
-            Sent_Data = True
-            while (Sent_Data):
-                Sent_Data = False
-                for amp_server in self.AMPInstances:
-                    AMPServer = self.AMPInstances[amp_server]
-                    AMP_Server_Console = AMPServer.Console
-
-                    if AMPServer.Discord_Console_Channel == None:
-                        continue
-
-                    channel = self._client.get_channel(AMPServer.Discord_Console_Channel)
-                    if channel == None:
-                        continue
-
-                    if not len(AMP_Server_Console.console_messages):
-                        continue
-
-                    Sent_Data = True
-                    AMP_Server_Console.console_message_lock.acquire()
-                    message = AMP_Server_Console.console_messages.pop(0)
-                    AMP_Server_Console.console_message_lock.release()
-
-                    # This setup is for getting/used old webhooks and allowing custom avatar names per message.
-                    webhook_list = await channel.webhooks()
-                    self.logger.debug(f'*AMP Console Message* webhooks {webhook_list}')
-                    console_webhook = None
-                    for webhook in webhook_list:
-                        if webhook.name == f"{AMPServer.FriendlyName} Console":
-                            self.logger.debug(f'*AMP Console Message* found an old webhook, validating {AMPServer.FriendlyName} webhook')
-                            if webhook.channel_id == AMPServer.Discord_Console_Channel:
-                                console_webhook = webhook
-                            else:
-                                await webhook.edit(channel=channel)
-                                self.logger.dev(f'**Editing Console Webhook for {AMPServer.FriendlyName} // ID: {webhook.id} // Channel: {webhook.channel_id}')
-                                console_webhook = webhook
-                            break
-
-                    if console_webhook == None:
-                        self.logger.dev(f'*AMP Console Message* creating a new webhook for {AMPServer.FriendlyName}')
-                        console_webhook = await channel.create_webhook(name=f'{AMPServer.FriendlyName} Console')
-
-                    if AMPServer.DisplayName is not None:  # Lets check for a Display name and use that instead.
-                        self.logger.dev('*AMP Console Message* sending a message with displayname')
-                        await console_webhook.send(message, username=AMPServer.DisplayName, avatar_url=AMPServer.Avatar_url)
-                    else:
-                        self.logger.dev('*AMP Console Message* sending a message with friendlyname')
-                        await console_webhook.send(message, username=AMPServer.FriendlyName, avatar_url=AMPServer.Avatar_url)
-
-    @tasks.loop(seconds=1)
-    async def amp_server_console_event_messages_send(self):
+        # Packs as many queued messages as fit in one Discord message; each is at most the limit on its own.
+        messages = queue.drain(max_size=DISCORD_MESSAGE_LIMIT)
+        if not len(messages):
+            return False
+
+        message = '\n'.join(messages)
+        if AMPServer.DisplayName is not None:  # Lets check for a Display name and use that instead.
+            self.logger.dev('*AMP Console Message* sending a message with displayname')
+            await self.webhooks.send(channel, utils_webhooks.ROLE_CONSOLE, AMPServer, message, messages=len(messages), username=AMPServer.DisplayName, avatar_url=AMPServer.Avatar_url)
+        else:
+            self.logger.dev('*AMP Console Message* sending a message with friendlyname')
+            await self.webhooks.send(channel, utils_webhooks.ROLE_CONSOLE, AMPServer, message, messages=len(messages), username=AMPServer.FriendlyName, avatar_url=AMPServer.Avatar_url)
+        return True
+
+    async def _relay_events(self, channel: discord.abc.Messageable, AMPServer_Event: AMPInstance, queue: ConsoleQueue) -> bool:
         """This handles AMP Console Event messages and sends them to discord."""
-        if self._client.is_ready():
-            Sent_Data = True
-            while (Sent_Data):
-                Sent_Data = False
-                for amp_server in self.AMPInstances:
-                    AMPServer_Event = self.AMPInstances[amp_server]
-                    AMP_Server_Console_Event = AMPServer_Event.Console
-
-                    if AMPServer_Event.Discord_Event_Channel == None:
-                        continue
-
-                    channel = self._client.get_channel(AMPServer_Event.Discord_Event_Channel)
-                    if channel == None:
-                        continue
-
-                    if not len(AMP_Server_Console_Event.console_event_messages):
-                        continue
-
-                    Sent_Data = True
-                    AMP_Server_Console_Event.console_event_message_lock.acquire()
-                    message = AMP_Server_Console_Event.console_event_messages.pop(0)
-                    AMP_Server_Console_Event.console_event_message_lock.release()
-
-                    # This setup is for getting/used old webhooks and allowing custom avatar names per message.
-                    webhook_list = await channel.webhooks()
-                    self.logger.debug(f'*AMP Event Message* webhooks {webhook_list}')
-                    console_webhook = None
-                    for webhook in webhook_list:
-                        if webhook.name == f"{AMPServer_Event.FriendlyName} Events":
-                            self.logger.debug(f'*AMP Event Message* found an old webhook, reusing it {AMPServer_Event.FriendlyName}')
-                            if webhook.channel_id == AMPServer_Event.Discord_Event_Channel:
-                                console_webhook = webhook
-                            else:
-                                await webhook.edit(channel=channel)
-                                self.logger.dev(f'**Editing Event Webhook for {AMPServer_Event.FriendlyName} ID: {webhook.id} Channel: {webhook.channel_id}')
-                                console_webhook = webhook
-                            break
-
-                    if console_webhook == None:
-                        self.logger.dev(f'*AMP Event Message* creating a new webhook for {AMPServer_Event.FriendlyName}')
-                        console_webhook = await channel.create_webhook(name=f'{AMPServer_Event.FriendlyName} Events')
-
-                    if AMPServer_Event .DisplayName is not None:  # Lets check for a Display name and use that instead.
-                        self.logger.dev('*AMP Event Message* sending a message with displayname')
-                        await console_webhook.send(message, username=AMPServer_Event.DisplayName, avatar_url=AMPServer_Event.Avatar_url)
-                    else:
-                        self.logger.dev('*AMP Event Message* sending a message with friendlyname')
-                        await console_webhook.send(message, username=AMPServer_Event.FriendlyName, avatar_url=AMPServer_Event.Avatar_url)
-
-    @tasks.loop(seconds=1)
-    async def amp_server_console_chat_messages_send(self):
+        # One embed per event, up to Discord's limit of embeds per message.
+        messages = queue.drain(max_items=utils_webhooks.EMBEDS_PER_MESSAGE, max_size=utils_webhooks.EMBED_TOTAL_LIMIT)
+        if not len(messages):
+            return False
+
+        embeds = [discord.Embed(description=message[:utils_webhooks.EMBED_DESCRIPTION_LIMIT]) for message in messages]
+        if AMPServer_Event.DisplayName is not None:  # Lets check for a Display name and use that instead.
+            self.logger.dev('*AMP Event Message* sending a message with displayname')
+            await self.webhooks.send(channel, utils_webhooks.ROLE_EVENTS, AMPServer_Event, embeds=embeds, messages=len(messages), username=AMPServer_Event.DisplayName, avatar_url=AMPServer_Event.Avatar_url)
+        else:
+            self.logger.dev('*AMP Event Message* sending a message with friendlyname')
+            await self.webhooks.send(channel, utils_webhooks.ROLE_EVENTS, AMPServer_Event, embeds=embeds, messages=len(messages), username=AMPServer_Event.FriendlyName, avatar_url=AMPServer_Event.Avatar_url)
+        return True
+
+    async def _relay_chat(self, channel: discord.abc.Messageable, AMPServer_Chat: AMPInstance | AMPMinecraft, queue: ConsoleQueue) -> bool:
         """This handles IN game chat messages and sends them to discord."""
-        if self._client.is_ready():
-            AMPChatChannels: dict[str | int, list[AMPInstance | AMPMinecraft]] = {}
-            for amp_server in self.AMPInstances:
-                AMPServer = self.AMPInstances[amp_server]
-
-                if AMPServer.Discord_Chat_Channel == None:
+        message = queue.get()
+        if message == None:
+            return False
+
+        # This is the person who wrote the In-Game Message
+        author = message['Source']
+        author_prefix = None
+
+        message_contents = message['Contents'].replace('\n', ' ')
+        server_prefix = AMPServer_Chat.Discord_Chat_Prefix
+
+        db_author: None | DB.DBUser = self.DB.GetUser(author)
+        if db_author != None:
+            author_prefix = await self.bPerms.get_role_prefix(db_author.DiscordID)
+
+            if AMPServer_Chat.get_IGN_Avatar(db_user=db_author):
+                self.logger.dev('Using AMP Server Information')
+                name, avatar = AMPServer_Chat.get_IGN_Avatar(db_user=db_author)
+
+            else:
+                discord_user = self._client.get_user(int(db_author.DiscordID))
+                if discord_user != None:
+                    self.logger.dev('Using Discord Server Information')
+                    name, avatar = discord_user.name, discord_user.avatar
+
+        #!TODO! Test these changes.
+        if db_author == None and AMPServer_Chat.get_IGN_Avatar(user=author):
+            self.logger.dev('Using Message Information')
+            name, avatar = AMPServer_Chat.get_IGN_Avatar(user=author)
+        else:
+            name, avatar = author, AMPServer_Chat.Avatar_url
+
+        if author_prefix != None:
+            self.logger.dev('Adding Author Prefix to Name')
+            name = f'[{author_prefix}] ' + name
+
+        if server_prefix != None:
+            self.logger.dev('Adding Server Prefix to Name')
+            name = f'[{server_prefix}] - ' + name
+
+        for piece in AMP_Console.chunk_line(message_contents):
+            await self.webhooks.send(channel, utils_webhooks.ROLE_CHAT, AMPServer_Chat, content=piece, username=name, avatar_url=avatar)
+
+        # This is the Chat Relay to separate AMP Servers.
+        AMPChatChannels: dict[str | int, list[AMPInstance | AMPMinecraft]] = {}
+        for Server in self.AMPInstances.values():
+            if Server.Discord_Chat_Channel != None:
+                AMPChatChannels.setdefault(Server.Discord_Chat_Channel, []).append(Server)
+
+        if channel.id in AMPChatChannels:
+            self.logger.dev('Found another Server Chat Channel Listening to this Discord channel.')
+            for Server in AMPChatChannels[channel.id]:
+
+                # Dont re-send the Console Chat message we sent to Discord to the same server.
+                if AMPServer_Chat == Server:
                     continue
 
-                if AMPServer.Discord_Chat_Channel not in AMPChatChannels:
-                    AMPChatChannels[AMPServer.Discord_Chat_Channel] = []
-                AMPChatChannels[AMPServer.Discord_Chat_Channel].append(AMPServer)
-
-            Sent_Data = True
-            while (Sent_Data):
-                Sent_Data = False
-                for amp_server in self.AMPInstances:
-                    AMPServer_Chat: AMPMinecraft | AMPInstance = self.AMPInstances[amp_server]
-                    AMP_Server_Console_Chat = AMPServer_Chat.Console
-
-                    if AMPServer_Chat.Discord_Chat_Channel == None:
-                        continue
-
-                    channel = self._client.get_channel(AMPServer_Chat.Discord_Chat_Channel)
-                    if channel == None:
-                        continue
-
-                    if not len(AMP_Server_Console_Chat.console_chat_messages):
-                        continue
-
-                    Sent_Data = True
-                    AMP_Server_Console_Chat.console_chat_message_lock.acquire()
-                    message = AMP_Server_Console_Chat.console_chat_messages.pop(0)
-                    AMP_Server_Console_Chat.console_chat_message_lock.release()
-
-                    # This setup is for getting/used old webhooks and allowing custom avatar names per message.
-                    webhook_list = await channel.webhooks()
-                    self.logger.debug(f'*AMP Chat Message* webhooks {webhook_list}')
-                    chat_webhook = None
-                    for webhook in webhook_list:
-                        if webhook.name == f"{AMPServer_Chat.FriendlyName} Chat":
-                            self.logger.debug(f'*AMP Chat Message* found an old webhook, reusing it {AMPServer_Chat.FriendlyName}')
-                            if webhook.channel_id == AMPServer_Chat.Discord_Chat_Channel:
-                                chat_webhook = webhook
-                            else:
-                                await webhook.edit(channel=channel)
-                                self.logger.dev(f'**Editing Chat Webhook for {AMPServer_Chat.FriendlyName} ID: {webhook.id} Channel: {webhook.channel_id}')
-                                chat_webhook = webhook
-                            break
-
-                    if chat_webhook == None:
-                        self.logger.dev(f'*AMP Chat Message* creating a new webhook for {AMPServer_Chat.FriendlyName}')
-                        chat_webhook = await channel.create_webhook(name=f'{AMPServer_Chat.FriendlyName} Chat')
-
-                    # This is the person who wrote the In-Game Message
-                    author = message['Source']
-                    author_prefix = None
-
-                    message_contents = message['Contents'].replace('\n', ' ')
-                    server_prefix = AMPServer_Chat.Discord_Chat_Prefix
-
-                    db_author: None | DB.DBUser = self.DB.GetUser(author)
-                    if db_author != None:
-                        author_prefix = await self.bPerms.get_role_prefix(db_author.DiscordID)
-
-                        if AMPServer_Chat.get_IGN_Avatar(db_user=db_author):
-                            self.logger.dev('Using AMP Server Information')
-                            name, avatar = AMPServer_Chat.get_IGN_Avatar(db_user=db_author)
-
-                        else:
-                            discord_user = self._client.get_user(int(db_author.DiscordID))
-                            if discord_user != None:
-                                self.logger.dev('Using Discord Server Information')
-                                name, avatar = discord_user.name, discord_user.avatar
-
-                    #!TODO! Test these changes.
-                    if db_author == None and AMPServer_Chat.get_IGN_Avatar(user=author):
-                        self.logger.dev('Using Message Information')
-                        name, avatar = AMPServer_Chat.get_IGN_Avatar(user=author)
-                    else:
-                        name, avatar = author, AMPServer_Chat.Avatar_url
-
-                    if author_prefix != None:
-                        self.logger.dev('Adding Author Prefix to Name')
-                        name = f'[{author_prefix}] ' + name
-
-                    if server_prefix != None:
-                        self.logger.dev('Adding Server Prefix to Name')
-                        name = f'[{server_prefix}] - ' + name
-
-                    await chat_webhook.send(content=message_contents, username=name, avatar_url=avatar)
-
-                    # This is the Chat Relay to separate AMP Servers.
-                    if chat_webhook.channel is not None and chat_webhook.channel.id in AMPChatChannels:
-                        self.logger.dev('Found another Server Chat Channel Listening to this Discord channel.')
-                        for Server in AMPChatChannels[chat_webhook.channel.id]:
-
-                            # Dont re-send the Console Chat message we sent to Discord to the same server.
-                            if AMPServer_Chat == Server:
-                                continue
-
-                            self.logger.dev(f'Sending the Mesage from {AMPServer_Chat.FriendlyName} to Other Server: {Server.FriendlyName}')
-                            Server.Chat_Message(message=message_contents, author_prefix=author_prefix, author=author, server_prefix=AMPServer_Chat.Discord_Chat_Prefix)
+                self.logger.dev(f'Sending the Mesage from {AMPServer_Chat.FriendlyName} to Other Server: {Server.FriendlyName}')
+                await asyncio.to_thread(Server.Chat_Message, message=message_contents, author_prefix=author_prefix, author=author, server_prefix=AMPServer_Chat.Discord_Chat_Prefix)
+        return True
 
 
 async def setup(client: commands.Bot):
@@ -24,6 +24,8 @@ import os
 import logging
 from typing import Union
 import sqlite3
+import asyncio
+from datetime import datetime, timezone
 
 import discord
 from discord.ext import commands
@@ -31,6 +33,7 @@ from discord.ext import commands
 import utils
 import utils_embeds
 import AMP_Handler
+import AMP_Players
 import DB
 
 # This is used to force cog order to prevent missing methods.
@@ -92,6 +95,28 @@ class DB_User(commands.Cog):
         db_user = self.DB.GetUser(user.id)
         await context.send(embed=self.eBot.user_info_embed(db_user, user), ephemeral=True, delete_after=self._client.Message_Timeout)
 
+    @user.command(name='playtime')
+    @utils.role_check()
+    async def user_playtime(self, context: commands.Context, user: Union[discord.Member, discord.User]):
+        """Shows how long the Discord User has played on each Server, using their in-game name"""
+        self.logger.command(f'{context.author.name} used User Playtime')
+        db_user = self.DB.GetUser(user.id)
+        if db_user == None or db_user.MC_IngameName == None:
+            return await context.send(f'**{user.name}** has no in-game name in the Database; set one with `/user update`.', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+        playtime = await asyncio.to_thread(AMP_Players.getPlayerTracker().playtime, None, db_user.MC_IngameName)
+        if not len(playtime):
+            return await context.send(f'**{db_user.MC_IngameName}** has not played on any Server yet.', ephemeral=True, delete_after=self._client.Message_Timeout)
+
+        servers = {db_server.ID: db_server for db_server in (self.DB.GetServer(InstanceID=amp_server.InstanceID) for amp_server in self.AMPInstances.values()) if db_server != None}
+        lines = [f'**{user.name}** ({db_user.MC_IngameName}) Playtime - {AMP_Players.format_duration(sum(row["Seconds"] for row in playtime))} total']
+        for row in playtime:
+            db_server = servers.get(row['ServerID'])
+            name = db_server.FriendlyName if db_server != None else f'Server {row["ServerID"]}'
+            seen = 'online now' if row['Online'] else f'last seen {discord.utils.format_dt(datetime.fromtimestamp(row["Last_Seen"], timezone.utc), "R")}'
+            lines.append(f'> **{name}** - {AMP_Players.format_duration(row["Seconds"])} over {row["Sessions"]} session{"s" if row["Sessions"] != 1 else ""} ({seen})')
+        await context.send('\n'.join(lines), ephemeral=True, delete_after=self._client.Message_Timeout)
+
     @user.command(name='add')
     @utils.role_check()
     async def user_add(self, context: commands.Context, user: Union[discord.Member, discord.User], mc_ign: str = None, mc_uuid: str = None, steamid: str = None):
@@ -179,7 +179,7 @@ class Banner(commands.Cog):
 
         # Create my View first
         editor_view = Banner_Editor_View(amp_handler=self.AMPHandler, db_banner=db_server_banner, amp_server=amp_server, banner_message=sent_msg)
-        banner_file = self.uiBot.banner_file_handler(self.BC.Banner_Generator(amp_server, db_server.getBanner())._image_())
+        banner_file = self.uiBot.banner_file_handler(await asyncio.to_thread(self.BC.render_banner, amp_server, db_server.getBanner()))
         await sent_msg.edit(content='**Banner Editor**', attachments=[banner_file], view=editor_view)
 
     async def _embed_generator(self, banner_name: str, server_list: list[str], message_list: list[discord.Message], discord_guild: discord.Guild, discord_channel: discord.TextChannel):
@@ -251,7 +251,7 @@ class Banner(commands.Cog):
                 else:
                     continue
 
-            banner_file = self.uiBot.banner_file_handler(self.BC.Banner_Generator(amp_server, db_server.getBanner())._image_())
+            banner_file = self.uiBot.banner_file_handler(await asyncio.to_thread(self.BC.render_banner, amp_server, db_server.getBanner()))
             # Store all the images as a `discord.File` for ease of iterations.
             banner_image_list.append(banner_file)
 
@@ -24,6 +24,7 @@ import discord
 from discord import app_commands
 from discord.app_commands import Choice
 from discord.ext import commands
+import asyncio
 import os
 import logging
 import re
@@ -31,6 +32,7 @@ import traceback
 
 import utils
 import AMP_Handler
+import AMP_Console_Filter
 import DB as DB
 
 # This is used to force cog order to prevent missing methods.
@@ -85,13 +87,15 @@ class Regex(commands.Cog):
     async def regex_pattern_add(self, context: commands.Context, name: str, filter_type: Choice[int], pattern: str):
         """Add a Regex Pattern to the Database"""
         self.logger.command(f'{context.author.name} used Regex Pattern Add')
-        try:
-            re.compile(pattern=pattern)
-        except re.error as e:
-            self.logger.error(e)
-            return await context.send(content=f'The Pattern you provided is invalid. \n `{pattern}`', ephemeral=True, delete_after=self._client.Message_Timeout)
+        await context.defer(ephemeral=True)
+        # Runs the pattern against sample lines in a child process; keeps the event loop free meanwhile.
+        reason = await asyncio.to_thread(AMP_Console_Filter.check_pattern, pattern, AMP_Console_Filter.getFilterCache().budget)
+        if reason != None:
+            self.logger.error(f'Regex Pattern `{name}` rejected: {reason}')
+            return await context.send(content=f'The Pattern you provided was rejected; {reason}. \n `{pattern}`', ephemeral=True, delete_after=self._client.Message_Timeout)
 
         if self.DB.AddRegexPattern(Name=name, Pattern=pattern, Type=filter_type.value):
+            AMP_Console_Filter.getFilterCache().invalidate()
             await context.send(content=f'Added the Regex - \n __**Name**:__ {name} \n __**Type**__: {filter_type.name} \n __**Pattern**:__ {pattern}', ephemeral=True, delete_after=self._client.Message_Timeout)
         else:
             await context.send(content=f'I was unable to add the entry; the Name `{name}` already exists in the Database. Please provide a unique Name for your Regex.', ephemeral=True, delete_after=self._client.Message_Timeout)
@@ -103,6 +107,7 @@ class Regex(commands.Cog):
         """Remove a Regex Pattern from the Database"""
         self.logger.command(f'{context.author.name} used Regex Pattern Delete')
         if self.DB.DelRegexPattern(Name=name):
+            AMP_Console_Filter.getFilterCache().invalidate()
             await context.send(content=f'I removed the Regex pattern `{name}` from the Database. Bye bye *waves*', ephemeral=True, delete_after=self._client.Message_Timeout)
         else:
             await context.send(content=f'Well this sucks, the Regex Pattern by the Name of `{name}` is not in my Database. Oops?', ephemeral=True, delete_after=self._client.Message_Timeout)
@@ -115,11 +120,12 @@ class Regex(commands.Cog):
         """Update a Regex Patterns Name, Pattern and or Type"""
         self.logger.command(f'{context.author.name} used Regex Pattern Update')
 
-        try:
-            re.compile(pattern=pattern)
-        except re.error as e:
-            self.logger.error(f'Regex Error: {traceback.format_exc()}')
-            return await context.send(content=f'The Pattern you provided is invalid. \n `{pattern}`', ephemeral=True, delete_after=self._client.Message_Timeout)
+        if pattern != None:
+            await context.defer(ephemeral=True)
+            reason = await asyncio.to_thread(AMP_Console_Filter.check_pattern, pattern, AMP_Console_Filter.getFilterCache().budget)
+            if reason != None:
+                self.logger.error(f'Regex Pattern `{name}` rejected: {reason}')
+                return await context.send(content=f'The Pattern you provided was rejected; {reason}. \n `{pattern}`', ephemeral=True, delete_after=self._client.Message_Timeout)
 
         filter_value = None
         filter_name = None
@@ -133,6 +139,11 @@ class Regex(commands.Cog):
             if new_name != None:
                 name = new_name
 
+            # A vetted replacement re-enables a pattern that was disabled for being too slow.
+            if pattern != None:
+                self.DB.SetRegexPatternDisabled(ID=self.DB.GetRegexPattern(Name=name)['ID'], Disabled=False)
+            AMP_Console_Filter.getFilterCache().invalidate()
+
             await context.send(content=f'Updated the Regex - \n__**Name**:__ {name}{content_str}\n __**Pattern**:__ {pattern}', ephemeral=True, delete_after=self._client.Message_Timeout)
         else:
             await context.send(content=f'It appears the Name `{name}` does not exist in the Database. Awkward..', ephemeral=True, delete_after=self._client.Message_Timeout)
@@ -146,6 +157,7 @@ class Regex(commands.Cog):
         if not regex_patterns:
             return await context.send(content='Hmph.. trying to get a list of Regex Patterns, but you have none yet.. ', ephemeral=True, delete_after=self._client.Message_Timeout)
 
+        filters = AMP_Console_Filter.getFilterCache()
         embed_field = 0
         embed_list = []
         embed = discord.Embed(title='**Regex Patterns**')
@@ -156,7 +168,14 @@ class Regex(commands.Cog):
             if regex_patterns[pattern]['Type'] == 1:
                 pattern_type = 'Events'
 
-            embed.add_field(name=f"__**Name**:__ {regex_patterns[pattern]['Name']}\n__**Type**__: {pattern_type}", value=regex_patterns[pattern]['Pattern'], inline=False)
+            value = regex_patterns[pattern]['Pattern']
+            timing = filters.timing(pattern)
+            if timing != None:
+                value += f'\n__**Timing**__: {timing[0]} lines, mean {timing[1] * 1000:.3f}ms, slowest {timing[2] * 1000:.1f}ms'
+            if regex_patterns[pattern]['Disabled']:
+                value += f"\n__**Disabled**__: {regex_patterns[pattern]['Disabled_Reason']}"
+
+            embed.add_field(name=f"__**Name**:__ {regex_patterns[pattern]['Name']}\n__**Type**__: {pattern_type}", value=value, inline=False)
 
             if embed_field >= 25:
                 embed_list.append(embed)
@@ -20,6 +20,7 @@
 
 '''
 from __future__ import annotations
+import io
 import sys
 import logging
 import traceback
@@ -33,7 +34,12 @@ from discord.app_commands import Choice
 import utils
 import utils_embeds
 import utils_ui
+import utils_webhooks
+import AMP_Async
+import AMP_Console
+import AMP_Metrics
 import AMP_Handler
+import AMP_Players
 import DB
 from typing import Union
 
@@ -82,6 +88,18 @@ class Gatekeeper(commands.Bot):
         if self.DBConfig.GetSetting('Permissions') == 'Custom':
             await self.permissions_update()
 
+    async def close(self):
+        # The Console watermarks are only saved every so often; don't replay what was relayed since on the next start.
+        for console in self.AMPHandler.AMP_Console_Threads.values():
+            console.console_watermark_save(force=True)
+        # Whoever is online now stops playing now; the time until the next start is not playtime.
+        if AMP_Players.Tracker != None:
+            AMP_Players.Tracker.close()
+        await AMP_Async.closeAMPSession()
+        await super().close()
+        # After the cogs are unloaded; a relay worker still running could otherwise open a new session.
+        await utils_webhooks.getWebhookRegistry().close()
+
     def self_check(self, message: discord.Message) -> bool:
         return message.author == client.user
 
@@ -322,6 +340,86 @@ async def bot_utils_status(context: commands.Context):
     await context.send(f'**Gatekeeperv2 Version**: {Version} // **SQL Database Version**: {client.DBHandler.DB_Version}', ephemeral=True, delete_after=client.Message_Timeout)
     await context.send(f'**AMP Connected**: {client.AMPHandler.SuccessfulConnection} // **SQL Database**: {client.DBHandler.SuccessfulDatabase}', ephemeral=True, delete_after=client.Message_Timeout)
 
+    hits = misses = coalesced = 0
+    for instance in client.AMPHandler.AMP_Instances.values():
+        hits += instance.StatusCache.hits
+        misses += instance.StatusCache.misses
+        coalesced += instance.StatusCache.coalesced
+    await context.send(f'**AMP Status Cache**: {hits} hits ({coalesced} coalesced) // {misses} misses', ephemeral=True, delete_after=client.Message_Timeout)
+
+    sessions = client.AMPHandler.Sessions.stats()
+    oldest = f"{int(sessions['oldest'])}s" if sessions['oldest'] != None else 'None'
+    await context.send(f"**AMP Sessions**: {sessions['active']} active (oldest {oldest}) // {sessions['logins']} logins // {sessions['refreshes']} refreshes // {sessions['retries']} 401 retries", ephemeral=True, delete_after=client.Message_Timeout)
+
+    breakers = [client.AMPHandler.AMP] + list(client.AMPHandler.AMP_Instances.values())
+    tripped = [f"{server.FriendlyName if server.InstanceID != 0 else 'AMP'}: {server.Breaker.state} ({server.Breaker.failures} failures, retry in {int(server.Breaker.retry_in())}s)" for server in breakers if server.Breaker.state != server.Breaker.CLOSED]
+    breaker_text = '\n'.join(tripped) if len(tripped) else f'all {len(breakers)} closed'
+    await context.send(f"**AMP Circuit Breakers**: {breaker_text}", ephemeral=True, delete_after=client.Message_Timeout)
+
+    poller = AMP_Console.getConsolePoller().stats()
+    await context.send(f"**AMP Console Poller**: {poller['polling']}/{poller['consoles']} consoles polling // {poller['idle']} idle, {poller['mean_interval']:.1f}s mean interval // {poller['workers']} workers ({poller['in_flight']} busy) // {poller['polls']} polls, {poller['mean_poll'] * 1000:.0f}ms mean // {poller['deferred']} deferred", ephemeral=True, delete_after=client.Message_Timeout)
+
+    webhooks = utils_webhooks.getWebhookRegistry()
+    relay_text = ' // '.join(f"{role}: {stats['messages']} in {stats['sends']} sends ({stats['per_send']:.1f}/send), {stats['per_minute']:.1f} sends/min" for role, stats in webhooks.relay_stats().items())
+    throttled = webhooks.stats()
+    await context.send(f"**Discord Relay**: {relay_text if len(relay_text) else 'nothing sent yet'} // {throttled['exhausted']} rate limits hit, sends held back {throttled['throttled_time']:.1f}s", ephemeral=True, delete_after=client.Message_Timeout)
+
+
+@bot_utils.command(name='api_metrics')
+@utils.role_check()
+@app_commands.describe(export='Attach the full per Instance/endpoint metrics as a file')
+@app_commands.choices(export=[Choice(name='None', value=0), Choice(name='JSON', value=1), Choice(name='Prometheus', value=2)])
+async def bot_utils_api_metrics(context: commands.Context, export: Choice[int] = 0):
+    """AMP API request counts, latency, errors and retries per endpoint and per Instance."""
+    client.logger.command(f'{context.author.name} used Bot Utils API Metrics Function...')
+
+    metrics = AMP_Metrics.getAMPMetrics()
+    export = export.value if type(export) == Choice else export
+    if export == 1:
+        return await context.send(file=discord.File(io.BytesIO(metrics.to_json().encode()), filename='amp_metrics.json'), ephemeral=True, delete_after=client.Message_Timeout)
+    if export == 2:
+        return await context.send(file=discord.File(io.BytesIO(metrics.to_prometheus().encode()), filename='amp_metrics.prom'), ephemeral=True, delete_after=client.Message_Timeout)
+
+    def table(title: str, totals: dict) -> str:
+        rows = sorted(totals.items(), key=lambda item: item[1].requests, reverse=True)[:12]
+        lines = [f'{title[:30]:<30} {"reqs":>7} {"err":>5} {"t/o":>4} {"retry":>5} {"p50":>6} {"p95":>6} {"KiB in":>7}']
+        for name, stats in rows:
+            p50, p95 = stats.quantile(0.5), stats.quantile(0.95)
+            lines.append(f'{name[:30]:<30} {stats.requests:>7} {stats.errors:>5} {stats.timeouts:>4} {stats.retries:>5} {(f"{p50:.3f}" if p50 != None else "-"):>6} {(f"{p95:.3f}" if p95 != None else "-"):>6} {stats.bytes_received / 1024:>7.1f}')
+        return '\n'.join(lines)
+
+    await context.send(f'**AMP API by endpoint** (latency in seconds, upper bucket bound)\n```\n{table("Endpoint", metrics.by_endpoint())}\n```', ephemeral=True, delete_after=client.Message_Timeout)
+    await context.send(f'**AMP API by Instance**\n```\n{table("Instance", metrics.by_instance())}\n```', ephemeral=True, delete_after=client.Message_Timeout)
+
+
+@bot_utils.command(name='console_queues')
+@utils.role_check()
+async def bot_utils_console_queues(context: commands.Context):
+    """Depth, high water mark and dropped entries of every Instance's Console, Chat and Event queues."""
+    client.logger.command(f'{context.author.name} used Bot Utils Console Queues Function...')
+
+    lines = [f'{"Instance"[:24]:<24} {"queue":<7} {"depth":>6} {"max":>6} {"high":>6} {"queued":>8} {"dropped":>8}']
+    for console in client.AMPHandler.AMP_Console_Threads.values():
+        for name, stats in console.queue_stats().items():
+            lines.append(f'{console.AMPInstance.FriendlyName[:24]:<24} {name:<7} {stats["depth"]:>6} {stats["capacity"]:>6} {stats["high_water"]:>6} {stats["enqueued"]:>8} {stats["dropped"]:>8}')
+
+    content = '\n'.join(lines)
+    if len(content) > 1900:
+        await context.send(content='**AMP Console Queues**', file=discord.File(io.BytesIO(content.encode()), filename='console_queues.txt'), ephemeral=True, delete_after=client.Message_Timeout)
+    else:
+        await context.send(f'**AMP Console Queues**\n```\n{content}\n```', ephemeral=True, delete_after=client.Message_Timeout)
+
+    lines = [f'{"Channel"[:24]:<24} {"relays":>8} {"wait":>7} {"max":>7} {"queued":>6}']
+    for channel_id, stats in utils_webhooks.getWebhookRegistry().channel_stats().items():
+        channel = client.get_channel(channel_id)
+        name = f'#{channel.name}' if channel != None else str(channel_id)
+        lines.append(f'{name[:24]:<24} {stats["relays"]:>8} {stats["mean_wait"]:>7.2f} {stats["max_wait"]:>7.2f} {stats["queued"]:>6}')
+
+    content = '\n'.join(lines)
+    if len(content) > 1900:
+        return await context.send(content='**Discord Relay Channels**', file=discord.File(io.BytesIO(content.encode()), filename='relay_channels.txt'), ephemeral=True, delete_after=client.Message_Timeout)
+    await context.send(f'**Discord Relay Channels** (queue wait in seconds)\n```\n{content}\n```', ephemeral=True, delete_after=client.Message_Timeout)
+
 
 @bot_utils.command(name='message_timeout')
 @utils.role_check()
@@ -22,6 +22,7 @@
 from __future__ import annotations
 import AMP
 import AMP_Console
+import AMP_Console_Events
 
 
 DisplayImageSources = ['steam:730']
@@ -42,5 +43,11 @@ class AMPCsgo(AMP.AMPInstance):
 
 
 class AMPCsgoConsole(AMP_Console.AMPConsole):
+    EVENT_PARSER = AMP_Console_Events.EventParser("Counter-Strike: Global Offensive", [
+        (AMP_Console_Events.EVENT_JOIN, r'"(?P<player>.+?)<\d+><[^>]*><[^>]*>" entered the game'),
+        (AMP_Console_Events.EVENT_LEAVE, r'"(?P<player>.+?)<\d+><[^>]*><[^>]*>" disconnected'),
+        (AMP_Console_Events.EVENT_DEATH, r'"[^"]*?<\d+><[^>]*><[^>]*>" \[[^\]]*\] killed "(?P<player>.+?)<\d+><[^>]*><[^>]*>" \[[^\]]*\] with "(?P<detail>[^"]+)"'),
+    ])
+
     def __init__(self, AMPInstance=AMPCsgo):
         super().__init__(AMPInstance)
@@ -22,6 +22,7 @@
 from __future__ import annotations
 import AMP
 import AMP_Console
+import AMP_Console_Events
 
 
 # Resources
@@ -60,5 +61,10 @@ class AMPFactorio(AMP.AMPInstance):
 
 
 class AMPFactorioConsole(AMP_Console.AMPConsole):
+    EVENT_PARSER = AMP_Console_Events.EventParser("Factorio", [
+        (AMP_Console_Events.EVENT_JOIN, r'\[JOIN\] (?P<player>\S+) joined the game'),
+        (AMP_Console_Events.EVENT_LEAVE, r'\[LEAVE\] (?P<player>\S+) left the game'),
+    ])
+
     def __init__(self, AMPInstance=AMPFactorio):
         super().__init__(AMPInstance)
@@ -28,6 +28,7 @@ import requests
 
 import AMP
 import AMP_Console
+import AMP_Console_Events
 from DB import DBUser
 
 DisplayImageSources = ["internal:MinecraftJava"]
@@ -209,5 +210,13 @@ class AMPMinecraft(AMP.AMPInstance):
 
 
 class AMPMinecraftConsole(AMP_Console.AMPConsole):
+    # Vanilla server messages; `Contents` may still carry the `[time] [thread/INFO]: ` prefix on some set ups.
+    EVENT_PARSER = AMP_Console_Events.EventParser("Minecraft", [
+        (AMP_Console_Events.EVENT_JOIN, r'(?P<player>[A-Za-z0-9_]{3,16}) joined the game$'),
+        (AMP_Console_Events.EVENT_LEAVE, r'(?P<player>[A-Za-z0-9_]{3,16}) left the game$'),
+        (AMP_Console_Events.EVENT_ACHIEVEMENT, r'(?P<player>[A-Za-z0-9_]{3,16}) has (?:made the advancement|completed the challenge|reached the goal) \[(?P<detail>[^\]]+)\]$'),
+        (AMP_Console_Events.EVENT_DEATH, r"^(?:\[[^\]]*\] )?(?:\[[^\]]*\]: )?(?P<player>[A-Za-z0-9_]{3,16}) (?P<detail>(?:was (?:slain|shot|killed|blown up|pummeled|squashed|squished|fireballed|impaled|pricked|poked|stung|struck by lightning|frozen|burnt|obliterated|skewered|doomed to fall|stabbed|roasted)|drowned|burned to death|fell (?:off|from|out of|while|too far)|hit the ground too hard|blew up|tried to swim in lava|went up in flames|walked into (?:fire|a cactus|danger zone)|suffocated in a wall|starved to death|died|withered away|experienced kinetic energy|froze to death|discovered the floor was lava|went off with a bang|didn't want to live)\b.*)$"),
+    ])
+
     def __init__(self, AMPInstance=AMPMinecraft):
         super().__init__(AMPInstance)
@@ -22,6 +22,7 @@
 from __future__ import annotations
 import AMP
 import AMP_Console
+import AMP_Console_Events
 
 
 DisplayImageSources = ['steam:108600']
@@ -69,5 +70,11 @@ class AMPProjectzomboid(AMP.AMPInstance):
 
 
 class AMPProjectzomboidConsole(AMP_Console.AMPConsole):
+    EVENT_PARSER = AMP_Console_Events.EventParser("Project Zomboid", [
+        (AMP_Console_Events.EVENT_JOIN, r'\[fully-connected\].*?username="(?P<player>[^"]+)"'),
+        (AMP_Console_Events.EVENT_LEAVE, r'\[disconnect\].*?username="(?P<player>[^"]+)"'),
+        (AMP_Console_Events.EVENT_DEATH, r'user (?P<player>.+?) died at'),
+    ])
+
     def __init__(self, AMPInstance=AMPProjectzomboid):
         super().__init__(AMPInstance)
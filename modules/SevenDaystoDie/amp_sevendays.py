@@ -22,6 +22,7 @@
 from __future__ import annotations
 import AMP
 import AMP_Console
+import AMP_Console_Events
 
 
 DisplayImageSources = ['steam:251570']
@@ -67,5 +68,11 @@ class AMPSevendays(AMP.AMPInstance):
 
 
 class AMPSevendaysConsole(AMP_Console.AMPConsole):
+    EVENT_PARSER = AMP_Console_Events.EventParser("7 Days to Die", [
+        (AMP_Console_Events.EVENT_JOIN, r"GMSG: Player '(?P<player>.+?)' joined the game"),
+        (AMP_Console_Events.EVENT_LEAVE, r"GMSG: Player '(?P<player>.+?)' left the game"),
+        (AMP_Console_Events.EVENT_DEATH, r"GMSG: Player '(?P<player>.+?)' (?P<detail>died|killed by .+|was killed by .+)$"),
+    ])
+
     def __init__(self, AMPInstance=AMPSevendays):
         super().__init__(AMPInstance)
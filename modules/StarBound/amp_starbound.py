@@ -22,6 +22,7 @@
 from __future__ import annotations
 import AMP
 import AMP_Console
+import AMP_Console_Events
 
 
 DisplayImageSources = ['steam:211820']
@@ -42,5 +43,10 @@ class AMPStarbound(AMP.AMPInstance):
 
 
 class AMPStarboundConsole(AMP_Console.AMPConsole):
+    EVENT_PARSER = AMP_Console_Events.EventParser("Starbound", [
+        (AMP_Console_Events.EVENT_JOIN, r"Client '(?P<player>.+?)' <\d+> \([^)]*\) connected"),
+        (AMP_Console_Events.EVENT_LEAVE, r"Client '(?P<player>.+?)' <\d+> \([^)]*\) disconnected"),
+    ])
+
     def __init__(self, AMPInstance=AMPStarbound):
         super().__init__(AMPInstance)
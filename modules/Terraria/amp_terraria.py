@@ -21,6 +21,7 @@
 '''
 from __future__ import annotations
 import AMP_Console
+import AMP_Console_Events
 import AMP
 
 # Resources - https://www.dexerto.com/gaming/terraria-console-commands-explained-a-simple-controls-guide-1663852/
@@ -69,5 +70,11 @@ class AMPTerraria(AMP.AMPInstance):
 
 
 class AMPTerrariaConsole(AMP_Console.AMPConsole):
+    EVENT_PARSER = AMP_Console_Events.EventParser("Terraria", [
+        (AMP_Console_Events.EVENT_JOIN, r'^(?P<player>.+?) has joined\.$'),
+        (AMP_Console_Events.EVENT_LEAVE, r'^(?P<player>.+?) has left\.$'),
+        (AMP_Console_Events.EVENT_DEATH, r"^(?P<player>.+?) (?P<detail>(?:was slain|was killed|was impaled|was eviscerated|was murdered|was torn|was destroyed|was sliced|was chopped|was decapitated|was massacred|was lacerated|was dissected|was pierced|was ripped|was devoured|was melted|was squished|was incinerated|was crushed|was bitten|fell to (?:their|his|her) death|drowned|burned to death|couldn't find the antidote|tried to escape|was licked|faced the wrath|got melted|is dead|died).*)$"),
+    ])
+
     def __init__(self, AMPInstance=AMPTerraria):
         super().__init__(AMPInstance)
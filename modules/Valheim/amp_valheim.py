@@ -21,6 +21,7 @@
 '''
 from __future__ import annotations
 import AMP_Console
+import AMP_Console_Events
 import AMP
 
 DisplayImageSources = ['steam:892970']
@@ -41,5 +42,13 @@ class AMPValheim(AMP.AMPInstance):
 
 
 class AMPValheimConsole(AMP_Console.AMPConsole):
+    # Valheim logs the `ZDOID` line on every spawn, not just the first; the connection line itself has no player name.
+    REPEATED_JOINS = True
+    EVENT_PARSER = AMP_Console_Events.EventParser("Valheim", [
+        (AMP_Console_Events.EVENT_DEATH, r'Got character ZDOID from (?P<player>.+?) : 0:0$'),
+        (AMP_Console_Events.EVENT_JOIN, r'Got character ZDOID from (?P<player>.+?) : -?\d+:\d+$'),
+        (AMP_Console_Events.EVENT_LEAVE, r'Player (?P<player>.+?) left the game'),
+    ])
+
     def __init__(self, AMPInstance=AMPValheim):
         super().__init__(AMPInstance)
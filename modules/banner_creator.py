@@ -6,6 +6,10 @@ import random
 import DB
 import AMP_Handler
 import logging
+
+def render_banner(AMPServer:AMP_Handler.AMP.AMPInstance, DBBanner:DB.DBBanner) -> Image.Image:
+    """Builds the Banner image; this makes blocking AMP API calls so use `await asyncio.to_thread(render_banner, ...)` from the event loop."""
+    return Banner_Generator(AMPServer, DBBanner)._image_()
         
 class Banner_Generator():
     """Custom Banner Generator for Gatekeeper. """
@@ -292,7 +296,8 @@ class Banner_Generator():
         text = 'Offline'
         fill = self._font_Status_color_offline
         padding = int((self._banner_shadow_box[0] - self._font_Status_text_length_Offline) / 2)
-        if self._Server.ADS_Running == 1:
+        #An open circuit breaker means AMP isn't answering for this Instance; don't wait on it.
+        if self._Server.ADS_Running == 1 and not self._Server.Breaker.is_open:
             text = 'Online: '
             fill = self._font_Status_color_online
             #This will change depending on the player limit of the server.
@@ -310,7 +315,7 @@ class Banner_Generator():
 
     def _Server_Players_Online(self):
         index = 0
-        if self._Server.ADS_Running != 0:
+        if self._Server.ADS_Running != 0 and not self._Server.Breaker.is_open:
             y = self._font_Status_text_height
             for entry in self._Server.getUserList():
                 if index > 8:
@@ -0,0 +1,62 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Shared pytest set up; the repo's flat modules on `sys.path`, the bot's custom logging levels and a scratch working directory
+so `discordBot.db` and the console archive never touch the checkout.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import pathlib
+import sys
+import types
+
+import pytest
+from haggis import logs
+
+REPO = pathlib.Path(__file__).parents[1]
+sys.path.insert(0, REPO.as_posix())
+if not hasattr(logging, "DEV"):
+    logs.add_logging_level("DEV", 15)
+    logs.add_logging_level("COMMAND", 19)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def workdir(tmp_path_factory: pytest.TempPathFactory) -> pathlib.Path:
+    path = tmp_path_factory.mktemp("gatekeeper")
+    cwd = os.getcwd()
+    os.chdir(path)
+    yield path
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def amp_instance() -> types.SimpleNamespace:
+    """Just enough of an `AMPInstance` for an `AMPConsole`; `Console_Flag` off so it never registers with the poller."""
+    return types.SimpleNamespace(
+        InstanceID="test-instance",
+        FriendlyName="Test",
+        DisplayImageSource="Generic",
+        Console_Flag=False,
+        Console_Priority=1,
+        AMPHandler=types.SimpleNamespace(AMP_Console_Threads={}, AMP_Console_Modules={}),
+    )
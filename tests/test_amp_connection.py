@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+import time
+import types
+
+import pytest
+import requests
+
+import AMP
+import AMP_Async
+import AMP_Connection
+from AMP_Connection import CircuitBreaker
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(AMP_Connection.time, "monotonic", clock)
+    return clock
+
+
+def test_breaker_opens_after_threshold(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+    assert breaker.retry_in() == 30
+
+
+def test_breaker_success_resets_the_count(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_trial_through(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial opens it again for another `reset_timeout`.
+    breaker.record_failure()
+    assert breaker.is_open
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow() and breaker.allow()
+
+
+def test_release_frees_the_trial(clock: Clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def response(status_code: int, content: bytes = b'{"result": true}') -> requests.Response:
+    reply = requests.Response()
+    reply.status_code = status_code
+    reply._content = content
+    return reply
+
+
+class FakePool:
+    max_attempts = 3
+
+    def __init__(self, replies: list) -> None:
+        self.replies = list(replies)
+        self.posts = 0
+
+    def post(self, url, **kwargs) -> requests.Response:
+        self.posts += 1
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture
+def instance(monkeypatch) -> AMP.AMPInstance:
+    """An `AMPInstance` with just what `_post()` uses; the constructor talks to AMP."""
+    monkeypatch.setattr(AMP_Connection, "backoff_delay", lambda attempt: 0)
+    instance = AMP.AMPInstance.__new__(AMP.AMPInstance)
+    instance.__dict__.update(
+        logger=AMP.logging.getLogger(),
+        Breaker=CircuitBreaker(failure_threshold=2),
+        SessionID=0,
+        url="http://amp/API/",
+        AMPheader={},
+        TargetName=None,
+        InstanceID="test-instance",
+        FriendlyName="Test",
+        AMPHandler=types.SimpleNamespace(SuccessfulConnection=False),
+    )
+    return instance
+
+
+def post(monkeypatch, instance: AMP.AMPInstance, replies: list, APICall: str = "Core/GetStatus") -> tuple[requests.Response | None, FakePool]:
+    pool = FakePool(replies)
+    monkeypatch.setattr(AMP_Connection, "getAMPPool", lambda: pool)
+    return instance._post(APICall, {}), pool
+
+
+def test_server_errors_are_retried(monkeypatch, instance: AMP.AMPInstance):
+    reply, pool = post(monkeypatch, instance, [response(503), response(500, b"oops"), response(200)])
+    assert reply.status_code == 200 and pool.posts == 3
+    assert instance.Breaker.failures == 0
+    assert instance.AMPHandler.SuccessfulConnection
+
+
+def test_server_errors_count_against_the_breaker(monkeypatch, instance: AMP.AMPInstance):
+    reply, pool = post(monkeypatch, instance, [response(502)] * 3)
+    assert reply == None and pool.posts == 3
+    assert instance.Breaker.failures == 1
+    # Never reached AMP; startup validation is left to `AMP_init`, a worker thread just gets `None`.
+    assert not instance.AMPHandler.SuccessfulConnection
+
+    post(monkeypatch, instance, [requests.ConnectionError("refused")] * 3)
+    assert instance.Breaker.is_open
+
+
+def test_client_errors_are_not_retried(monkeypatch, instance: AMP.AMPInstance):
+    reply, pool = post(monkeypatch, instance, [response(404, b"")])
+    assert reply.status_code == 404 and pool.posts == 1
+    assert instance.Breaker.failures == 0
+
+
+@pytest.mark.parametrize("APICall, posts", (("Core/GetUpdates", 1), ("Core/GetStatus", 3)))
+def test_empty_bodies(monkeypatch, instance: AMP.AMPInstance, APICall: str, posts: int):
+    reply, pool = post(monkeypatch, instance, [response(200, b"")] * 3, APICall)
+    assert pool.posts == posts
+    assert (reply != None) == (APICall == "Core/GetUpdates")
+
+
+@pytest.fixture
+def silent_server():
+    """A socket that accepts connections and never replies."""
+    server = socket.create_server(("127.0.0.1", 0))
+    server.listen()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/API/"
+    server.close()
+
+
+def test_async_calls_keep_the_session_timeouts(monkeypatch, instance: AMP.AMPInstance, silent_server: str):
+    pool = types.SimpleNamespace(pool_size=2, connect_timeout=1, read_timeout=0.3, max_attempts=1)
+    monkeypatch.setattr(AMP_Connection, "getAMPPool", lambda: pool)
+    monkeypatch.setattr(AMP_Async, "Session", None)
+    instance.url = silent_server
+
+    async def call() -> tuple[bytes | None, int]:
+        try:
+            # The outer limit only catches a request that ignores the session's `sock_read`.
+            return await asyncio.wait_for(AMP_Async.AMPAsyncInstance(instance)._post("Core/GetStatus", {}), 5)
+        finally:
+            await AMP_Async.closeAMPSession()
+
+    start = time.monotonic()
+    assert asyncio.run(call()) == (None, 0)
+    assert time.monotonic() - start < 2
+    # A hung call is a failed call.
+    assert instance.Breaker.failures == 1
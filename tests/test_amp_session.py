@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import threading
+import types
+
+import AMP
+import AMP_Session
+
+UNAUTHORIZED = {"Title": "Unauthorized Access"}
+
+
+def make_instance(call_api) -> tuple[AMP.AMPInstance, AMP_Session.AMPSessionManager]:
+    """An `AMPInstance` without its constructor (which talks to AMP) and the session manager it logs in through."""
+    handler = types.SimpleNamespace(SessionIDlist={}, tokens=types.SimpleNamespace(AMPUser="bot", AMPPassword="secret"), AMP_Instances={})
+    manager = AMP_Session.AMPSessionManager(handler)
+    handler.Sessions = manager
+    instance = AMP.AMPInstance.__new__(AMP.AMPInstance)
+    instance.__dict__.update(
+        logger=AMP.logging.getLogger(),
+        InstanceID="test-instance",
+        FriendlyName="Test",
+        SessionID=0,
+        AMP2Factor=None,
+        Running=True,
+        AMPHandler=handler,
+    )
+    instance.CallAPI = lambda APICall, parameters, timeout=None: call_api(instance, APICall)
+    return instance, manager
+
+
+def run(target) -> bool:
+    """Runs `target` on a daemon thread; `False` if it is still stuck after two seconds."""
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(2)
+    return not thread.is_alive()
+
+
+def test_login_can_invalidate_on_its_own_thread():
+    # Any path from the Login call back into `invalidate()` used to deadlock on the per Instance lock.
+    instance, manager = make_instance(lambda instance, APICall: manager.invalidate(instance) or UNAUTHORIZED)
+    assert run(lambda: manager.login(instance))
+    assert instance.SessionID == 0 and not instance.Running
+    # Nobody is left waiting on the lock.
+    assert run(lambda: manager.invalidate(instance))
+
+
+def test_refused_refresh_keeps_the_current_session():
+    instance, manager = make_instance(lambda instance, APICall: instance._parseAPIResult(APICall, 200, UNAUTHORIZED))
+    instance.SessionID = "current"
+    manager.AMPHandler.SessionIDlist[instance.InstanceID] = "current"
+    assert run(lambda: manager.login(instance, refresh=True))
+    assert instance.SessionID == "current"
+    assert manager.AMPHandler.SessionIDlist == {"test-instance": "current"}
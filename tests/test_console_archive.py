@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import re
+import time
+from datetime import datetime
+
+import pytest
+
+import AMP_Console_Archive
+from AMP_Console_Archive import ConsoleArchive, parse_time
+
+DAY = 86400 * 1000
+EVERYTHING = re.compile("")
+
+
+def entry(contents: str, source: str = "Server") -> dict:
+    return {"Timestamp": "", "Source": source, "Type": "Console", "Contents": contents}
+
+
+@pytest.mark.parametrize("value, seconds", (("30m", 1800), ("2h", 7200), ("1d12h", 129600), (" 1w ", 604800), ("1d 2h", 93600)))
+def test_parse_relative_time(value: str, seconds: int):
+    assert abs(parse_time(value) - (time.time() - seconds) * 1000) < 1000
+
+
+def test_parse_iso_time():
+    assert parse_time("2024-05-01T12:30") == int(datetime(2024, 5, 1, 12, 30).timestamp() * 1000)
+
+
+@pytest.mark.parametrize("value", ("yesterday", "5x", "", "-2h"))
+def test_parse_time_rejects(value: str):
+    with pytest.raises(ValueError):
+        parse_time(value)
+
+
+def test_search_round_trip(tmp_path):
+    archive = ConsoleArchive("test-instance", root=tmp_path)
+    archive.append(1000, entry("Steve joined the game"))
+    archive.append(2000, entry("a\nmulti line\\ message", source="Odd\tSource"))
+    archive.append(3000, entry("Steve left the game"))
+
+    found = list(archive.search(re.compile("Steve")))
+    assert [(match.timestamp, match.contents) for match in found] == [(1000, "Steve joined the game"), (3000, "Steve left the game")]
+
+    odd = list(archive.search(re.compile("multi line")))
+    assert [(odd[0].source, odd[0].contents)] == [("Odd Source", "a\nmulti line\\ message")]
+    assert archive.stats()["blocks"] == 1
+
+
+def test_unusual_line_breaks_survive(tmp_path):
+    archive = ConsoleArchive("test-instance", root=tmp_path)
+    contents = "tab\there\x0bvt\x0cff\x1cfs\x1dgs\x1ers\x85nel\u2028ls\u2029ps end"
+    archive.append(1000, entry(contents))
+    archive.append(2000, entry("next"))
+    assert [match.contents for match in archive.search(EVERYTHING)] == [contents, "next"]
+
+
+def test_search_only_reads_blocks_in_range(tmp_path, monkeypatch):
+    archive = ConsoleArchive("test-instance", root=tmp_path)
+    for block in range(5):
+        for line in range(3):
+            archive.append(block * 1000 + line, entry(f"block {block} line {line}"))
+        archive.flush()
+
+    reads = []
+    decompress = AMP_Console_Archive.gzip.decompress
+    monkeypatch.setattr(AMP_Console_Archive.gzip, "decompress", lambda data: reads.append(len(data)) or decompress(data))
+    found = [match.contents for match in archive.search(EVERYTHING, since=2001, until=3001)]
+    assert found == ["block 2 line 1", "block 2 line 2", "block 3 line 0", "block 3 line 1"]
+    assert len(reads) == 2
+
+
+def test_segments_rotate_by_age_and_expire(tmp_path):
+    archive = ConsoleArchive("test-instance", retention_days=2, root=tmp_path)
+    for day in range(5):
+        archive.append(day * DAY, entry(f"day {day}"))
+        archive.flush()
+
+    # Day 0 and 1 ended before the two days kept from day 4.
+    assert archive.segments() == [2 * DAY, 3 * DAY, 4 * DAY]
+    assert [match.contents for match in archive.search(EVERYTHING)] == ["day 2", "day 3", "day 4"]
+
+
+def test_segments_rotate_by_size(tmp_path):
+    archive = ConsoleArchive("test-instance", segment_size=0, root=tmp_path)
+    for block in range(3):
+        archive.append(block, entry(f"block {block}"))
+        archive.flush()
+    assert archive.segments() == [0, 1, 2]
+
+
+def test_restart_appends_to_the_last_segment(tmp_path):
+    archive = ConsoleArchive("test-instance", root=tmp_path)
+    archive.append(1000, entry("before"))
+    archive.flush()
+
+    # A torn index line from a crash mid write is skipped.
+    with open(archive._index_path(1000), "a", encoding="utf-8") as index:
+        index.write("2000 20")
+
+    archive = ConsoleArchive("test-instance", root=tmp_path)
+    archive.append(2000, entry("after"))
+    archive.flush()
+    assert archive.segments() == [1000]
+    assert [match.contents for match in archive.search(EVERYTHING)] == ["before", "after"]
+
+
+def test_unforced_flush_waits_for_a_full_block(tmp_path, monkeypatch):
+    archive = ConsoleArchive("test-instance", root=tmp_path)
+    archive.append(1000, entry("buffered"))
+    archive.flush(force=False)
+    assert archive.segments() == []
+
+    monkeypatch.setattr(AMP_Console_Archive, "BLOCK_SIZE", 1)
+    archive.flush(force=False)
+    assert archive.segments() == [1000]
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import importlib.util
+import types
+
+import pytest
+
+import AMP_Console
+import AMP_Console_Events
+import AMP_Players
+from conftest import REPO
+
+
+def load_module(path: str) -> types.ModuleType:
+    """Loads a game module the way `moduleHandler` does."""
+    spec = importlib.util.spec_from_file_location(path.rsplit("/", 1)[-1][:-3], (REPO / path).as_posix())
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def entry(contents: str) -> AMP_Console.ConsoleEntry:
+    return {"Timestamp": "/Date(0)/", "Source": "Server", "Type": "Console", "Contents": contents}
+
+
+class FakeTracker:
+    """The open sessions half of `AMP_Players.PlayerTracker`."""
+
+    def __init__(self) -> None:
+        self.sessions: set[str] = set()
+
+    def is_online(self, InstanceID: str, player: str) -> bool:
+        return player.lower() in self.sessions
+
+    def on_event(self, event: AMP_Console_Events.ConsoleEvent) -> None:
+        if event.type == AMP_Console_Events.EVENT_JOIN:
+            self.sessions.add(event.player.lower())
+        elif event.type == AMP_Console_Events.EVENT_LEAVE:
+            self.sessions.discard(event.player.lower())
+
+
+@pytest.fixture
+def tracker(monkeypatch) -> FakeTracker:
+    tracker = FakeTracker()
+    monkeypatch.setattr(AMP_Players, "Tracker", tracker)
+    monkeypatch.setattr(AMP_Console_Events.getEventDispatcher(), "publish", tracker.on_event)
+    return tracker
+
+
+def test_valheim_respawns_are_not_joins(amp_instance, tracker: FakeTracker):
+    console = load_module("modules/Valheim/amp_valheim.py").AMPValheimConsole(amp_instance)
+    lines = [
+        "Got character ZDOID from Bob : -123:1",
+        "Got character ZDOID from Bob : 0:0",
+        "Got character ZDOID from Bob : -456:2",
+        "Player Bob left the game",
+        "Got character ZDOID from Bob : -789:1",
+    ]
+    for line in lines:
+        console.console_events(entry(line))
+    assert console.console_event_messages.drain() == [
+        str(AMP_Console_Events.ConsoleEvent(kind, "Bob", None, "test-instance", "Test", 0, ""))
+        for kind in (AMP_Console_Events.EVENT_JOIN, AMP_Console_Events.EVENT_DEATH, AMP_Console_Events.EVENT_LEAVE, AMP_Console_Events.EVENT_JOIN)
+    ]
+
+
+def test_other_games_keep_every_join(amp_instance, tracker: FakeTracker):
+    console = load_module("modules/Minecraft/amp_minecraft.py").AMPMinecraftConsole(amp_instance)
+    tracker.sessions.add("steve")
+    console.console_events(entry("Steve joined the game"))
+    assert len(console.console_event_messages) == 1
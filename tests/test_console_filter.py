@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import pytest
+
+import AMP_Console_Filter
+from AMP_Console_Filter import FILTER_TYPE_CONSOLE, FILTER_TYPE_EVENT, AMPFilterCache, AMPRegexFilter
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def cache(monkeypatch) -> AMPFilterCache:
+    cache = AMPFilterCache(budget=0.05)
+    cache.disabled = []
+    monkeypatch.setattr(cache, "disable", lambda ID, name, elapsed: cache.disabled.append(ID))
+    return cache
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(AMP_Console_Filter.time, "monotonic", clock)
+    return clock
+
+
+def test_one_slow_line_only_logs(cache: AMPFilterCache, clock: Clock, caplog):
+    cache.overrun(1, "slow", 0.2)
+    assert cache.disabled == []
+    assert "took 200ms" in caplog.text
+
+
+def test_scattered_overruns_never_disable(cache: AMPFilterCache, clock: Clock):
+    for _ in range(10):
+        cache.overrun(1, "slow", 0.2)
+        clock.now += AMP_Console_Filter.OVERRUN_WINDOW / (AMP_Console_Filter.OVERRUN_LIMIT - 1) + 1
+    assert cache.disabled == []
+
+
+def test_repeated_overruns_disable(cache: AMPFilterCache, clock: Clock):
+    for _ in range(AMP_Console_Filter.OVERRUN_LIMIT):
+        cache.overrun(1, "slow", 0.2)
+        clock.now += 1
+    cache.overrun(2, "other", 0.2)
+    assert cache.disabled == [1]
+
+
+def test_overrun_warnings_back_off(cache: AMPFilterCache, clock: Clock, caplog):
+    logged = 0
+    # Slow now and then, never often enough to be disabled.
+    for _ in range(40):
+        cache.overrun(1, "slow", 0.2)
+        clock.now += AMP_Console_Filter.OVERRUN_WINDOW
+        warnings = caplog.text.count("took 200ms")
+        logged, fresh = warnings, warnings - logged
+        assert fresh <= 1
+    assert cache.disabled == []
+    # The gaps between warnings grow until they reach OVERRUN_BACKOFF_MAX.
+    assert logged < 40
+
+
+def test_filter_reports_every_overrun():
+    reported = []
+    regex_filter = AMPRegexFilter({1: {"Name": "any", "Pattern": "a|b", "Type": FILTER_TYPE_CONSOLE}}, budget=0, on_overrun=lambda *args: reported.append(args[0]))
+    for _ in range(3):
+        assert regex_filter.match("a line") == (FILTER_TYPE_CONSOLE, "any")
+    assert reported == [1, 1, 1]
+
+
+def test_filter_matches_events_first():
+    patterns = {
+        1: {"Name": "noise", "Pattern": "joined the game", "Type": FILTER_TYPE_CONSOLE},
+        2: {"Name": "join", "Pattern": r"(?i)(\w+) JOINED the game", "Type": FILTER_TYPE_EVENT},
+        3: {"Name": "off", "Pattern": "left", "Type": FILTER_TYPE_CONSOLE, "Disabled": True},
+    }
+    regex_filter = AMPRegexFilter(patterns)
+    assert len(regex_filter) == 2
+    assert regex_filter.match("Steve joined the game") == (FILTER_TYPE_EVENT, "join")
+    assert regex_filter.match("Steve left the game") == (None, None)
+
+
+@pytest.mark.parametrize(
+    "pattern, literals",
+    (
+        ("Can't keep up!", [("Can't keep up!", False)]),
+        (r"(?i)\[Server thread/INFO\]", [("[server thread/info]", True)]),
+        (r"(joined|left) the game", [(" the game", False)]),
+        (r"(Steve|Alex)\d+", [("Steve", False), ("Alex", False)]),
+        (r"\d+ms", None),
+    ),
+)
+def test_required_literals(pattern: str, literals):
+    assert AMP_Console_Filter.required_literals(pattern) == literals
+
+
+def test_nested_quantifiers():
+    assert AMP_Console_Filter.nested_quantifier(r"(a+)+")
+    assert AMP_Console_Filter.nested_quantifier(r"(\w+\s?)*")
+    assert not AMP_Console_Filter.nested_quantifier(r"(ab)+\d{2}")
+
+
+def test_without_the_re_parser(monkeypatch):
+    monkeypatch.setattr(AMP_Console_Filter, "sre_parse", None)
+    assert AMP_Console_Filter.required_literals("Can't keep up!") == None
+    assert not AMP_Console_Filter.nested_quantifier(r"(a+)+")
+    regex_filter = AMPRegexFilter({1: {"Name": "lag", "Pattern": "Can't keep up!", "Type": FILTER_TYPE_CONSOLE}})
+    assert regex_filter.prefiltered == {}
+    assert regex_filter.match("[WARN]: Can't keep up! Is the server overloaded?") == (FILTER_TYPE_CONSOLE, "lag")
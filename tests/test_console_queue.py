@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from AMP_Console import ConsoleQueue, skipped_marker
+
+
+def test_full_queue_drops_the_oldest():
+    queue = ConsoleQueue("Console", capacity=3)
+    for item in "abcde":
+        queue.put(item)
+    assert [queue.get() for _ in range(4)] == ["c", "d", "e", None]
+    assert queue.stats() == {"depth": 0, "capacity": 3, "high_water": 3, "enqueued": 5, "dropped": 2}
+
+
+def test_dropped_lines_become_one_marker():
+    queue = ConsoleQueue("Console", capacity=2, marker=skipped_marker)
+    # A batched item counts every line it carries.
+    for item in ("one\ntwo", "three", "four", "five"):
+        queue.put(item)
+    assert len(queue) == 3
+    assert queue.get() == skipped_marker(3)
+    assert [queue.get(), queue.get(), queue.get()] == ["four", "five", None]
+
+
+def test_drain_limits():
+    queue = ConsoleQueue("Console", capacity=2, marker=skipped_marker)
+    for item in ("aaaa", "bb", "cc", "dddd"):
+        queue.put(item)
+    marker = skipped_marker(2)
+    # The marker comes first and counts towards the size.
+    assert queue.drain(max_size=len(marker) + 3) == [marker, "cc"]
+    # An item larger than `max_size` is still handed out on its own.
+    assert queue.drain(max_size=2) == ["dddd"]
+    assert queue.drain() == []
+
+    for item in "abcd":
+        queue.put(item)
+    queue.capacity = 10
+    assert queue.drain(max_items=2) == [skipped_marker(2), "c"]
+
+
+def test_on_ready_fires_once_per_backlog():
+    signals = []
+    queue = ConsoleQueue("Console", capacity=10)
+    queue.on_ready = signals.append
+    queue.put("a")
+    queue.put("b")
+    assert signals == [queue]
+
+    # Still signalled until a consumer finds the queue empty.
+    assert queue.drain(max_items=1) == ["a"]
+    queue.put("c")
+    assert len(signals) == 1
+    assert queue.drain() == ["b", "c"]
+    assert queue.drain() == []
+    queue.put("d")
+    assert len(signals) == 2
+
+
+def test_clear():
+    queue = ConsoleQueue("Console", capacity=1, marker=skipped_marker)
+    queue.put("a")
+    queue.put("b")
+    queue.clear()
+    assert len(queue) == 0 and queue.get() == None
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import AMP_Console
+import DB
+
+HOUR = 3600 * 1000
+
+
+def dotnet(ms: int) -> str:
+    return f"/Date({ms})/"
+
+
+def entry(stamp: str, contents: str) -> AMP_Console.ConsoleEntry:
+    return {"Timestamp": stamp, "Source": "Server", "Type": "Console", "Contents": contents}
+
+
+def relay(console: AMP_Console.AMPConsole, batch: list[AMP_Console.ConsoleEntry]) -> list[str]:
+    """The dedupe half of `console_poll()`; the Contents that would be relayed."""
+    watermark = (console.watermark, len(console.watermark_hashes))
+    console.console_baseline(batch)
+    relayed = [item["Contents"] for item in batch if not console.console_seen(console.entry_time(item), item)]
+    if watermark != (console.watermark, len(console.watermark_hashes)):
+        console.watermark_dirty = True
+    return relayed
+
+
+@pytest.mark.parametrize("skew", (-3 * HOUR, -90 * 1000, 0, 90 * 1000, 5 * HOUR))
+def test_skewed_host_clock_loses_nothing(amp_instance, skew: int):
+    console = AMP_Console.AMPConsole(amp_instance)
+    host_now = int(time.time() * 1000) + skew
+
+    backlog = [entry(dotnet(host_now - 5000), "old one"), entry(dotnet(host_now - 1000), "old two")]
+    assert relay(console, backlog) == []
+
+    fresh = [entry(dotnet(host_now + 500), "new one"), entry(dotnet(host_now + 500), "new two"), entry(dotnet(host_now + 900), "new three")]
+    assert relay(console, fresh) == ["new one", "new two", "new three"]
+    # AMP hands the same entries out again; nothing is relayed twice.
+    assert relay(console, fresh) == []
+    # Only timezone sized differences move the archive's clock offset.
+    assert console.clock_offset == round(-skew / AMP_Console.CLOCK_OFFSET_STEP) * AMP_Console.CLOCK_OFFSET_STEP
+
+
+def test_empty_first_batch_relays_everything_after(amp_instance):
+    console = AMP_Console.AMPConsole(amp_instance)
+    assert relay(console, []) == []
+    # A host clock far in the past is still newer than "nothing seen yet".
+    assert relay(console, [entry(dotnet(1000), "first")]) == ["first"]
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="needs time.tzset()")
+def test_naive_iso_stamps_ignore_the_bot_timezone(amp_instance, monkeypatch):
+    stamp = "2024-05-01T12:00:00.250"
+    decoded = []
+    for zone in ("UTC", "America/New_York", "Asia/Kolkata"):
+        monkeypatch.setenv("TZ", zone)
+        time.tzset()
+        decoded.append(AMP_Console.timestamp_decoder(stamp)(stamp))
+    monkeypatch.delenv("TZ")
+    time.tzset()
+    assert len(set(decoded)) == 1
+    # Aware stamps are real instants.
+    assert AMP_Console.timestamp_decoder("2024-05-01T12:00:00+02:00")("2024-05-01T12:00:00+02:00") == decoded[0] - 2 * HOUR - 250
+
+
+def test_host_in_another_timezone_loses_nothing(amp_instance):
+    console = AMP_Console.AMPConsole(amp_instance)
+    # The host prints its wall clock 9 hours ahead of the bot without an offset.
+    host = datetime.now(timezone.utc) + timedelta(hours=9)
+    iso = lambda delta: (host + timedelta(seconds=delta)).replace(tzinfo=None).isoformat()
+
+    assert relay(console, [entry(iso(-60), "backlog")]) == []
+    assert relay(console, [entry(iso(1), "joined"), entry(iso(2), "said hi")]) == ["joined", "said hi"]
+    assert console.clock_offset == -9 * HOUR
+
+
+def test_saved_watermark_survives_a_restart(amp_instance):
+    database = DB.getDBHandler().DB
+    database.AddServer(InstanceID=amp_instance.InstanceID, InstanceName="Test", FriendlyName="Test")
+    host_now = int(time.time() * 1000) - 2 * HOUR
+
+    console = AMP_Console.AMPConsole(amp_instance)
+    assert relay(console, [entry(dotnet(host_now - 1000), "backlog")]) == []
+    assert relay(console, [entry(dotnet(host_now), "a"), entry(dotnet(host_now), "b")]) == ["a", "b"]
+    console.console_watermark_save(force=True)
+
+    # Printed while the bot was down, next to what it already relayed.
+    restarted = AMP_Console.AMPConsole(amp_instance)
+    batch = [entry(dotnet(host_now), "a"), entry(dotnet(host_now), "b"), entry(dotnet(host_now), "c"), entry(dotnet(host_now + 10), "d")]
+    assert relay(restarted, batch) == ["c", "d"]
+
+
+def test_watermark_saves_are_throttled(amp_instance, monkeypatch):
+    console = AMP_Console.AMPConsole(amp_instance)
+    assert console.DB_Server != None
+    saves = []
+    # `DBServer` attributes are columns; patch the class.
+    monkeypatch.setattr(DB.DBServer, "setConsoleWatermark", lambda self, Timestamp, Hashes: saves.append(Timestamp))
+    host_now = int(time.time() * 1000)
+
+    relay(console, [])
+    for offset in range(5):
+        relay(console, [entry(dotnet(host_now + offset), f"line {offset}")])
+        console.console_watermark_save()
+    # Moved five times within `WATERMARK_SAVE_INTERVAL`; nothing written yet.
+    assert saves == []
+
+    console.watermark_saved -= console.WATERMARK_SAVE_INTERVAL
+    console.console_watermark_save()
+    assert saves == [host_now + 4]
+
+    # Nothing moved since; even a forced save doesn't write.
+    console.console_watermark_save(force=True)
+    assert saves == [host_now + 4]
+
+    relay(console, [entry(dotnet(host_now + 10), "stopping")])
+    console.console_watermark_save(force=True)
+    assert saves == [host_now + 4, host_now + 10]
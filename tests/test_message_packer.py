@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import random
+import types
+
+import pytest
+
+import AMP_Console
+from AMP_Console import CODE_FENCE, MessagePacker, chunk_line
+
+
+def test_short_lines_are_left_alone():
+    assert list(chunk_line("hello world", 20)) == ["hello world"]
+    assert list(chunk_line("", 20)) == []
+
+
+def test_split_preferences():
+    # Semicolons stay on the left piece; spaces and newlines are dropped.
+    assert list(chunk_line("aaaa;bbbb cccc", 10)) == ["aaaa;", "bbbb cccc"]
+    assert list(chunk_line("aaaa bbbb\ncccc", 10)) == ["aaaa bbbb", "cccc"]
+    assert list(chunk_line("aaaa bbbb cccc", 10)) == ["aaaa bbbb", "cccc"]
+    assert list(chunk_line("x" * 25, 10)) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pieces_fit_and_lose_only_delimiters(seed: int):
+    rng = random.Random(seed)
+    text = "".join(rng.choice("abc ;\n") for _ in range(5000))
+    pieces = list(chunk_line(text, 100))
+    assert all(len(piece) <= 100 for piece in pieces)
+    strip = lambda value: value.replace(" ", "").replace("\n", "")
+    assert strip("".join(pieces)) == strip(text)
+
+
+def pack(lines: list[str], limit: int) -> list[str]:
+    packer = MessagePacker(limit)
+    for line in lines:
+        packer.add(line)
+    return packer.flush()
+
+
+def test_packs_lines_up_to_the_limit():
+    assert pack(["a" * 8, "b" * 8, "c" * 8], 20) == ["a" * 8 + "\n" + "b" * 8, "c" * 8]
+    assert pack([], 20) == []
+
+
+def test_code_blocks_are_closed_and_reopened():
+    lines = [CODE_FENCE] + [f"line {index:03}" for index in range(40)] + [CODE_FENCE, "after"]
+    messages = pack(lines, 100)
+    assert len(messages) > 1
+    for message in messages:
+        assert len(message) <= 100
+        assert message.count(CODE_FENCE) % 2 == 0
+    assert messages[1].startswith(CODE_FENCE + "\n")
+    assert messages[-1].endswith("after")
+    body = [line for message in messages for line in message.split("\n") if line != CODE_FENCE]
+    assert body == lines[1:-2] + ["after"]
+
+
+def test_long_lines_fit_with_their_fences():
+    messages = pack([CODE_FENCE + "x" * 500], 100)
+    assert all(len(message) <= 100 and message.count(CODE_FENCE) % 2 == 0 for message in messages)
+    assert "".join(message.replace(CODE_FENCE, "").replace("\n", "") for message in messages) == "x" * 500
+
+
+def test_flush_starts_over():
+    packer = MessagePacker(100)
+    packer.add(CODE_FENCE + " open")
+    assert packer.flush() == [CODE_FENCE + " open\n" + CODE_FENCE]
+    packer.add("plain")
+    assert packer.flush() == ["plain"]
+
+
+def test_long_chat_lines_reach_the_console_split(amp_instance):
+    amp_instance.__dict__.update(SenderFilterList=[], Discord_Chat_Channel=None, Discord_Event_Channel=None)
+    console = AMP_Console.AMPConsole(amp_instance)
+    console.DB_Server = types.SimpleNamespace(Discord_Chat_Prefix=None)
+    contents = "spam " * 1000
+    assert console.console_chat({"Timestamp": "", "Source": "Steve", "Type": "Chat", "Contents": contents})
+
+    messages = console.console_packer.flush()
+    assert len(messages) > 1
+    assert all(len(message) <= AMP_Console.DISCORD_MESSAGE_LIMIT for message in messages)
+    assert " ".join(messages).split() == f"Steve: {contents}".split()
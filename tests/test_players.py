@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import itertools
+import time
+
+import pytest
+
+import AMP_Console_Events
+import AMP_Players
+import DB
+
+_servers = itertools.count()
+
+
+@pytest.fixture
+def server() -> tuple[str, int]:
+    """`(InstanceID, DBServer.ID)` of a fresh Server row."""
+    InstanceID = f"players-{next(_servers)}"
+    db_server = DB.getDBHandler().DB.AddServer(InstanceID=InstanceID, InstanceName=InstanceID, FriendlyName=InstanceID)
+    return InstanceID, db_server.ID
+
+
+@pytest.fixture
+def trackers():
+    """Makes `PlayerTracker`s (one per simulated start) and unsubscribes them afterwards."""
+    made = []
+
+    def make() -> AMP_Players.PlayerTracker:
+        made.append(AMP_Players.PlayerTracker())
+        return made[-1]
+
+    yield make
+    for tracker in made:
+        AMP_Console_Events.getEventDispatcher().unsubscribe(tracker.on_event)
+
+
+def seconds_played(tracker: AMP_Players.PlayerTracker, ServerID: int) -> dict[str, int]:
+    return {row["Player"]: row["Seconds"] for row in tracker.playtime(ServerID=ServerID)}
+
+
+def test_crash_leftovers_close_when_last_seen(trackers, server):
+    _, ServerID = server
+    now = int(time.time())
+    tracker = trackers()
+    tracker.join(ServerID, "Steve", now - 7200)
+    tracker.DB.TouchPlayerSessions(ServerID=ServerID, Last_Seen=now - 6600)
+
+    # The bot was down for the last 110 minutes; none of that is playtime.
+    restarted = trackers()
+    assert restarted.online(ServerID) == []
+    assert seconds_played(restarted, ServerID) == {"Steve": 600}
+
+
+def test_never_seen_leftovers_book_nothing(trackers, server):
+    _, ServerID = server
+    trackers().join(ServerID, "Alex", int(time.time()) - 3600)
+    assert seconds_played(trackers(), ServerID) == {"Alex": 0}
+
+
+def test_shutdown_closes_every_session(trackers, server):
+    _, ServerID = server
+    now = int(time.time())
+    tracker = trackers()
+    tracker.join(ServerID, "Steve", now - 100)
+    tracker.close()
+    assert tracker.online(ServerID) == []
+    assert not tracker.join(ServerID, "Alex", now)
+
+    played = seconds_played(trackers(), ServerID)
+    assert played.keys() == {"Steve"} and 100 <= played["Steve"] <= 102
+
+
+def test_events_are_written_off_the_poller_thread(trackers, server):
+    InstanceID, ServerID = server
+    tracker = trackers()
+    tracker.online(ServerID)
+    event = AMP_Console_Events.ConsoleEvent(AMP_Console_Events.EVENT_JOIN, "Steve", None, InstanceID, "Test", int(time.time() * 1000), "")
+    tracker.on_event(event)
+    assert not tracker.is_online(InstanceID, "Steve")
+    assert tracker.DB.GetOpenPlayerSessions(ServerID) == []
+
+    # What the `AMP Players` thread does with it.
+    tracker._apply(tracker._events.get_nowait())
+    assert tracker.is_online(InstanceID, "steve")
+    assert len(tracker.DB.GetOpenPlayerSessions(ServerID)) == 1
@@ -529,7 +529,7 @@ class botUtils():
         if online_only == False:
             return amp_server
 
-        if amp_server.Running and amp_server._ADScheck():
+        if amp_server.Running and await amp_server.Async._ADScheck():
             return amp_server
 
         await context.send(f'Well this is awkward, it appears the **{amp_server.FriendlyName if amp_server.FriendlyName != None else amp_server.InstanceName}** is `Offline`.', ephemeral=True, delete_after=self._client.Message_Timeout)
@@ -0,0 +1,86 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Compares a bare `requests.post()` per API call against the pooled keep-alive sessions in `AMP_Connection`.
+
+Usage: `python utils_dev/benchmarks/bench_amp_pool.py --requests 2000 --threads 4`
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from haggis import logs
+
+sys.path.insert(0, pathlib.Path(__file__).parents[2].as_posix())
+logs.add_logging_level("DEV", 15)
+
+from AMP_Connection import AMPConnectionPool  # noqa: E402
+from utils_dev.fake_amp import FakeAMPServer  # noqa: E402
+
+HEADER = {"Accept": "text/javascript"}
+
+
+def run(label: str, server: FakeAMPServer, post, total: int, threads: int) -> None:
+    server.reset_counters()
+    url = server.url + "/API/ADSModule/Servers/fake-instance/API/Core/GetStatus"
+    data = json.dumps({"SESSIONID": "fake-session-id"})
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for response in executor.map(lambda _: post(url, data), range(total)):
+            response.json()
+    elapsed = time.perf_counter() - start
+
+    print(f"{label:<10} {total / elapsed:>10.1f} req/s   {server.connections:>6} handshakes   {server.requests:>6} requests")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AMP API connection pool benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=10)
+    args = parser.parse_args()
+
+    server = FakeAMPServer().start()
+    pool = AMPConnectionPool(pool_size=args.pool_size)
+    try:
+        run("bare", server, lambda url, data: requests.post(url, headers=HEADER, data=data), args.requests, args.threads)
+        run(
+            "pooled",
+            server,
+            lambda url, data: pool.post(url, data=data, headers=HEADER, target="fake-target"),
+            args.requests,
+            args.threads,
+        )
+        print(pool.stats())
+    finally:
+        pool.close()
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Attribute read cost of `AMPInstance` with the old `__getattribute__` refresh hook vs the plain reads used with the background refresher. \n
+The old hook is measured on its fast path (the 5 second throttle already hit), so no API calls are made.
+
+Usage: `python utils_dev/benchmarks/bench_attribute_access.py --reads 1000000`
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import sys
+import time
+import timeit
+import types
+
+sys.path.insert(0, pathlib.Path(__file__).parents[2].as_posix())
+
+from AMP import AMPInstance, AMPInstanceSnapshot  # noqa: E402
+
+SERVERDATA = {
+    "InstanceID": "f3a9c2",
+    "FriendlyName": "Survival",
+    "Running": True,
+    "AppState": 20,
+    "Module": "Minecraft",
+    "DisplayImageSource": "internal:MinecraftJava",
+}
+
+
+class LegacyAMPInstance(AMPInstance):
+    """`AMPInstance` with the removed `__getattribute__` hook put back."""
+
+    def __getattribute__(self, __name: str):
+        if __name in ["Initialized", "InstanceID", "serverdata"]:
+            return super().__getattribute__(__name)
+
+        if self.Initialized and (self.InstanceID != 0) and __name in self.serverdata:
+            self.AMPHandler.AMP._updateInstanceAttributes()
+
+        return super().__getattribute__(__name)
+
+    def _updateInstanceAttributes(self):
+        # The throttle check the old `_updateInstanceAttributes` ran on every hooked read.
+        if (not self.Initialized) or (time.time() - self.Last_Update_Time < 5):
+            return
+
+
+def build(cls: type[AMPInstance], main: AMPInstance | None = None) -> AMPInstance:
+    server = cls.__new__(cls)
+    object.__setattr__(server, "Initialized", False)
+    server.serverdata = SERVERDATA
+    server.InstanceID = SERVERDATA["InstanceID"] if main != None else 0
+    server.Last_Update_Time = time.time()
+    server.Snapshot = AMPInstanceSnapshot(SERVERDATA)
+    server.AMPHandler = types.SimpleNamespace(AMP=main if main != None else server)
+    for key, value in SERVERDATA.items():
+        setattr(server, key, value)
+    server.Initialized = True
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="AMPInstance attribute access benchmark")
+    parser.add_argument("--reads", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    legacy_main = build(LegacyAMPInstance)
+    legacy = build(LegacyAMPInstance, legacy_main)
+    current = build(AMPInstance, build(AMPInstance))
+
+    for label, server in (("hook", legacy), ("plain", current)):
+        for name in ("Running", "FriendlyName", "DisplayName"):
+            if name == "DisplayName":
+                setattr(server, name, None)
+            elapsed = timeit.timeit(f"server.{name}", globals={"server": server}, number=args.reads)
+            print(f"{label:<6} {name:<13} {elapsed / args.reads * 1e9:>8.1f} ns/read")
+
+
+if __name__ == "__main__":
+    main()
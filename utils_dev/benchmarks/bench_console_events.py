@@ -0,0 +1,188 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+
+Console event extraction throughput (lines/sec) per game module. \n
+Loads every `modules/*/amp_*.py` the way `AMPHandler.moduleHandler()` does and runs its Console class `EVENT_PARSER` over
+generated console output; `--event-ratio` of the lines are player events, the rest the module's everyday noise.
+Every sample event must come out with the right type and player and no noise line may produce one.
+
+Runs in a temporary directory with its own `discordBot.db`.
+
+Usage: `python utils_dev/benchmarks/bench_console_events.py --lines 100000 --event-ratio 0.05`
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import logging
+import os
+import pathlib
+import random
+import sys
+import tempfile
+import time
+
+from haggis import logs
+
+REPO = pathlib.Path(__file__).parents[2]
+sys.path.insert(0, REPO.as_posix())
+logs.add_logging_level("DEV", 15)
+logs.add_logging_level("COMMAND", 19)
+
+# {module name: ([(console line, event type, player)], [noise lines])}
+SAMPLES: dict[str, tuple[list[tuple[str, str, str]], list[str]]] = {
+    "Minecraft": (
+        [
+            ("Steve joined the game", "join", "Steve"),
+            ("[12:01:02] [Server thread/INFO]: Alex_99 left the game", "leave", "Alex_99"),
+            ("Steve has made the advancement [Stone Age]", "achievement", "Steve"),
+            ("Notch was slain by Zombie", "death", "Notch"),
+            ("Alex_99 fell from a high place", "death", "Alex_99"),
+            ("Herobrine tried to swim in lava to escape Skeleton", "death", "Herobrine"),
+        ],
+        [
+            "Can't keep up! Is the server overloaded? Running 2035ms or 40 ticks behind",
+            "UUID of player Steve is 069a79f4-44e9-4726-a5be-fca90e38aaf5",
+            "Steve lost connection: Disconnected",
+            "Saving chunks for level 'ServerLevel[world]'/minecraft:overworld",
+            "Villager EntityVillager['Villager'/412, l='ServerLevel[world]', x=12.5, y=64.0, z=-3.5] died, message: 'Villager was slain by Zombie'",
+            "[Server thread/WARN]: Steve moved too quickly! 12.3,0.0,4.1",
+        ],
+    ),
+    "Terraria": (
+        [
+            ("Andrew has joined.", "join", "Andrew"),
+            ("Andrew has left.", "leave", "Andrew"),
+            ("Guide Man was slain by Eye of Cthulhu.", "death", "Guide Man"),
+        ],
+        ["Saving world data: 45%", "Backing up world file", "127.0.0.1:7777 is connecting...", "Server started"],
+    ),
+    "Valheim": (
+        [
+            ("Got character ZDOID from Ragnar : 2547856241:1", "join", "Ragnar"),
+            ("Got character ZDOID from Ragnar : 0:0", "death", "Ragnar"),
+        ],
+        ["Connections 1 ZDOS:9000  sent:0 recv:12", "World saved ( 120.5ms )", "Closing socket 76561198000000000", "New connection"],
+    ),
+    "Factorio": (
+        [
+            ("2023-05-01 12:00:00 [JOIN] engineer joined the game", "join", "engineer"),
+            ("2023-05-01 12:10:00 [LEAVE] engineer left the game", "leave", "engineer"),
+        ],
+        ["Info ServerMultiplayerManager.cpp:923: Saving finished", "Info AppManager.cpp:287: Saving to _autosave3 (non-blocking).", "Info RemoteCommandProcessor.cpp:242: Starting RCON interface"],
+    ),
+    "Sevendays": (
+        [
+            ("2023-05-01T12:00:00 120.5 INF GMSG: Player 'Survivor' joined the game", "join", "Survivor"),
+            ("2023-05-01T12:10:00 720.5 INF GMSG: Player 'Survivor' left the game", "leave", "Survivor"),
+            ("2023-05-01T12:05:00 420.5 INF GMSG: Player 'Survivor' died", "death", "Survivor"),
+        ],
+        ["2023-05-01T12:00:01 121.0 INF Time: 2.01m FPS: 35.2 Heap: 1200.0MB Max: 1300.0MB Chunks: 420 CGO: 12 Ply: 1", "INF Spawned zombieBoe at (1.0, 2.0, 3.0)"],
+    ),
+    "Projectzomboid": (
+        [
+            ('ConnectionManager: [fully-connected] "" connection: guid=123 ip=127.0.0.1 steam-id=765 access= username="Kate" connection-type="UDPRakNet"', "join", "Kate"),
+            ('ConnectionManager: [disconnect] "receive-disconnect" connection: guid=123 ip=127.0.0.1 steam-id=765 access= username="Kate" connection-type="UDPRakNet"', "leave", "Kate"),
+            ("user Kate died at (10800,9300,0) (non pvp)", "death", "Kate"),
+        ],
+        ["LOG  : General , 1682942400000> 12,345> Saving chunk", "LOG  : Network , 1682942400001> 12,346> ZNet: SSteamSDK: Connected"],
+    ),
+    "Starbound": (
+        [
+            ("[Info] UniverseServer: Client 'Esther' <1> (127.0.0.1:21025) connected", "join", "Esther"),
+            ("[Info] UniverseServer: Client 'Esther' <1> (127.0.0.1:21025) disconnected for reason: ", "leave", "Esther"),
+        ],
+        ["[Info] UniverseServer: Logged in account ''Esther'' as player 'Esther' from address 127.0.0.1", "[Info] Root: Writing runtime configuration"],
+    ),
+    "Csgo": (
+        [
+            ('"Gabe<2><STEAM_1:0:123><>" entered the game', "join", "Gabe"),
+            ('"Gabe<2><STEAM_1:0:123><CT>" disconnected (reason "Disconnect")', "leave", "Gabe"),
+            ('"Bot<3><BOT><TERRORIST>" [-1 2 3] killed "Gabe<2><STEAM_1:0:123><CT>" [4 5 6] with "ak47"', "death", "Gabe"),
+        ],
+        ['"Gabe<2><STEAM_1:0:123><CT>" purchased "m4a1"', 'World triggered "Round_Start"', 'Team "CT" scored "3" with "5" players'],
+    ),
+}
+
+
+def load_parsers() -> dict:
+    """`{module name: EventParser}` of every game module, loaded like `AMPHandler.moduleHandler()`."""
+    parsers = {}
+    for script in sorted(REPO.joinpath("modules").glob("*/amp_*.py")):
+        module_name = script.name[4:-3].capitalize()
+        spec = importlib.util.spec_from_file_location(module_name, script)
+        class_module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(class_module)
+        parser = getattr(class_module, f"AMP{module_name}Console").EVENT_PARSER
+        if parser != None:
+            parsers[module_name] = parser
+    return parsers
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gatekeeper console event extraction benchmark")
+    parser.add_argument("--lines", type=int, default=100000)
+    parser.add_argument("--event-ratio", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.chdir(tempfile.mkdtemp(prefix="gatekeeper_bench_"))
+
+    failed = False
+    for module_name, event_parser in load_parsers().items():
+        if module_name not in SAMPLES:
+            print(f"{module_name:<16} no samples")
+            continue
+
+        events, noise = SAMPLES[module_name]
+        for line, event_type, player in events:
+            found = event_parser.parse({"Type": "Console", "Source": "Console", "Contents": line, "Timestamp": ""}, "bench", module_name, 0)
+            if found == None or found.type != event_type or found.player != player:
+                print(f"**ERROR** {module_name} parsed {found!r} from `{line}`; expected {event_type} of {player}")
+                failed = True
+        for line in noise:
+            found = event_parser.match(line)
+            if found != None:
+                print(f"**ERROR** {module_name} parsed {found} from the noise line `{line}`")
+                failed = True
+
+        rng = random.Random(args.seed)
+        lines = [
+            {"Type": "Console", "Source": "Console", "Timestamp": "", "Contents": rng.choice(events)[0] if rng.random() < args.event_ratio else rng.choice(noise)}
+            for _ in range(args.lines)
+        ]
+        start = time.perf_counter()
+        count = 0
+        for entry in lines:
+            if event_parser.parse(entry, "bench", module_name, 0) != None:
+                count += 1
+        elapsed = time.perf_counter() - start
+        prefiltered = sum(1 for rule in event_parser.rules if rule[2] != None)
+        print(f"{module_name:<16} {args.lines / elapsed:>12,.0f} lines/s  {count:>7} events  ({prefiltered}/{len(event_parser.rules)} rules literal prefiltered)")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
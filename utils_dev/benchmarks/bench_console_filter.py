@@ -0,0 +1,174 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Console regex filter throughput (lines/sec). \n
+Compares the old `console_filter` (a `GetServerRegexPatterns()` SQLite join per line and one `re.search()` per pattern string)
+with `AMP_Console_Filter.AMPRegexFilter` over the same Server and `--patterns` RegexPatterns, with and without its literal prefilter.
+Every line's filter decision is checked to be the same for both.
+
+Runs in a temporary directory with its own `discordBot.db`.
+
+Usage: `python utils_dev/benchmarks/bench_console_filter.py --patterns 50 --lines 20000`
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import pathlib
+import random
+import re
+import sys
+import tempfile
+import time
+
+from haggis import logs
+
+REPO = pathlib.Path(__file__).parents[2]
+sys.path.insert(0, REPO.as_posix())
+logs.add_logging_level("DEV", 15)
+logs.add_logging_level("COMMAND", 19)
+
+WORDS = ["Steve", "Alex", "Notch", "Herobrine", "Creeper", "Zombie", "Skeleton", "Enderman", "Villager", "Wither"]
+MODS = ["create", "jei", "journeymap", "mekanism", "thermal", "botania", "ae2", "quark", "tconstruct", "waystones"]
+
+# Line templates, roughly in the proportions a modded Minecraft server prints them.
+LINES = [
+    "[{time}] [Server thread/INFO]: {word} joined the game",
+    "[{time}] [Server thread/INFO]: {word} left the game",
+    "[{time}] [Server thread/WARN]: Can't keep up! Is the server overloaded? Running {num}ms or {num} ticks behind",
+    "[{time}] [Server thread/INFO]: {word} has made the advancement [Stone Age]",
+    "[{time}] [Server thread/WARN]: {word} moved too quickly! {num},{num},{num}",
+    "[{time}] [Server thread/INFO]: Saving chunks for level 'ServerLevel[world]'/minecraft:overworld",
+    "[{time}] [modloading-worker-{num}/INFO]: Loading mod {mod} version {num}.{num}.{num}",
+    "[{time}] [Server thread/INFO]: [{mod}] Registered {num} recipes",
+    "[{time}] [User Authenticator #{num}/INFO]: UUID of player {word} is {uuid}",
+    "[{time}] [Server thread/INFO]: {word} was slain by {word}",
+    "[{time}] [Server thread/INFO]: There are {num} of a max of 20 players online: {word}, {word}",
+    "[{time}] [Netty Epoll Server IO #{num}/INFO]: Connection reset by peer",
+]
+
+
+def make_patterns(count: int, seed: int) -> list[tuple[str, int, str]]:
+    """`count` RegexPatterns `(Name, Type, Pattern)`; a mix of literals, classes, anchors and inline flags."""
+    rng = random.Random(seed)
+    shapes = [
+        lambda i: rf"Loading mod {MODS[i % len(MODS)]} version {i // len(MODS)}\.",
+        lambda i: rf"\[{MODS[i % len(MODS)]}\] Registered {i // len(MODS)}\d+ recipes",
+        lambda i: rf"{WORDS[i % len(WORDS)]} (joined|left) the game{'!' * (i // len(WORDS))}",
+        lambda i: rf"(?i){WORDS[i % len(WORDS)]} moved too quickly! {i // len(WORDS)}",
+        lambda i: rf"^\[\d\d:\d\d:\d\d\] \[Server thread/WARN\]: Can't keep up! .* {i}\d\dms",
+        lambda i: rf"was slain by {WORDS[i % len(WORDS)]}{'!' * (i // len(WORDS))}$",
+        lambda i: rf"UUID of player {WORDS[i % len(WORDS)]}{i // len(WORDS)} is [0-9a-f\-]{{36}}",
+        lambda i: rf"has made the advancement \[[^\]]*{i}\]",
+        lambda i: rf"Connection (reset|refused) #{i}\b",
+        lambda i: rf"Saving chunks for level '[^']+'/minecraft:dim{i}",
+    ]
+    patterns = []
+    for index in range(count):
+        patterns.append((f"pattern_{index}", 1 if rng.random() < 0.2 else 0, shapes[index % len(shapes)](index)))
+    return patterns
+
+
+def make_lines(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        template = rng.choice(LINES)
+        lines.append(
+            template.replace("{time}", f"{rng.randrange(24):02}:{rng.randrange(60):02}:{rng.randrange(60):02}")
+            .replace("{uuid}", "069a79f4-44e9-4726-a5be-fca90e38aaf5")
+            .replace("{mod}", rng.choice(MODS))
+            .format(word=rng.choice(WORDS), num=rng.randrange(1000))
+        )
+    return lines
+
+
+def legacy_filter(db_server, contents: str, return_bool: bool) -> bool:
+    """The `console_filter` body before `AMP_Console_Filter`."""
+    regex = db_server.GetServerRegexPatterns()
+    if len(regex) == 0:
+        return return_bool
+    for pattern in regex:
+        if re.search(regex[pattern]["Pattern"], contents) != None:
+            return not return_bool
+    return return_bool
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gatekeeper console regex filter benchmark")
+    parser.add_argument("--patterns", type=int, default=50)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--whitelist", action="store_true", help="Whitelist filtering instead of Blacklist")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.chdir(tempfile.mkdtemp(prefix="gatekeeper_bench_"))
+
+    import AMP_Console_Filter
+    import DB
+
+    database = DB.getDBHandler().DB
+    db_server = database.AddServer(InstanceID="bench-filter", InstanceName="BenchFilter", FriendlyName="BenchFilter")
+    for name, pattern_type, pattern in make_patterns(args.patterns, args.seed):
+        database.AddRegexPattern(Name=name, Pattern=pattern, Type=pattern_type)
+        db_server.AddServerRegexPattern(Name=name)
+
+    lines = make_lines(args.lines, args.seed)
+    return_bool = args.whitelist
+
+    start = time.perf_counter()
+    legacy = [legacy_filter(db_server, line, return_bool) for line in lines]
+    legacy_time = time.perf_counter() - start
+
+    def run(regex_filter: AMP_Console_Filter.AMPRegexFilter) -> tuple[list[bool], float]:
+        decisions = []
+        start = time.perf_counter()
+        for line in lines:
+            pattern_type, _ = regex_filter.match(line)
+            decisions.append(return_bool if pattern_type == None else not return_bool)
+        return decisions, time.perf_counter() - start
+
+    # The same engine with the literal prefilter switched off; every pattern goes into the regex alternations.
+    required_literals = AMP_Console_Filter.required_literals
+    AMP_Console_Filter.required_literals = lambda pattern: None
+    alternation, alternation_time = run(AMP_Console_Filter.AMPRegexFilter(db_server.GetServerRegexPatterns()))
+    AMP_Console_Filter.required_literals = required_literals
+
+    regex = AMP_Console_Filter.getFilterCache().get(db_server)
+    compiled, compiled_time = run(regex)
+
+    prefiltered = sum(len(patterns) for patterns in regex.prefiltered.values())
+    passes = sum(len(passes) for passes in regex.passes.values())
+    matched = sum(1 for decision in compiled if decision != return_bool)
+    print(f"{args.patterns} patterns ({prefiltered} literal prefiltered, the rest in {passes} regex passes), {args.lines} lines, {matched} matched ({'Whitelist' if args.whitelist else 'Blacklist'})")
+    print(f"  legacy      {args.lines / legacy_time:>12,.0f} lines/s")
+    print(f"  alternation {args.lines / alternation_time:>12,.0f} lines/s  ({legacy_time / alternation_time:.1f}x)")
+    print(f"  prefilter   {args.lines / compiled_time:>12,.0f} lines/s  ({legacy_time / compiled_time:.1f}x)")
+    for label, decisions in (("alternation", alternation), ("prefilter", compiled)):
+        if legacy != decisions:
+            mismatches = sum(1 for a, b in zip(legacy, decisions) if a != b)
+            print(f"**ERROR** {mismatches} lines got a different {label} filter decision")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Console line chunking and Discord message packing (MB/sec). \n
+Compares the old `console_poll` splitting (`rindex(';')` and reslicing) and `bulkentry` concatenation with
+`AMP_Console.MessagePacker` on a generated crash dump: a Java stack trace, a mod list joined with `;`, a single
+`--long-line` without any `;` and a code block that spans messages. \n
+Then checks the packer; every message fits Discord, code fences are balanced and no text is lost or reordered.
+
+Usage: `python utils_dev/benchmarks/bench_console_packer.py --size 4 --long-line 200000`
+"""
+
+from __future__ import annotations
+
+import argparse
+import pathlib
+import random
+import re
+import sys
+import time
+
+REPO = pathlib.Path(__file__).parents[2]
+sys.path.insert(0, REPO.as_posix())
+
+from AMP_Console import CODE_FENCE, DISCORD_MESSAGE_LIMIT, MessagePacker  # noqa: E402
+
+
+def make_dump(size: int, long_line: int, seed: int) -> list[str]:
+    """About `size` MB of console lines."""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size * 1024 * 1024:
+        kind = rng.random()
+        if kind < 0.6:
+            line = f"\tat net.minecraft.server.level.ServerLevel.tick(ServerLevel.java:{rng.randrange(9999)}) ~[server-1.20.1.jar%23{rng.randrange(99)}!/:?]"
+        elif kind < 0.8:
+            line = ";".join(f"mod_{rng.randrange(10**6)}@{rng.randrange(10)}.{rng.randrange(10)}" for _ in range(rng.randrange(100, 2000)))
+        elif kind < 0.9:
+            line = " ".join(f"0x{rng.randrange(16**8):08x}" for _ in range(rng.randrange(100, 1500)))
+        elif kind < 0.95:
+            line = CODE_FENCE + "\n" + "\n".join(f"  {rng.randrange(10**9)}" for _ in range(rng.randrange(50, 600)))
+        else:
+            line = CODE_FENCE
+        lines.append(line)
+        total += len(line)
+
+    lines.append("A" * long_line)
+    return lines
+
+
+def legacy_pack(lines: list[str]) -> list[str]:
+    """The `console_poll` splitting and packing before `MessagePacker`."""
+    console_message_list = []
+    messages = []
+    for contents in lines:
+        if len(contents) > 1500:
+            index_hunt = contents.find(";")
+            if index_hunt == -1:
+                continue
+
+            msg_len_index = contents.rindex(";")
+
+            while msg_len_index > 1500:
+                msg_len_index_end = msg_len_index
+                msg_len_index = contents.rindex(";", 0, msg_len_index_end)
+
+                if msg_len_index < 1500:
+                    new_msg = contents[0:msg_len_index]
+                    console_message_list.append(new_msg.lstrip())
+                    contents = contents[msg_len_index + 1 : len(contents)]
+                    msg_len_index = len(contents)
+                    continue
+        else:
+            console_message_list.append(contents)
+
+    bulkentry = ""
+    for entry in console_message_list:
+        if len(bulkentry + entry) < 1500:
+            bulkentry = bulkentry + entry + "\n"
+        else:
+            messages.append(bulkentry[:-1])
+            bulkentry = entry + "\n"
+    if len(bulkentry):
+        messages.append(bulkentry[:-1])
+    return messages
+
+
+def check(lines: list[str], messages: list[str]) -> list[str]:
+    """What is wrong with `messages`; an empty list if nothing is."""
+    problems = []
+    for index, message in enumerate(messages):
+        if len(message) > DISCORD_MESSAGE_LIMIT:
+            problems.append(f"message {index} is {len(message)} characters")
+        if message.count(CODE_FENCE) % 2 and index != len(messages) - 1:
+            problems.append(f"message {index} leaves a code block open")
+
+    # Splitting only removes whitespace and the packer only adds fences and newlines.
+    expected = re.sub(r"\s+", "", "".join(lines).replace(CODE_FENCE, ""))
+    packed = re.sub(r"\s+", "", "".join(messages).replace(CODE_FENCE, ""))
+    if expected != packed:
+        problems.append(f"text differs; {len(expected)} characters in, {len(packed)} out")
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gatekeeper console message packing benchmark")
+    parser.add_argument("--size", type=int, default=4, help="MB of console lines")
+    parser.add_argument("--long-line", type=int, default=200000, help="characters in one line without a `;`")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    lines = make_dump(args.size, args.long_line, args.seed)
+    total = sum(len(line) for line in lines) / 1024 / 1024
+
+    start = time.perf_counter()
+    legacy = legacy_pack(lines)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    packer = MessagePacker()
+    for line in lines:
+        packer.add(line)
+    messages = packer.flush()
+    packed_time = time.perf_counter() - start
+
+    legacy_chars = sum(len(message) for message in legacy) / 1024 / 1024
+    print(f"{len(lines)} lines, {total:.1f} MB")
+    print(f"  legacy  {total / legacy_time:>8.1f} MB/s  {len(legacy):>6} messages  {legacy_chars:.1f} MB kept")
+    print(f"  packer  {total / packed_time:>8.1f} MB/s  {len(messages):>6} messages  ({legacy_time / packed_time:.1f}x)")
+
+    problems = check(lines, messages)
+    for problem in problems[:10]:
+        print(f"**ERROR** {problem}")
+    if len(problems):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
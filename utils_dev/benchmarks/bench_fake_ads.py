@@ -0,0 +1,353 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+End to end load test against `utils_dev.fake_amp`. \n
+Runs the real `AMPHandler` start up, the `AMPConsole` poll threads and the `AMP_Tasks` Discord relay.
+Discord is replaced by a client whose webhooks only record what they would have sent (after `--send-latency` seconds).
+With `--rate-limit` each fake webhook allows that many sends per 2 seconds, answers with the `X-RateLimit-*` headers and counts 429s. \n
+Reports start up cost, API calls per endpoint, threads, CPU, relayed lines and the console line to webhook latency.
+`--console threads` swaps the shared `AMPConsolePoller` for the old thread per Instance polling to compare the two.
+`--relay polling` swaps the event driven relay for the old once a second `tasks.loop` scan of every Instance.
+
+Runs in a temporary directory with its own `discordBot.db`; `modules` and `bot_perms.json` are linked from the repo.
+
+Usage: `python utils_dev/benchmarks/bench_fake_ads.py --instances 20 --line-rate 5 --duration 30`
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import pathlib
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import types
+from argparse import Namespace
+
+from haggis import logs
+
+REPO = pathlib.Path(__file__).parents[2]
+sys.path.insert(0, REPO.as_posix())
+logs.add_logging_level("DEV", 15)
+logs.add_logging_level("COMMAND", 19)
+
+from utils_dev.fake_amp import FAILURE_MODES, FakeAMPServer  # noqa: E402
+
+# Every fake console line ends with `@<unix time>` of when the Instance printed it.
+STAMP = re.compile(r"@(\d+\.\d+)")
+# Seconds of a fake webhook's rate limit bucket; Discord's webhook buckets are about 5 sends per 2 seconds.
+RATE_LIMIT_RESET = 2
+
+
+class FakeWebhook:
+    def __init__(self, channel: FakeChannel, name: str, webhook_id: int) -> None:
+        self.channel = channel
+        self.channel_id = channel.id
+        self.name = name
+        self.id = webhook_id
+        self._window_start: float = 0
+        self._window_sends: int = 0
+
+    async def send(self, content: str | None = None, embeds: list | None = None, **kwargs) -> None:
+        client = self.channel.client
+        await asyncio.sleep(client.send_latency)
+        if client.rate_limit:
+            import utils_webhooks
+
+            now = time.monotonic()
+            if now - self._window_start >= RATE_LIMIT_RESET:
+                self._window_start, self._window_sends = now, 0
+            self._window_sends += 1
+            reset_after = f"{RATE_LIMIT_RESET - (now - self._window_start):.3f}"
+            headers = {"X-RateLimit-Limit": str(client.rate_limit), "X-RateLimit-Remaining": str(max(0, client.rate_limit - self._window_sends)), "X-RateLimit-Reset-After": reset_after}
+            if self._window_sends > client.rate_limit:
+                headers["Retry-After"] = reset_after
+            # What the registry's aiohttp TraceConfig does with a real webhook's answer.
+            utils_webhooks.getWebhookRegistry().buckets[self.id].update(headers)
+            if "Retry-After" in headers:
+                # discord.py waits out a 429 and tries again.
+                client.rate_limited += 1
+                await asyncio.sleep(float(reset_after))
+                return await self.send(content, embeds, **kwargs)
+        client.record("\n".join([content or ""] + [embed.description or "" for embed in embeds or []]))
+
+    async def edit(self, channel: FakeChannel | None = None, **kwargs) -> None:
+        if channel != None:
+            self.channel = channel
+            self.channel_id = channel.id
+
+
+class FakeChannel:
+    def __init__(self, client: FakeDiscordClient, channel_id: int) -> None:
+        self.client = client
+        self.id = channel_id
+        self.name = f"channel-{channel_id}"
+        self._webhooks: list[FakeWebhook] = []
+
+    async def webhooks(self) -> list[FakeWebhook]:
+        self.client.webhook_lookups += 1
+        await asyncio.sleep(self.client.send_latency)
+        return list(self._webhooks)
+
+    async def create_webhook(self, name: str) -> FakeWebhook:
+        self.client.webhook_ids += 1
+        webhook = FakeWebhook(self, name, self.client.webhook_ids)
+        self._webhooks.append(webhook)
+        return webhook
+
+
+class FakeDiscordClient:
+    """Just enough of `discord.Client` for the `AMP_Tasks` relay."""
+
+    user = None
+
+    def __init__(self, send_latency: float, rate_limit: int = 0) -> None:
+        self.send_latency = send_latency
+        self.rate_limit = rate_limit
+        self.channels: dict[int, FakeChannel] = {}
+        self.webhook_ids: int = 0
+        self.rate_limited: int = 0
+
+        self.sends: int = 0
+        self.lines: int = 0
+        self.webhook_lookups: int = 0
+        self.latencies: list[float] = []
+        # Chat lines go to both the chat and the console channel; only the first delivery counts.
+        self._seen: set[str] = set()
+
+    def is_ready(self) -> bool:
+        return True
+
+    async def wait_until_ready(self) -> None:
+        return
+
+    def get_channel(self, channel_id: int) -> FakeChannel:
+        channel = self.channels.get(channel_id)
+        if channel == None:
+            channel = self.channels[channel_id] = FakeChannel(self, channel_id)
+        return channel
+
+    def get_user(self, user_id: int) -> None:
+        return None
+
+    def record(self, content: str) -> None:
+        now = time.time()
+        self.sends += 1
+        for stamp in STAMP.findall(content):
+            if stamp in self._seen:
+                continue
+            self._seen.add(stamp)
+            self.lines += 1
+            self.latencies.append(now - float(stamp))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not len(values):
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def print_calls(label: str, server: FakeAMPServer, elapsed: float) -> None:
+    print(f"\n{label}: {server.requests} requests ({server.requests / elapsed:.1f}/s), {server.connections} handshakes, {server.failures} injected failures")
+    for APICall, count in server.calls.most_common():
+        print(f"  {APICall:<38} {count:>8}")
+
+
+def use_workdir() -> pathlib.Path:
+    workdir = pathlib.Path(tempfile.mkdtemp(prefix="gatekeeper_bench_"))
+    for name in ("modules", "bot_perms.json"):
+        workdir.joinpath(name).symlink_to(REPO.joinpath(name))
+    os.chdir(workdir)
+    return workdir
+
+
+def use_tokens(server: FakeAMPServer) -> None:
+    """Stands in for `tokens.py`; `AMPHandler.val_settings` imports it by name."""
+    tokens = types.ModuleType("tokens")
+    tokens.token = ""
+    tokens.AMPurl = server.url
+    tokens.AMPUser = "gatekeeper"
+    tokens.AMPPassword = "fake"
+    tokens.AMPAuth = ""
+    sys.modules["tokens"] = tokens
+
+
+def legacy_console_threads(handler) -> None:
+    """The replaced design; one thread per Instance sleeping a second between blocking `Core/GetUpdates` calls."""
+    import AMP_Console
+
+    def console_parse_loop(console: AMP_Console.AMPConsole) -> None:
+        time.sleep(5)
+        while True:
+            time.sleep(1)
+            if console.poll_delay() > 0:
+                time.sleep(10)
+                continue
+            console.console_poll()
+
+    for amp_server in handler.AMP_Instances.values():
+        AMP_Console.getConsolePoller().unregister(amp_server.Console)
+        threading.Thread(target=console_parse_loop, args=[amp_server.Console], name=amp_server.FriendlyName, daemon=True).start()
+
+
+async def legacy_relay_loops(cog, client: FakeDiscordClient) -> None:
+    """The replaced design; every second scan every Instance's queues and drain whatever is there."""
+    import AMP_Console
+
+    AMP_Console.set_relay_listener(None)
+    while True:
+        await asyncio.sleep(1)
+        queues = [(amp_server, queue) for amp_server in cog.AMPInstances.values() for queue in (amp_server.Console.console_messages, amp_server.Console.console_chat_messages, amp_server.Console.console_event_messages)]
+        if cog.flush_window > 0 and any(len(queue) for _, queue in queues):
+            await asyncio.sleep(cog.flush_window)
+        for amp_server, queue in queues:
+            channel_attr, relay = cog._relay_roles[queue.name]
+            if getattr(amp_server, channel_attr) == None:
+                continue
+            while await relay(client.get_channel(getattr(amp_server, channel_attr)), amp_server, queue):
+                pass
+
+
+async def relay(client: FakeDiscordClient, duration: float, mode: str) -> None:
+    from cogs.AMP_tasks_cog import AMP_Tasks
+
+    cog = AMP_Tasks(client)
+    legacy = asyncio.create_task(legacy_relay_loops(cog, client)) if mode == "polling" else None
+    await asyncio.sleep(duration)
+    if legacy != None:
+        legacy.cancel()
+    await cog.cog_unload()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gatekeeper end to end benchmark against a fake ADS")
+    parser.add_argument("--instances", type=int, default=10)
+    parser.add_argument("--line-rate", type=float, default=2, help="console lines per second per Instance")
+    parser.add_argument("--chat-ratio", type=float, default=0.2)
+    parser.add_argument("--idle", type=float, default=0, help="fraction of Instances that print nothing (adaptive polling backs these off)")
+    parser.add_argument("--chat-channels", type=int, default=2, help="Instances share this many Discord chat channels")
+    parser.add_argument("--latency", type=float, default=0.005, help="seconds added to every AMP API answer")
+    parser.add_argument("--latency-jitter", type=float, default=0.005)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--failure-mode", choices=FAILURE_MODES, default="error")
+    parser.add_argument("--send-latency", type=float, default=0.05, help="seconds per fake Discord webhook call")
+    parser.add_argument("--rate-limit", type=int, default=0, help="sends per 2 seconds each fake webhook allows (0 for no limit)")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--console", choices=("poller", "threads"), default="poller", help="shared console poller or the old thread per Instance")
+    parser.add_argument("--relay", choices=("events", "polling"), default="events", help="event driven Discord relay or the old once a second loops")
+    parser.add_argument("--flush-window", type=int, default=None, help="Relay_Flush_Window in ms (the setting's default if not given)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEV if args.verbose else logging.WARNING, format="%(asctime)s [%(threadName)s] [%(levelname)s]  %(message)s")
+
+    server = FakeAMPServer(
+        instances=args.instances,
+        line_rate=args.line_rate,
+        chat_ratio=args.chat_ratio,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        seed=0,
+    ).start()
+    for index, instance in enumerate(server.instances.values()):
+        if index < int(len(server.instances) * args.idle):
+            instance.line_rate = 0
+    workdir = use_workdir()
+    use_tokens(server)
+
+    import AMP_Handler
+
+    # Start up; no failures injected so every Instance gets set up.
+    start = time.perf_counter()
+    handler = AMP_Handler.getAMPHandler(args=Namespace(token=True, dev=False, super=False))
+    handler.setup_AMPInstances()
+    startup = time.perf_counter() - start
+    print(f"Start up: {len(handler.AMP_Instances)} Instances in {startup:.2f}s ({workdir})")
+    print_calls("Start up API calls", server, startup)
+
+    for index, amp_server in enumerate(handler.AMP_Instances.values()):
+        amp_server.Discord_Console_Channel = 1000 + index
+        amp_server.Discord_Chat_Channel = 2000 + (index % max(1, args.chat_channels))
+
+    threading.Thread(target=AMP_Handler.amp_instance_refresher, name="AMP Refresher", daemon=True).start()
+    if args.console == "threads":
+        legacy_console_threads(handler)
+
+    if args.flush_window != None:
+        import DB
+
+        DB.getDBHandler().DBConfig.SetSetting("Relay_Flush_Window", str(args.flush_window))
+
+    server.failure_rate = args.failure_rate
+    server.failure_mode = args.failure_mode
+    server.reset_counters()
+    produced = sum(instance._lines for instance in server.instances.values())
+    client = FakeDiscordClient(send_latency=args.send_latency, rate_limit=args.rate_limit)
+
+    cpu = time.process_time()
+    start = time.perf_counter()
+    asyncio.run(relay(client, args.duration, args.relay))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+
+    produced = sum(instance._lines for instance in server.instances.values()) - produced
+    print_calls(f"Steady state API calls over {elapsed:.1f}s", server, elapsed)
+    if args.console == "poller":
+        import AMP_Console
+
+        poller = AMP_Console.getConsolePoller().stats()
+        print(f"\nConsole poller: {poller['polls']} polls, {poller['idle']}/{poller['polling']} consoles backed off, {poller['mean_interval']:.1f}s mean interval")
+    queues = [stats for amp_server in handler.AMP_Instances.values() for stats in amp_server.Console.queue_stats().values()]
+    print(f"Console queues: {sum(stats['depth'] for stats in queues)} queued, {max(stats['high_water'] for stats in queues)} highest, {sum(stats['dropped'] for stats in queues)} dropped")
+    print(f"\nThreads: {threading.active_count()}   CPU: {cpu / elapsed * 100:.1f}% of one core")
+    print(f"Lines: {produced} printed, {client.lines} relayed in {client.sends} webhook sends ({client.webhook_lookups} webhook lookups)")
+    import utils_webhooks
+
+    webhooks = utils_webhooks.getWebhookRegistry().stats()
+    print(f"Webhook registry: {webhooks['cached']} cached, {webhooks['hits']} hits, {webhooks['lookups']} lookups, {webhooks['created']} created")
+    print(f"Rate limits: {webhooks['exhausted']} buckets emptied, sends held back {webhooks['throttled_time']:.1f}s, {client.rate_limited} 429s")
+    for role, stats in utils_webhooks.getWebhookRegistry().relay_stats().items():
+        print(f"  {role:<8} {stats['messages']:>6} messages in {stats['sends']:>5} sends ({stats['per_send']:.1f}/send, {stats['sends'] / elapsed:.1f} sends/s)")
+    channels = utils_webhooks.getWebhookRegistry().channel_stats()
+    if len(channels):
+        waits = sorted(channels.items(), key=lambda item: item[1]["max_wait"], reverse=True)
+        print(f"Relay queue wait: {len(channels)} channels, worst mean {max(stats['mean_wait'] for stats in channels.values()):.3f}s")
+        for channel_id, stats in waits[:5]:
+            print(f"  {channel_id:<8} {stats['relays']:>6} relays  mean {stats['mean_wait']:.3f}s  max {stats['max_wait']:.3f}s")
+    if len(client.latencies):
+        print(
+            f"Line to webhook latency: p50 {percentile(client.latencies, 50):.3f}s  p95 {percentile(client.latencies, 95):.3f}s"
+            f"  p99 {percentile(client.latencies, 99):.3f}s  max {max(client.latencies):.3f}s  mean {statistics.fmean(client.latencies):.3f}s"
+        )
+
+    # The console threads are not daemons and loop forever.
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,454 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+A local stand-in for an AMP ADS controller and its Instances; used by `utils_dev/benchmarks`. \n
+Usage: `python utils_dev/fake_amp.py --port 8080 --instances 10 --line-rate 5 --latency 0.02 --failure-rate 0.01`
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+# Failure injection modes; `error` answers HTTP 500, `drop` closes the connection without answering, `empty` answers 200 with no body.
+FAILURE_MODES = ("error", "drop", "empty")
+
+SUPER_ADMINS = "00000000-0000-0000-0000-000000000001"
+FAKE_USER_ID = "00000000-0000-0000-0000-0000000000aa"
+
+
+class FakeAMPInstance:
+    """One simulated AMP Instance; produces `line_rate` console lines a second, `chat_ratio` of them as player chat."""
+
+    def __init__(
+        self,
+        index: int,
+        line_rate: float = 1,
+        chat_ratio: float = 0.2,
+        module: str = "Generic",
+        display_image_source: str = "Generic",
+    ) -> None:
+        self.InstanceID: str = str(uuid.UUID(int=index + 1))
+        self.InstanceName: str = f"FakeInstance{index:02d}"
+        self.FriendlyName: str = f"Fake Instance {index:02d}"
+        self.Module: str = module
+        self.DisplayImageSource: str = display_image_source
+        self.Port: int = 8081 + index
+
+        self.line_rate: float = line_rate
+        self.chat_ratio: float = chat_ratio
+        # `None` uses the servers `failure_rate`; set to 1 to simulate a dead Instance.
+        self.failure_rate: float | None = None
+
+        self.Running: bool = True
+        self.AppState: int = 20
+        self.users: list[str] = [f"Player{index:02d}_{num}" for num in range(3)]
+        self.files: dict[str, bytes] = {"whitelist.json": json.dumps([{"uuid": str(uuid.UUID(int=index + 1)), "name": self.users[0]}]).encode()}
+        self.roles: dict[str, str] = {SUPER_ADMINS: "Super Admins"}
+        self.role_permissions: dict[str, set[str]] = {SUPER_ADMINS: set()}
+        self.user_roles: set[str] = {SUPER_ADMINS}
+
+        self._lines: int = 0
+        self._last_poll: float = time.time()
+        self._pending: list[dict] = []
+        self._lock = threading.Lock()
+
+    def info(self) -> dict:
+        """This Instance as it appears in `ADSModule/GetInstances`."""
+        return {
+            "InstanceID": self.InstanceID,
+            "TargetID": "00000000-0000-0000-0000-000000000000",
+            "InstanceName": self.InstanceName,
+            "FriendlyName": self.FriendlyName,
+            "Description": "",
+            "Module": self.Module,
+            "AMPVersion": "2.4.6.6",
+            "IsHTTPS": False,
+            "IP": "127.0.0.1",
+            "Port": self.Port,
+            "Daemon": False,
+            "DaemonAutostart": True,
+            "ExcludeFromFirewall": False,
+            "Running": self.Running,
+            "AppState": self.AppState if self.Running else 0,
+            "Tags": [],
+            "DiskUsageMB": 0,
+            "ReleaseStream": 10,
+            "ManagementMode": 10,
+            "Suspended": False,
+            "IsContainerInstance": False,
+            "ContainerMemoryMB": 0,
+            "ContainerMemoryPolicy": 0,
+            "ContainerCPUs": 0.0,
+            "DisplayImageSource": self.DisplayImageSource,
+            "ApplicationEndpoints": [{"DisplayName": "Application Address", "Endpoint": f"127.0.0.1:{self.Port + 1000}", "Uri": ""}],
+            "Metrics": self.metrics(),
+        }
+
+    def metrics(self) -> dict:
+        return {
+            "Active Users": {"RawValue": len(self.users) if self.AppState else 0, "MaxValue": 20},
+            "CPU Usage": {"RawValue": 5, "MaxValue": 100},
+            "Memory Usage": {"RawValue": 1024, "MaxValue": 4096},
+        }
+
+    def status(self) -> dict:
+        return {"State": self.AppState if self.Running else 0, "Uptime": "00:01:00", "Metrics": self.metrics()}
+
+    def add_entry(self, contents: str, source: str = "Server thread/INFO", type: str = "Console", stamp: float | None = None) -> None:
+        stamp = time.time() if stamp == None else stamp
+        with self._lock:
+            self._pending.append({"Timestamp": f"/Date({int(stamp * 1000)})/", "Source": source, "Type": type, "Contents": contents})
+
+    def updates(self) -> dict:
+        """`Core/GetUpdates`; every line due since the last poll. \n
+        Each line ends with `@<unix time>` of when it was "printed" so benchmarks can measure end to end latency."""
+        now = time.time()
+        with self._lock:
+            if self.Running and self.AppState and self.line_rate > 0:
+                due = int((now - self._last_poll) * self.line_rate)
+                for num in range(due):
+                    stamp = self._last_poll + (num + 1) / self.line_rate
+                    self._lines += 1
+                    if random.random() < self.chat_ratio:
+                        entry = {"Source": random.choice(self.users), "Type": "Chat", "Contents": f"chat message {self._lines} @{stamp:.6f}"}
+                    else:
+                        entry = {"Source": "Server thread/INFO", "Type": "Console", "Contents": f"[Server thread/INFO]: console line {self._lines} @{stamp:.6f}"}
+                    entry["Timestamp"] = f"/Date({int(stamp * 1000)})/"
+                    self._pending.append(entry)
+                if due:
+                    self._last_poll += due / self.line_rate
+            else:
+                self._last_poll = now
+
+            entries, self._pending = self._pending, []
+
+        return {"ConsoleEntries": entries, "Status": self.status(), "Messages": [], "Tasks": [], "Ports": []}
+
+
+class FakeAMPRequestHandler(BaseHTTPRequestHandler):
+    """Answers AMP API POST requests with canned JSON. \n
+    HTTP/1.1 so clients can keep the connection alive between requests."""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this keep-alive connections stall on delayed ACKs.
+    disable_nagle_algorithm = True
+    server: FakeAMPServer
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.count_connection()
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        try:
+            parameters = json.loads(body) if body else {}
+        except ValueError:
+            parameters = {}
+
+        # `/API/Core/Login` or `/API/ADSModule/Servers/<InstanceID>/API/Core/GetStatus`
+        parts = self.path.split("/API/")
+        APICall = "/".join(parts[-1].split("/")[-2:])
+        instance_id = parts[-2].split("/")[-1] if len(parts) > 2 else None
+
+        self.server.simulate_latency()
+        failure = self.server.injected_failure(instance_id)
+        if failure == "drop":
+            self.close_connection = True
+            return
+
+        if failure == "error":
+            payload = json.dumps({"Title": "Internal Server Error", "Message": "Injected failure"}).encode()
+            status = 500
+        elif failure == "empty":
+            payload = b""
+            status = 200
+        else:
+            payload = json.dumps(self.server.handle_call(APICall, parameters, instance_id)).encode()
+            status = 200
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeAMPServer(ThreadingHTTPServer):
+    """A local stand-in for the AMP/ADS API with `instances` simulated Instances. \n
+    Counts accepted connections (handshakes) and requests per API call so benchmarks can compare client behaviour. \n
+    `latency` (+ up to `latency_jitter`) seconds is added to every answer; `failure_rate` of requests fail with `failure_mode`."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        instances: int = 1,
+        line_rate: float = 1,
+        chat_ratio: float = 0.2,
+        latency: float = 0,
+        latency_jitter: float = 0,
+        failure_rate: float = 0,
+        failure_mode: str = "error",
+        seed: int | None = None,
+    ) -> None:
+        super().__init__((host, port), FakeAMPRequestHandler)
+        if failure_mode not in FAILURE_MODES:
+            raise ValueError(f"failure_mode must be one of {FAILURE_MODES}")
+
+        self.connections: int = 0
+        self.requests: int = 0
+        self.calls: Counter[str] = Counter()
+        self.failures: int = 0
+        self._count_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+        self.latency: float = latency
+        self.latency_jitter: float = latency_jitter
+        self.failure_rate: float = failure_rate
+        self.failure_mode: str = failure_mode
+        self._random = random.Random(seed)
+
+        # The ADS controller itself; Core/* calls without an InstanceID land here.
+        self.controller = FakeAMPInstance(-1, line_rate=0)
+        self.controller.InstanceName = self.controller.FriendlyName = "ADS01"
+        self.controller.Module = "ADS"
+        self.controller.DisplayImageSource = "internal:AMPADS"
+        self.instances: dict[str, FakeAMPInstance] = {}
+        for index in range(instances):
+            self.add_instance(line_rate=line_rate, chat_ratio=chat_ratio)
+
+        # Sessions handed out by Core/Login; `expire_sessions()` makes every call after it "Unauthorized Access".
+        self.sessions: set[str] = set()
+        self.check_sessions: bool = False
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_instance(self, **kwargs) -> FakeAMPInstance:
+        instance = FakeAMPInstance(len(self.instances), **kwargs)
+        self.instances[instance.InstanceID] = instance
+        return instance
+
+    def _instance(self, instance_id: str | None) -> FakeAMPInstance:
+        if instance_id == None:
+            return self.controller
+        # Unknown InstanceIDs (eg. from the older benchmarks) get a quiet Instance of their own.
+        instance = self.instances.get(instance_id)
+        if instance == None:
+            instance = self.instances[instance_id] = FakeAMPInstance(len(self.instances), line_rate=0)
+            instance.InstanceID = instance_id
+        return instance
+
+    def count_connection(self) -> None:
+        with self._count_lock:
+            self.connections += 1
+
+    def reset_counters(self) -> None:
+        with self._count_lock:
+            self.connections = 0
+            self.requests = 0
+            self.failures = 0
+            self.calls.clear()
+
+    def simulate_latency(self) -> None:
+        delay = self.latency + (self._random.uniform(0, self.latency_jitter) if self.latency_jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def injected_failure(self, instance_id: str | None) -> str | None:
+        """Returns the failure mode to answer with, or `None` to answer normally."""
+        rate = self.failure_rate
+        if instance_id != None and instance_id in self.instances and self.instances[instance_id].failure_rate != None:
+            rate = self.instances[instance_id].failure_rate
+
+        if rate > 0 and self._random.random() < rate:
+            with self._count_lock:
+                self.failures += 1
+            return self.failure_mode
+        return None
+
+    def handle_call(self, APICall: str, parameters: dict, instance_id: str | None = None) -> Any:
+        with self._count_lock:
+            self.requests += 1
+            self.calls[APICall] += 1
+
+        if APICall == "Core/Login":
+            session_id = f"fake-session-{uuid.uuid4().hex[:8]}"
+            self.sessions.add(session_id)
+            return {"success": True, "result": 0, "sessionID": session_id, "permissions": [], "userInfo": {"ID": FAKE_USER_ID}}
+
+        if self.check_sessions and parameters.get("SESSIONID") not in self.sessions:
+            return {"Title": "Unauthorized Access", "Message": "Session invalid or expired"}
+
+        instance = self._instance(instance_id)
+
+        # Instance state
+        if APICall == "Core/GetStatus":
+            return instance.status()
+
+        if APICall == "Core/GetUserList":
+            return {"result": {str(uuid.UUID(int=num)): user for num, user in enumerate(instance.users)} if instance.AppState else {}}
+
+        if APICall == "Core/GetUpdates":
+            return instance.updates()
+
+        if APICall == "Core/SendConsoleMessage":
+            instance.add_entry(f"[Server thread/INFO]: > {parameters.get('message', '')}", source="Console")
+            return {"result": True}
+
+        if APICall in ("Core/Start", "Core/Restart"):
+            instance.AppState = 20
+            return {"result": {"Status": True}}
+
+        if APICall in ("Core/Stop", "Core/Kill"):
+            instance.AppState = 0
+            return {"result": {"Status": True}}
+
+        if APICall == "ADSModule/GetInstances":
+            available = [self.controller.info()] + [server.info() for server in self.instances.values()]
+            return {"result": [{"Id": "00000000-0000-0000-0000-000000000000", "FriendlyName": "ADS01", "AvailableInstances": available}]}
+
+        if APICall == "ADSModule/GetInstanceStatuses":
+            return {"result": [{"InstanceID": server.InstanceID, "Running": server.Running} for server in self.instances.values()]}
+
+        # FileManagerPlugin; Data is base64 like the real API.
+        if APICall == "FileManagerPlugin/GetDirectoryListing":
+            return {"result": [{"Filename": name, "IsDirectory": False, "SizeBytes": len(data)} for name, data in instance.files.items()]}
+
+        if APICall == "FileManagerPlugin/GetFileChunk":
+            data = instance.files.get(parameters.get("Filename"), b"")
+            position = int(parameters.get("Position", 0))
+            chunk = data[position : position + int(parameters.get("Length", len(data)))]
+            return {"result": {"Base64Data": base64.b64encode(chunk).decode(), "BytesLength": len(chunk)}}
+
+        if APICall == "FileManagerPlugin/WriteFileChunk":
+            name = parameters.get("Filename")
+            position = int(parameters.get("Position", 0))
+            data = instance.files.get(name, b"")
+            chunk = base64.b64decode(parameters.get("Data", ""))
+            instance.files[name] = data[:position] + chunk + data[position + len(chunk) :]
+            return {"result": {"Status": True}}
+
+        if APICall in ("FileManagerPlugin/TrashFile", "FileManagerPlugin/TrashDirectory"):
+            instance.files.pop(parameters.get("Filename", parameters.get("DirectoryName")), None)
+            return {"result": {"Status": True}}
+
+        # Roles and permissions; the fake user starts out as a `Super Admins` member on every Instance.
+        if APICall == "Core/CurrentSessionHasPermission":
+            return {"result": True}
+
+        if APICall == "Core/GetAMPUserInfo":
+            return {"result": {"ID": FAKE_USER_ID, "Username": parameters.get("Username"), "Roles": sorted(instance.user_roles)}}
+
+        if APICall == "Core/GetRoleIds":
+            return {"result": dict(instance.roles)}
+
+        if APICall == "Core/CreateRole":
+            role_id = str(uuid.uuid4())
+            instance.roles[role_id] = parameters.get("Name", "")
+            instance.role_permissions[role_id] = set()
+            return {"result": {"Status": True, "Result": role_id}}
+
+        if APICall == "Core/GetRole":
+            role_id = parameters.get("RoleId")
+            return {"result": {"ID": role_id, "Name": instance.roles.get(role_id), "Permissions": sorted(instance.role_permissions.get(role_id, set()))}}
+
+        if APICall == "Core/GetAMPRolePermissions":
+            return {"result": sorted(instance.role_permissions.get(parameters.get("RoleId"), set()))}
+
+        if APICall == "Core/SetAMPRolePermission":
+            permissions = instance.role_permissions.setdefault(parameters.get("RoleId"), set())
+            if parameters.get("Enabled"):
+                permissions.add(parameters.get("PermissionNode"))
+            else:
+                permissions.discard(parameters.get("PermissionNode"))
+            return {"result": {"Status": True}}
+
+        if APICall == "Core/SetAMPUserRoleMembership":
+            if parameters.get("IsMember"):
+                instance.user_roles.add(parameters.get("RoleId"))
+            else:
+                instance.user_roles.discard(parameters.get("RoleId"))
+            return {"result": {"Status": True}}
+
+        if APICall == "Core/GetPermissionsSpec":
+            return {"result": []}
+
+        return {"result": True}
+
+    def expire_sessions(self) -> None:
+        self.check_sessions = True
+        self.sessions.clear()
+
+    def start(self) -> FakeAMPServer:
+        """Serves on a daemon thread; returns `self` for chaining."""
+        self._thread = threading.Thread(target=self.serve_forever, name="Fake AMP", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake AMP/ADS server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--instances", type=int, default=1)
+    parser.add_argument("--line-rate", type=float, default=1, help="console lines per second per Instance")
+    parser.add_argument("--chat-ratio", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--latency-jitter", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--failure-mode", choices=FAILURE_MODES, default="error")
+    args = parser.parse_args()
+
+    server = FakeAMPServer(
+        port=args.port,
+        instances=args.instances,
+        line_rate=args.line_rate,
+        chat_ratio=args.chat_ratio,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        failure_rate=args.failure_rate,
+        failure_mode=args.failure_mode,
+    )
+    print(f"Fake AMP listening on {server.url} with {len(server.instances)} Instances")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
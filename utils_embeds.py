@@ -78,6 +78,7 @@ class botEmbeds():
 
         embed.add_field(name='Filtered Console:', value=str(bool(db_server.Console_Filtered)), inline=False)
         embed.add_field(name='Console Filter Type:', value=bool(db_server.Console_Filtered_Type), inline=True)
+        embed.add_field(name='Console Priority:', value=('Low', 'Normal', 'High')[db_server.Console_Priority], inline=True)
         if db_server.Discord_Console_Channel != None:
             discord_channel = context.guild.get_channel(db_server.Discord_Console_Channel)
             embed.add_field(name='Console Channel:', value=discord_channel.name, inline=False)
@@ -96,7 +97,8 @@ class botEmbeds():
             embed.add_field(name='Event Channel:', value=discord_channel.name, inline=True)
         else:
             embed.add_field(name='Event Channel:', value=db_server.Discord_Event_Channel, inline=True)
-        embed.set_footer(text=f'InstanceID: {server.InstanceID}')
+        snapshot_age = server.snapshotAge()
+        embed.set_footer(text=f'InstanceID: {server.InstanceID}' + (f' // Updated {int(snapshot_age)}s ago' if snapshot_age != None else ''))
         return embed
 
     async def server_display_embed(self, server_list: list[DB.DBServer], banner_name: str, guild: discord.Guild = None, ) -> list[discord.Embed]:
@@ -119,15 +121,19 @@ class botEmbeds():
             dedicated_status = 'Offline'
             Users = None
             User_list = None
-            # This is for the Instance
-            if server.Running:
+            # This is for the Instance; skip the API calls while its circuit breaker is open.
+            if server.Breaker.is_open:
+                instance_status = '\U000026a0 Unreachable'
+
+            elif server.Running:
                 instance_status = 'Online'
                 # ADS AKA Application status
-                if server._ADScheck() and server.ADS_Running:
+                if await server.Async._ADScheck() and server.ADS_Running:
                     dedicated_status = 'Online'
-                    Users = server.getUsersOnline()
-                    if len(server.getUserList()) >= 1:
-                        User_list = (', ').join(server.getUserList())
+                    Users = await server.Async.getUsersOnline()
+                    user_list = await server.Async.getUserList()
+                    if len(user_list) >= 1:
+                        User_list = (', ').join(user_list)
 
             embed_color = 0x71368a
             if guild != None and db_server.Discord_Role != None:
@@ -207,7 +213,8 @@ class botEmbeds():
             #!UPTIME is disabled until AMP Impliments the feature.
             #embed.add_field(name='Uptime', value=Uptime, inline=True)
             embed.add_field(name='Players Online', value=Users_Online, inline=True)
-        embed.set_footer(text=f'InstanceID: {server.InstanceID}')
+        snapshot_age = server.snapshotAge()
+        embed.set_footer(text=f'InstanceID: {server.InstanceID}' + (f' // Updated {int(snapshot_age)}s ago' if snapshot_age != None else ''))
         return embed
 
     # Depreciated; no longer in use.
@@ -223,8 +230,9 @@ class botEmbeds():
                     embed_color = db_server_role.color
 
             User_list = None
-            if len(server.getUserList()) > 1:
-                User_list = (', ').join(server.getUserList())
+            user_list = await server.Async.getUserList()
+            if len(user_list) > 1:
+                User_list = (', ').join(user_list)
 
             server_name = server.FriendlyName
             if server.DisplayName != None:
@@ -17,7 +17,8 @@ import utils
 
 
 class ServerButton(Button):
-    """Custom Start Button for when Servers are Offline."""
+    """Custom Start Button for when Servers are Offline. \n
+    `function` is awaited after the interaction is answered, eg. `AMPInstance.Async.StartInstance`."""
 
     def __init__(self, server: AMP_Handler.AMP.AMPInstance, view: discord.ui.View, function, label: str, callback_label: str, callback_disabled: bool, style=discord.ButtonStyle.green, context=None):
         super().__init__(label=label, style=style, custom_id=label)
@@ -41,8 +42,9 @@ class ServerButton(Button):
         self._interaction = interaction
         self.label = self.callback_label
         self.disabled = self.callback_disabled
-        self._function()
+        # Answer the interaction first; AMP can take longer than Discord's three seconds.
         await interaction.response.edit_message(view=self._view)
+        await self._function()
         await asyncio.sleep(30)
         await self.reset()
 
@@ -224,7 +226,7 @@ class Banner_Modal(Modal):
         # Regardless we defer the interaction; because we only care if it fails as seen above.
         await interaction.response.defer()
         # Then we send the updated Banner object to the View.
-        await self._banner_message.edit(attachments=[banner_file_handler(BC.Banner_Generator(self._amp_server, self._edited_db_banner)._image_())], view=self._banner_view)
+        await self._banner_message.edit(attachments=[banner_file_handler(await asyncio.to_thread(BC.render_banner, self._amp_server, self._edited_db_banner))], view=self._banner_view)
 
 
 class Banner_Color_Input(TextInput):
@@ -283,7 +285,7 @@ class Save_Banner_Button(Button):
         """This is called when a button is interacted with."""
         saved_banner = self._edited_db_banner.save_db()
         await interaction.response.defer()
-        file = banner_file_handler(BC.Banner_Generator(self._amp_server, saved_banner)._image_())
+        file = banner_file_handler(await asyncio.to_thread(BC.render_banner, self._amp_server, saved_banner))
         await self._banner_message.edit(content='**Banner Settings have been saved.**', attachments=[file], view=None)
 
 
@@ -301,7 +303,7 @@ class Reset_Banner_Button(Button):
         """This is called when a button is interacted with."""
         saved_banner = self._edited_db_banner.reset_db()
         await interaction.response.defer()
-        file = banner_file_handler(BC.Banner_Generator(self._amp_server, saved_banner)._image_())
+        file = banner_file_handler(await asyncio.to_thread(BC.render_banner, self._amp_server, saved_banner))
         await self._banner_message.edit(content='**Banner Settings have been reset.**', attachments=[file])
 
 
@@ -0,0 +1,290 @@
+"""
+Copyright (C) 2021-2022 Katelynn Cadwallader.
+
+This file is part of Gatekeeper, the AMP Minecraft Discord Bot.
+
+Gatekeeper is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 3, or (at your option)
+any later version.
+
+Gatekeeper is distributed in the hope that it will be useful, but WITHOUT
+ANY WARRANTY; without even the implied warranty of MERCHANTABILITY
+or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public
+License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Gatekeeper; see the file COPYING.  If not, write to the Free
+Software Foundation, 51 Franklin Street - Fifth Floor, Boston, MA
+02110-1301, USA.
+
+Discord webhook registry for the console, event and chat relays. \n
+Each Server relays through one webhook per role (`Console`, `Events`, `Chat`) named `<FriendlyName> <role>`.
+`WebhookRegistry.get()` resolves (or creates) it with a single `channel.webhooks()` call and keeps it until the channel's
+webhooks change (`on_webhooks_update`) or Discord answers 404 for it. \n
+Webhooks are sent to through our own aiohttp session; its `TraceConfig` feeds the `X-RateLimit-*` headers of every answer into a
+`WebhookBucket` per webhook. discord.py already sleeps out a bucket that a send emptied before that send returns; the bucket
+counts that and holds back the next send when a 429's `Retry-After` outlasts it. At most `Relay_Max_Sends` sends are in flight at once. `WebhookRegistry.send()` also counts how many queued messages each send carried and the relay records how
+long work waited per channel, for `/bot utils status` and `/bot utils console_queues`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Mapping
+
+import aiohttp
+import discord
+
+import DB
+
+if TYPE_CHECKING:
+    from AMP import AMPInstance
+
+ROLE_CONSOLE = "Console"
+ROLE_EVENTS = "Events"
+ROLE_CHAT = "Chat"
+
+# Discord's limits for one webhook send; at most 10 embeds and 6000 characters across all of them.
+EMBEDS_PER_MESSAGE = 10
+EMBED_TOTAL_LIMIT = 6000
+EMBED_DESCRIPTION_LIMIT = 4096
+
+# Send rates are averaged over this many seconds.
+RATE_WINDOW = 60
+
+# `https://discord.com/api/v10/webhooks/<id>/<token>`
+WEBHOOK_URL = re.compile(r"/webhooks/(\d+)/")
+
+Registry = None
+
+
+class WebhookBucket:
+    """Discord's rate limit of one webhook, following the `X-RateLimit-*` headers of its last answer."""
+
+    def __init__(self) -> None:
+        # Unknown until the first answer; until then sends are not held back.
+        self.limit: int | None = None
+        self.remaining: int | None = None
+        self.reset_at: float = 0
+
+        # Answers that emptied the bucket, and seconds `acquire()` held sends back.
+        self.exhausted: int = 0
+        self.throttled: float = 0
+
+    async def acquire(self) -> None:
+        """Takes a token; waits for the bucket to reset if it is empty."""
+        while True:
+            now = time.monotonic()
+            if self.remaining != None and now >= self.reset_at:
+                self.remaining = self.limit
+            if self.remaining == None or self.remaining > 0:
+                break
+            self.throttled += self.reset_at - now
+            await asyncio.sleep(self.reset_at - now)
+
+        if self.remaining != None:
+            self.remaining -= 1
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        try:
+            if "X-RateLimit-Limit" in headers:
+                self.limit = int(headers["X-RateLimit-Limit"])
+            if "X-RateLimit-Remaining" in headers:
+                self.remaining = int(headers["X-RateLimit-Remaining"])
+            reset_after = float(headers.get("X-RateLimit-Reset-After", 0))
+            # A 429 says how long to back off; it can be longer than the bucket (eg. a shared or global limit).
+            reset_after = max(reset_after, float(headers.get("Retry-After", 0)))
+        except ValueError:
+            return
+        if reset_after > 0:
+            self.reset_at = time.monotonic() + reset_after
+            if "Retry-After" in headers:
+                self.remaining = 0
+        if self.remaining == 0:
+            self.exhausted += 1
+
+
+class WebhookRegistry:
+    """Webhooks keyed by `(channel_id, role, InstanceID)`; shared by the Console, Event and Chat relays."""
+
+    def __init__(self, max_sends: int = 8) -> None:
+        self.logger = logging.getLogger()
+        self.max_sends: int = max(1, max_sends)
+        self._concurrency = asyncio.Semaphore(self.max_sends)
+        self._http: aiohttp.ClientSession | None = None
+        # Webhook ID -> its rate limit bucket
+        self.buckets: dict[int, WebhookBucket] = {}
+        # (channel_id, role, InstanceID) -> (webhook name, webhook)
+        self._webhooks: dict[tuple[int, str, str], tuple[str, discord.Webhook]] = {}
+        # One lock per channel so two relays missing on the same channel only fetch its webhooks once.
+        self._locks: dict[int, asyncio.Lock] = {}
+
+        self.hits: int = 0
+        self.lookups: int = 0
+        self.created: int = 0
+        self.invalidated: int = 0
+        # role -> [queued messages relayed, webhook sends]
+        self.relayed: dict[str, list[int]] = {}
+        # (time.monotonic(), role) of every send in the last `RATE_WINDOW` seconds.
+        self._sends: deque[tuple[float, str]] = deque()
+        # channel_id -> [relays, total seconds waited, max seconds waited, work queued]; see `record_wait()`.
+        self.waits: dict[int, list[float]] = {}
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self._http == None or self._http.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_end.append(self._on_request_end)
+            self._http = aiohttp.ClientSession(trace_configs=[trace])
+        return self._http
+
+    async def _on_request_end(self, session: aiohttp.ClientSession, context: Any, params: aiohttp.TraceRequestEndParams) -> None:
+        match = WEBHOOK_URL.search(params.url.path)
+        if match == None:
+            return
+        bucket = self.buckets.get(int(match.group(1)))
+        if bucket != None:
+            bucket.update(params.response.headers)
+
+    async def close(self) -> None:
+        if self._http != None:
+            await self._http.close()
+            self._http = None
+
+    async def get(self, channel: discord.TextChannel, role: str, amp_server: AMPInstance) -> discord.Webhook:
+        """Returns the `role` webhook of `amp_server` in `channel`; looks it up, moves or creates it on a miss."""
+        key = (channel.id, role, amp_server.InstanceID)
+        name = f"{amp_server.FriendlyName} {role}"
+        cached = self._webhooks.get(key)
+        # A renamed Server gets a new webhook name; look it up again.
+        if cached != None and cached[0] == name:
+            self.hits += 1
+            return cached[1]
+
+        lock = self._locks.get(channel.id)
+        if lock == None:
+            lock = self._locks[channel.id] = asyncio.Lock()
+
+        async with lock:
+            cached = self._webhooks.get(key)
+            if cached != None and cached[0] == name:
+                self.hits += 1
+                return cached[1]
+
+            self.lookups += 1
+            webhook = None
+            for entry in await channel.webhooks():
+                if entry.name != name:
+                    continue
+                self.logger.debug(f'*AMP {role} Message* found an old webhook, reusing it {amp_server.FriendlyName}')
+                if entry.channel_id != channel.id:
+                    await entry.edit(channel=channel)
+                    self.logger.dev(f'**Editing {role} Webhook for {amp_server.FriendlyName} ID: {entry.id} Channel: {entry.channel_id}')
+                webhook = entry
+                break
+
+            if webhook == None:
+                self.logger.dev(f'*AMP {role} Message* creating a new webhook for {amp_server.FriendlyName}')
+                webhook = await channel.create_webhook(name=name)
+                self.created += 1
+
+            # Send through our session so its rate limit headers reach the bucket; webhooks without a token can only be used by the bot.
+            if getattr(webhook, "token", None) != None:
+                webhook = discord.Webhook.partial(webhook.id, webhook.token, session=self._session())
+            if webhook.id not in self.buckets:
+                self.buckets[webhook.id] = WebhookBucket()
+            self._webhooks[key] = (name, webhook)
+            return webhook
+
+    def invalidate(self, channel_id: int, role: str | None = None, InstanceID: str | None = None) -> None:
+        """Forgets the cached webhooks of `channel_id`; only the ones matching `role` and `InstanceID` when given."""
+        for key in list(self._webhooks):
+            if key[0] != channel_id:
+                continue
+            if role != None and key[1] != role:
+                continue
+            if InstanceID != None and key[2] != InstanceID:
+                continue
+            del self._webhooks[key]
+            self.invalidated += 1
+
+    async def send(self, channel: discord.TextChannel, role: str, amp_server: AMPInstance, *args: Any, messages: int = 1, **kwargs: Any) -> discord.Webhook:
+        """`webhook.send(*args, **kwargs)` through the `role` webhook; a deleted webhook (404) is resolved again and the send retried once. \n
+        `messages` is how many queued messages were batched into this send."""
+        webhook = await self.get(channel, role, amp_server)
+        try:
+            await self._send(webhook, *args, **kwargs)
+        except discord.NotFound:
+            self.logger.warning(f'**ATTENTION** The {role} Webhook for {amp_server.FriendlyName} is gone, creating a new one.')
+            self.invalidate(channel.id, role, amp_server.InstanceID)
+            webhook = await self.get(channel, role, amp_server)
+            await self._send(webhook, *args, **kwargs)
+
+        relayed = self.relayed.get(role)
+        if relayed == None:
+            relayed = self.relayed[role] = [0, 0]
+        relayed[0] += messages
+        relayed[1] += 1
+        self._sends.append((time.monotonic(), role))
+        return webhook
+
+    async def _send(self, webhook: discord.Webhook, *args: Any, **kwargs: Any) -> None:
+        # Wait for the webhooks own bucket before taking one of the `max_sends` slots, so a throttled webhook doesn't hold one.
+        await self.buckets[webhook.id].acquire()
+        async with self._concurrency:
+            await webhook.send(*args, **kwargs)
+
+    def record_wait(self, channel_id: int, seconds: float, queued: int) -> None:
+        """`seconds` a Server's queued messages waited for a relay worker of `channel_id`; `queued` is the work still waiting behind them."""
+        waits = self.waits.get(channel_id)
+        if waits == None:
+            waits = self.waits[channel_id] = [0, 0, 0, 0]
+        waits[0] += 1
+        waits[1] += seconds
+        waits[2] = max(waits[2], seconds)
+        waits[3] = queued
+
+    def channel_stats(self) -> dict[int, dict[str, float]]:
+        """Per Discord channel; relays, mean and max queue wait in seconds and the work queued at the last relay."""
+        return {channel_id: {"relays": count, "mean_wait": total / count, "max_wait": longest, "queued": queued} for channel_id, (count, total, longest, queued) in self.waits.items()}
+
+    def relay_stats(self) -> dict[str, dict[str, float]]:
+        """Per role; relayed messages, sends, messages per send and sends per minute over the last `RATE_WINDOW` seconds."""
+        cutoff = time.monotonic() - RATE_WINDOW
+        while len(self._sends) and self._sends[0][0] < cutoff:
+            self._sends.popleft()
+
+        stats = {}
+        for role, (messages, sends) in self.relayed.items():
+            recent = sum(1 for _, entry in self._sends if entry == role)
+            stats[role] = {
+                "messages": messages,
+                "sends": sends,
+                "per_send": messages / sends if sends else 0,
+                "per_minute": recent * 60 / RATE_WINDOW,
+            }
+        return stats
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "cached": len(self._webhooks),
+            "hits": self.hits,
+            "lookups": self.lookups,
+            "created": self.created,
+            "invalidated": self.invalidated,
+            "exhausted": sum(bucket.exhausted for bucket in self.buckets.values()),
+            "throttled_time": sum(bucket.throttled for bucket in self.buckets.values()),
+        }
+
+
+def getWebhookRegistry() -> WebhookRegistry:
+    """Returns the Global WebhookRegistry; otherwise creates it using the `Relay_Max_Sends` setting."""
+    global Registry
+    if Registry == None:
+        max_sends = DB.getDBHandler().DBConfig.GetSetting("Relay_Max_Sends")
+        Registry = WebhookRegistry(max_sends=int(max_sends) if max_sends != None else 8)
+    return Registry